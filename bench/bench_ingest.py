@@ -0,0 +1,75 @@
+import argparse
+import random
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from psycopg2.extras import Json
+
+from utils.db import load_sql, init_pool, close_pool, run_transaction, execute_values_batch, copy_rows
+from utils.constants import MAX_IDS_PER_REQUEST
+
+
+PRICES_INSERT_SQL = load_sql(Path(__file__).parent.parent / 'tasks' / 'prices' / 'sql' / 'update_prices.sql')
+BENCH_TABLE = "bench_listing"
+LISTING_COLUMNS = ("item_id", '"time"', "buy_orders", "sell_listings")
+
+
+def _order_book(rng: random.Random, depth: int, base_price: int, step: int) -> list:
+    return [
+        {"listings": rng.randint(1, 20), "unit_price": base_price + i * step, "quantity": rng.randint(1, 250)}
+        for i in range(depth)
+    ]
+
+
+def synthetic_listing_rows(count: int, depth: int, seed: int = 42) -> list[tuple]:
+    rng = random.Random(seed)
+    ts = datetime.now(timezone.utc)
+    rows = []
+    for item_id in range(1, count + 1):
+        price = rng.randint(10, 100_000)
+        rows.append((
+            item_id,
+            ts,
+            Json(_order_book(rng, depth, price, -1)),
+            Json(_order_book(rng, depth, price + 1, 1)),
+        ))
+    return rows
+
+
+def _timed(label: str, fn, rows: list) -> float:
+    start = time.perf_counter()
+    for offset in range(0, len(rows), MAX_IDS_PER_REQUEST):
+        fn(rows[offset:offset + MAX_IDS_PER_REQUEST])
+    elapsed = time.perf_counter() - start
+    print(f"{label:<22} {len(rows):>8} rows  {elapsed:8.3f}s  {len(rows) / elapsed:10.1f} rows/sec")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare execute_values and COPY ingest into a t_listing-shaped table.")
+    parser.add_argument("-n", "--rows", type=int, default=27_000, help="Number of listing rows per run")
+    parser.add_argument("-d", "--depth", type=int, default=50, help="Price levels per side of each order book")
+    args = parser.parse_args()
+
+    rows = synthetic_listing_rows(args.rows, args.depth)
+    values_sql = PRICES_INSERT_SQL.replace("public.t_listing", BENCH_TABLE)
+
+    init_pool()
+    try:
+        with run_transaction() as tx:
+            with tx.conn.cursor() as cur:
+                cur.execute(f"CREATE TEMP TABLE {BENCH_TABLE} (LIKE public.t_listing INCLUDING DEFAULTS)")
+
+            values_time = _timed("execute_values_batch", lambda b: execute_values_batch(values_sql, b, page_size=MAX_IDS_PER_REQUEST), rows)
+            tx.commit()
+            copy_time = _timed("copy_rows", lambda b: copy_rows(BENCH_TABLE, LISTING_COLUMNS, b), rows)
+            tx.commit()
+
+            print(f"COPY speedup: {values_time / copy_time:.2f}x")
+    finally:
+        close_pool()
+
+
+if __name__ == "__main__":
+    main()
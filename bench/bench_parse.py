@@ -0,0 +1,143 @@
+"""Per-batch decode and row-building cost of the ingest hot path, without network or database.
+
+Compares the previous path (``resp.json()`` with the stdlib decoder, field-by-field rows,
+``Json()`` re-encoding of order books, text COPY buffer) against the current one for each task::
+
+    python -m bench.bench_parse --batches 50
+"""
+import argparse
+import json
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from psycopg2.extras import Json
+
+from bench.mock_api import MockConfig, MockState
+from utils.db import _copy_buffer
+from utils.fetch import decode_list
+from utils.json_codec import BACKEND, split_listings
+from utils.sync import content_hash
+from utils.constants import MAX_IDS_PER_REQUEST
+from tasks.items.get_items import _parse_item_row
+from tasks.recipes.get_recipes import _parse_recipes_row, _parse_ingredients_rows
+
+
+def _legacy_copy_value(value) -> str:
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        text = "t" if value else "f"
+    elif isinstance(value, datetime):
+        text = value.isoformat()
+    elif isinstance(value, Json):
+        text = json.dumps(value.adapted)
+    elif isinstance(value, (list, tuple)):
+        text = "{" + ",".join(f'"{v}"' for v in value) + "}"
+    else:
+        text = str(value)
+    return text.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+
+def _legacy_buffer(rows) -> int:
+    return len("".join("\t".join(_legacy_copy_value(v) for v in row) + "\n" for row in rows).encode("utf-8"))
+
+
+def legacy_items(body: bytes) -> int:
+    rows = []
+    for item in json.loads(body):
+        flags = set(item.get("flags") or [])
+        rows.append((int(item.get("id")), item.get("name") or None, item.get("icon") or None,
+                     item.get("description") or None, item.get("type") or None, item.get("rarity") or None,
+                     item.get("level") or None, item.get("vendor_value") or None, 'AccountBound' in flags,
+                     'SoulbindOnAcquire' in flags, datetime.now(timezone.utc), content_hash(item)))
+    return _legacy_buffer(rows)
+
+
+def current_items(body: bytes) -> int:
+    now = datetime.now(timezone.utc)
+    rows = [_parse_item_row(item, now, content_hash(item)) for item in decode_list(body)]
+    return len(_copy_buffer(rows).getbuffer())
+
+
+def legacy_recipes(body: bytes) -> int:
+    rows = []
+    for recipe in json.loads(body):
+        flags = set(recipe.get("flags") or [])
+        rows.append((int(recipe.get("id")), recipe.get("output_item_id"), recipe.get("output_item_count"),
+                     recipe.get("disciplines"), recipe.get("min_rating"), 'AutoLearned' in flags,
+                     'LearnedFromItem' in flags, recipe.get("time_to_craft_ms"), content_hash(recipe)))
+        rows.extend((recipe["id"], ing["item_id"], ing["count"]) for ing in recipe.get("ingredients") or [])
+    return _legacy_buffer(rows)
+
+
+def current_recipes(body: bytes) -> int:
+    rows = []
+    for recipe in decode_list(body):
+        row = _parse_recipes_row(recipe, content_hash(recipe))
+        rows.append(row)
+        rows.extend(_parse_ingredients_rows(row[0], recipe))
+    return len(_copy_buffer(rows).getbuffer())
+
+
+def legacy_listings(body: bytes) -> int:
+    now = datetime.now(timezone.utc)
+    rows = [(int(it.get("id")), now, Json(it.get("buys") or None), Json(it.get("sells") or None))
+            for it in json.loads(body)]
+    return _legacy_buffer(rows)
+
+
+def current_listings(body: bytes) -> int:
+    now = datetime.now(timezone.utc)
+    rows = [(id_, now, buys, sells) for id_, buys, sells in split_listings(body)]
+    return len(_copy_buffer(rows).getbuffer())
+
+
+CASES = {
+    "items": ("item_ids", "item", legacy_items, current_items),
+    "recipes": ("recipe_ids", "recipe", legacy_recipes, current_recipes),
+    "listings": ("tradable_ids", "listing", legacy_listings, current_listings),
+}
+
+
+def measure(fn, bodies: list) -> tuple[float, int]:
+    """Return (mean CPU ms per batch, peak traced bytes of a single batch)."""
+    start = time.process_time()
+    for body in bodies:
+        fn(body)
+    cpu = (time.process_time() - start) / len(bodies) * 1000
+
+    peak = 0
+    for body in bodies[:5]:
+        tracemalloc.start()
+        fn(body)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return cpu, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure per-batch JSON decode and COPY row building.")
+    parser.add_argument("--batches", type=int, default=50, help="Batches of 200 IDs per task")
+    parser.add_argument("--depth", type=int, default=50, help="Order book depth per side for listings")
+    parser.add_argument("--cases", nargs="+", default=list(CASES), choices=list(CASES))
+    args = parser.parse_args()
+
+    count = args.batches * MAX_IDS_PER_REQUEST
+    state = MockState(MockConfig(items=count * 2, recipes=count, depth=args.depth))
+    print(f"JSON backend: {BACKEND}")
+    for name in args.cases:
+        ids_attr, build_attr, legacy, current = CASES[name]
+        ids = getattr(state, ids_attr)[:count]
+        build = getattr(state, build_attr)
+        bodies = [json.dumps([build(i) for i in ids[o:o + MAX_IDS_PER_REQUEST]]).encode("utf-8")
+                  for o in range(0, len(ids), MAX_IDS_PER_REQUEST)]
+
+        legacy_cpu, legacy_peak = measure(legacy, bodies)
+        current_cpu, current_peak = measure(current, bodies)
+        print(f"{name:<9} cpu/batch {legacy_cpu:8.2f}ms -> {current_cpu:8.2f}ms ({current_cpu / legacy_cpu:5.2f}x)  "
+              f"peak/batch {legacy_peak / 1024:8.0f}KiB -> {current_peak / 1024:8.0f}KiB ({current_peak / legacy_peak:5.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import urlparse, parse_qs
+
+
+RARITIES = ["Junk", "Basic", "Fine", "Masterwork", "Rare", "Exotic", "Ascended", "Legendary"]
+ITEM_TYPES = ["CraftingMaterial", "Weapon", "Armor", "Consumable", "Trophy", "UpgradeComponent"]
+DISCIPLINES = ["Armorsmith", "Artificer", "Chef", "Huntsman", "Jeweler", "Leatherworker", "Tailor", "Weaponsmith"]
+
+
+class MockConfig:
+    def __init__(self, items: int = 27_000, recipes: int = 12_000, latency_ms: float = 80.0,
+                 jitter_ms: float = 40.0, rate_burst: int = 300, rate_per_sec: float = 10.0,
+                 error_rate: float = 0.01, depth: int = 50, seed: int = 1):
+        self.items = items
+        self.recipes = recipes
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.rate_burst = rate_burst
+        self.rate_per_sec = rate_per_sec
+        self.error_rate = error_rate
+        self.depth = depth
+        self.seed = seed
+
+
+class MockState:
+    """Synthetic catalog plus the server-side rate limiter and request log."""
+
+    def __init__(self, config: MockConfig):
+        self.config = config
+        self.item_ids = list(range(1, config.items + 1))
+        self.recipe_ids = list(range(1, config.recipes + 1))
+        self.tradable_ids = [i for i in self.item_ids if i % 5 != 0]
+        self.routes = {
+            "/v2/items": (self.item_ids, set(self.item_ids), self.item),
+            "/v2/recipes": (self.recipe_ids, set(self.recipe_ids), self.recipe),
+            "/v2/commerce/listings": (self.tradable_ids, set(self.tradable_ids), self.listing),
+            "/v2/commerce/prices": (self.tradable_ids, set(self.tradable_ids), self.price),
+        }
+        self._tokens = float(config.rate_burst)
+        self._stamp = time.monotonic()
+        self._lock = threading.Lock()
+        self._rng = random.Random(config.seed)
+        self.request_log: List[tuple] = []
+        self.snapshot = 0
+
+    def take_token(self) -> Optional[float]:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.config.rate_burst, self._tokens + (now - self._stamp) * self.config.rate_per_sec)
+            self._stamp = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return None
+            return (1 - self._tokens) / self.config.rate_per_sec
+
+    def remaining(self) -> int:
+        return int(self._tokens)
+
+    def should_fail(self) -> bool:
+        with self._lock:
+            return self._rng.random() < self.config.error_rate
+
+    def latency(self) -> float:
+        with self._lock:
+            jitter = self._rng.uniform(-self.config.jitter_ms, self.config.jitter_ms)
+        return max(self.config.latency_ms + jitter, 0) / 1000
+
+    def record(self, path: str, status: int, ids: int, seconds: float):
+        with self._lock:
+            self.request_log.append((path, status, ids, seconds))
+
+    def item(self, item_id: int) -> dict:
+        rng = random.Random(item_id)
+        flags = []
+        if item_id % 5 == 0:
+            flags.append(rng.choice(["AccountBound", "SoulbindOnAcquire"]))
+        return {
+            "id": item_id,
+            "name": f"Synthetic Item {item_id}",
+            "icon": f"https://render.guildwars2.com/file/{item_id:08X}/{item_id}.png",
+            "description": "Generated by the local mock API.",
+            "type": rng.choice(ITEM_TYPES),
+            "rarity": rng.choice(RARITIES),
+            "level": rng.randint(0, 80),
+            "vendor_value": rng.randint(0, 500),
+            "flags": flags,
+            "game_types": ["PvE", "WvW"],
+            "restrictions": [],
+        }
+
+    def recipe(self, recipe_id: int) -> dict:
+        rng = random.Random(recipe_id * 7919)
+        output = rng.choice(self.item_ids)
+        ingredients = [
+            {"item_id": rng.choice(self.item_ids), "count": rng.randint(1, 10)}
+            for _ in range(rng.randint(1, 4))
+        ]
+        unique = {ing["item_id"]: ing for ing in ingredients if ing["item_id"] != output}
+        return {
+            "id": recipe_id,
+            "type": "Refinement",
+            "output_item_id": output,
+            "output_item_count": rng.choice([1, 1, 1, 5, 10]),
+            "time_to_craft_ms": rng.choice([1000, 2000, 5000]),
+            "disciplines": rng.sample(DISCIPLINES, rng.randint(1, 3)),
+            "min_rating": rng.randint(0, 500),
+            "flags": rng.choice([[], ["AutoLearned"], ["LearnedFromItem"]]),
+            "ingredients": list(unique.values()),
+        }
+
+    def _book(self, rng: random.Random, price: int, step: int) -> list:
+        return [
+            {"listings": rng.randint(1, 20), "unit_price": max(price + i * step, 1), "quantity": rng.randint(1, 250)}
+            for i in range(rng.randint(0, self.config.depth))
+        ]
+
+    def listing(self, item_id: int) -> dict:
+        base = random.Random(item_id).randint(10, 100_000)
+        rng = random.Random(item_id * 31 + self.snapshot)
+        drift = int(base * rng.uniform(-0.02, 0.02))
+        return {
+            "id": item_id,
+            "buys": self._book(rng, base + drift, -max(base // 500, 1)),
+            "sells": self._book(rng, base + drift + 1, max(base // 500, 1)),
+        }
+
+    def price(self, item_id: int) -> dict:
+        book = self.listing(item_id)
+        buys, sells = book["buys"], book["sells"]
+        return {
+            "id": item_id,
+            "whitelisted": False,
+            "buys": {"quantity": sum(l["quantity"] for l in buys), "unit_price": buys[0]["unit_price"] if buys else 0},
+            "sells": {"quantity": sum(l["quantity"] for l in sells), "unit_price": sells[0]["unit_price"] if sells else 0},
+        }
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    state: MockState = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, payload, headers: Optional[Dict[str, str]] = None):
+        body = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("X-Rate-Limit-Limit", str(self.state.config.rate_burst))
+        self.send_header("X-Rate-Limit-Remaining", str(self.state.remaining()))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        start = time.perf_counter()
+        parsed = urlparse(self.path)
+        query = parse_qs(parsed.query)
+        ids = [int(x) for x in query.get("ids", [""])[0].split(",") if x]
+        status = self._handle(parsed.path, ids)
+        self.state.record(parsed.path, status, len(ids), time.perf_counter() - start)
+
+    def _handle(self, path: str, ids: List[int]) -> int:
+        state = self.state
+        wait = state.take_token()
+        if wait is not None:
+            self._send(429, {"text": "too many requests"}, {"Retry-After": f"{wait:.2f}"})
+            return 429
+
+        time.sleep(state.latency())
+        if state.should_fail():
+            self._send(503, {"text": "injected failure"})
+            return 503
+
+        route = state.routes.get(path.rstrip("/"))
+        if route is None:
+            self._send(404, {"text": "not found"})
+            return 404
+
+        known, known_set, build = route
+        if not ids:
+            self._send(200, known)
+            return 200
+
+        hits = [i for i in ids if i in known_set]
+        if not hits:
+            self._send(404, {"text": "all ids provided are invalid"})
+            return 404
+        status = 200 if len(hits) == len(ids) else 206
+        self._send(status, [build(i) for i in hits])
+        return status
+
+
+def start_mock_server(config: MockConfig, host: str = "127.0.0.1", port: int = 0):
+    """Start the mock API in a daemon thread; returns ``(server, state, base_url)``."""
+    state = MockState(config)
+    handler = type("BoundMockHandler", (MockHandler,), {"state": state})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="gw2-mock-api", daemon=True).start()
+    base_url = f"http://{server.server_address[0]}:{server.server_address[1]}/v2"
+    return server, state, base_url
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a synthetic GW2 API for local benchmarking.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--items", type=int, default=27_000)
+    parser.add_argument("--recipes", type=int, default=12_000)
+    parser.add_argument("--latency-ms", type=float, default=80.0)
+    parser.add_argument("--jitter-ms", type=float, default=40.0)
+    parser.add_argument("--rate-burst", type=int, default=300)
+    parser.add_argument("--rate-per-sec", type=float, default=10.0)
+    parser.add_argument("--error-rate", type=float, default=0.01)
+    args = parser.parse_args()
+
+    config = MockConfig(items=args.items, recipes=args.recipes, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                        rate_burst=args.rate_burst, rate_per_sec=args.rate_per_sec, error_rate=args.error_rate)
+    server, _, base_url = start_mock_server(config, args.host, args.port)
+    print(f"Mock GW2 API listening on {base_url} (set GW2_API_BASE_URL to use it)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
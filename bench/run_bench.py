@@ -0,0 +1,164 @@
+"""End-to-end benchmark of the dump tasks against the local mock API.
+
+Needs a migrated Postgres reachable through the usual PG* environment variables; the tasks
+write into it exactly as in production. Example::
+
+    python -m bench.run_bench --items 5000 --recipes 2000 --output bench_output.json
+"""
+import argparse
+import importlib
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from unittest import mock
+
+from bench.mock_api import MockConfig, start_mock_server
+
+
+TASKS = {
+    "items": ("tasks.items.get_items", []),
+    "recipes": ("tasks.recipes.get_recipes", []),
+    "prices": ("tasks.prices.get_prices", []),
+    "ticks": ("tasks.prices.get_prices", ["--source", "prices"]),
+}
+
+
+class BenchRecorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.batch_latencies = []
+        self.ids = 0
+        self.db_seconds = 0.0
+
+    def wrap_http_get(self, http_get):
+        def timed_http_get(url, session, params=None, *args, **kwargs):
+            start = time.perf_counter()
+            resp = http_get(url, session, params, *args, **kwargs)
+            elapsed = time.perf_counter() - start
+            if params and "ids" in params:
+                with self._lock:
+                    self.batch_latencies.append(elapsed)
+                    self.ids += params["ids"].count(",") + 1
+            return resp
+        return timed_http_get
+
+    def wrap_write_cursor(self, write_cursor):
+        @contextmanager
+        def timed_write_cursor():
+            start = time.perf_counter()
+            with write_cursor() as cur:
+                yield cur
+            with self._lock:
+                self.db_seconds += time.perf_counter() - start
+        return timed_write_cursor
+
+
+def _percentile(values, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(round(pct / 100 * (len(ordered) - 1))), len(ordered) - 1)]
+
+
+def run_task(name: str, argv: list, state) -> dict:
+    import utils.fetch
+    import utils.db
+
+    module_name, task_argv = TASKS[name]
+    module = importlib.import_module(module_name)
+    recorder = BenchRecorder()
+    state.request_log.clear()
+
+    with mock.patch.object(utils.fetch, "http_get", recorder.wrap_http_get(utils.fetch.http_get)), \
+            mock.patch.object(utils.db, "_write_cursor", recorder.wrap_write_cursor(utils.db._write_cursor)), \
+            mock.patch.object(sys, "argv", [name] + task_argv + argv):
+        start = time.perf_counter()
+        exit_code = 0
+        try:
+            module.main()
+        except SystemExit as e:
+            exit_code = e.code or 0
+        wall = time.perf_counter() - start
+
+    statuses = [entry[1] for entry in state.request_log]
+    return {
+        "task": name,
+        "exit_code": exit_code,
+        "wall_seconds": round(wall, 3),
+        "ids": recorder.ids,
+        "ids_per_sec": round(recorder.ids / wall, 1) if wall > 0 else 0.0,
+        "batches": len(recorder.batch_latencies),
+        "batch_p50_ms": round(_percentile(recorder.batch_latencies, 50) * 1000, 1),
+        "batch_p99_ms": round(_percentile(recorder.batch_latencies, 99) * 1000, 1),
+        "batch_mean_ms": round(statistics.fmean(recorder.batch_latencies) * 1000, 1) if recorder.batch_latencies else 0.0,
+        "db_write_seconds": round(recorder.db_seconds, 3),
+        "server_requests": len(statuses),
+        "server_429": statuses.count(429),
+        "server_5xx": sum(1 for s in statuses if 500 <= s < 600),
+    }
+
+
+def compare(results: list, baseline_path: str, tolerance: float) -> bool:
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {r["task"]: r for r in json.load(f)["results"]}
+    ok = True
+    for result in results:
+        base = baseline.get(result["task"])
+        if not base or not base["ids_per_sec"]:
+            continue
+        change = (result["ids_per_sec"] - base["ids_per_sec"]) / base["ids_per_sec"]
+        flag = ""
+        if change < -tolerance:
+            flag = "  REGRESSION"
+            ok = False
+        print(f"{result['task']:<8} ids/sec {base['ids_per_sec']:>9.1f} -> {result['ids_per_sec']:>9.1f} ({change:+.1%}){flag}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark get_items, get_recipes and get_prices against a mock GW2 API.")
+    parser.add_argument("--tasks", nargs="+", default=["items", "recipes", "prices"], choices=list(TASKS),
+                        help="Tasks to run, in order")
+    parser.add_argument("--items", type=int, default=27_000)
+    parser.add_argument("--recipes", type=int, default=12_000)
+    parser.add_argument("--latency-ms", type=float, default=80.0)
+    parser.add_argument("--jitter-ms", type=float, default=40.0)
+    parser.add_argument("--rate-burst", type=int, default=300)
+    parser.add_argument("--rate-per-sec", type=float, default=10.0)
+    parser.add_argument("--error-rate", type=float, default=0.01)
+    parser.add_argument("--task-args", default="", help="Extra arguments passed to every task, e.g. '-w 16'")
+    parser.add_argument("--output", default=None, help="Write results as JSON to this file")
+    parser.add_argument("--baseline", default=None, help="Compare against a previous --output file")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Allowed ids/sec drop versus the baseline")
+    args = parser.parse_args()
+
+    config = MockConfig(items=args.items, recipes=args.recipes, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                        rate_burst=args.rate_burst, rate_per_sec=args.rate_per_sec, error_rate=args.error_rate)
+    server, state, base_url = start_mock_server(config)
+    os.environ["GW2_API_BASE_URL"] = base_url
+
+    results = []
+    try:
+        for name in args.tasks:
+            result = run_task(name, args.task_args.split(), state)
+            results.append(result)
+            print(f"{name:<8} {result['ids']:>7} ids  {result['wall_seconds']:>8.2f}s  {result['ids_per_sec']:>9.1f} ids/sec  "
+                  f"p50 {result['batch_p50_ms']:>7.1f}ms  p99 {result['batch_p99_ms']:>7.1f}ms  "
+                  f"db {result['db_write_seconds']:>7.2f}s  429s {result['server_429']}  5xx {result['server_5xx']}")
+    finally:
+        server.shutdown()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"config": vars(config), "results": results}, f, indent=2)
+
+    if args.baseline and not compare(results, args.baseline, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
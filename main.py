@@ -1,16 +1,225 @@
-# This is a sample Python script.
+import time
+import signal
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+import logging
+import sys
+import argparse
+from typing import Callable, List, Optional
 
-# Press Umschalt+F10 to execute it or replace it with your code.
-# Press Double Shift to search everywhere for classes, files, tool windows, actions, and settings.
+from utils.rate_limit import TokenBucket, create_limiter
+from utils.fetch import create_session
+from utils.db import init_pool, close_pool
+from utils.http_cache import HttpCache
+from utils.item_index import ItemIdIndex
+from utils.metrics import METRICS, profiled
+from utils.constants import DEFAULT_BURST
+from utils.constants import DEFAULT_REFILL_RATE
+from utils.constants import DEFAULT_MAX_WORKERS
+from utils.constants import PRICE_RESERVE_TOKENS
+from tasks.items.get_items import run_item_sync
+from tasks.recipes.get_recipes import run_recipe_sync
+from tasks.prices.get_prices import run_price_snapshot
+from tasks.prices.update_volume import update_pending_volume_stats
+from tasks.prices.partitions import ensure_listing_partitions, apply_listing_retention
+from tasks.crafting.crafting import run_crafting_analysis
 
 
-def print_hi(name):
-    # Use a breakpoint in the code line below to debug your script.
-    print(f'Hi, {name}')  # Press Strg+F8 to toggle the breakpoint.
+class Job:
+    def __init__(self, name: str, interval: float, func: Callable[[], object],
+                 uses_api: bool = False, priority: bool = False):
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self.uses_api = uses_api
+        self.priority = priority
+        self.next_run = 0.0
+        self.running = False
+        self.last_duration: Optional[float] = None
+        self.failures = 0
 
 
-# Press the green button in the gutter to run the script.
-if __name__ == '__main__':
-    print_hi('PyCharm')
+class Scheduler:
+    """Runs jobs at independent cadences in one process.
 
-# See PyCharm help at https://www.jetbrains.com/help/pycharm/
+    A job never overlaps with itself: if it is still running when it comes due, that run is
+    skipped. Non-priority API jobs are deferred while the shared rate budget is below
+    ``reserve_tokens`` and a priority job (price snapshots) is due or running. First runs are
+    ``stagger_seconds`` apart, in list order, so the jobs don't all open connections at once.
+    """
+
+    def __init__(self, jobs: List[Job], limiter: TokenBucket, logger: logging.Logger,
+                 reserve_tokens: float = PRICE_RESERVE_TOKENS, defer_seconds: float = 30.0,
+                 metrics_file: Optional[str] = None, stagger_seconds: float = 5.0):
+        self.jobs = jobs
+        start = time.time()
+        for i, job in enumerate(jobs):
+            job.next_run = start + i * stagger_seconds
+        self.metrics_file = metrics_file
+        self.limiter = limiter
+        self.logger = logger
+        self.reserve_tokens = reserve_tokens
+        self.defer_seconds = defer_seconds
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._pool = ThreadPoolExecutor(max_workers=len(jobs), thread_name_prefix="gw2-job")
+
+    def stop(self, *_):
+        self.logger.info("Stopping scheduler after running jobs finish...")
+        self._stop.set()
+
+    def _priority_pending(self, now: float) -> bool:
+        return any(j.priority and (j.running or j.next_run <= now) for j in self.jobs)
+
+    def _run(self, job: Job):
+        start = time.time()
+        try:
+            self.logger.info(f"Job '{job.name}' started.")
+            job.func()
+            job.failures = 0
+            self.logger.info(f"Job '{job.name}' finished in {time.time() - start:.1f}s.")
+        except Exception as e:
+            job.failures += 1
+            METRICS.inc("gw2_job_failures_total", job=job.name)
+            self.logger.exception(f"Job '{job.name}' failed ({job.failures} in a row): {e}")
+        finally:
+            job.last_duration = time.time() - start
+            METRICS.observe("gw2_job_seconds", job.last_duration, job=job.name)
+            with self._lock:
+                job.running = False
+            if self.metrics_file:
+                try:
+                    METRICS.write(self.metrics_file)
+                except OSError as e:
+                    self.logger.warning(f"Could not write metrics to '{self.metrics_file}': {e}")
+
+    def tick(self):
+        now = time.time()
+        with self._lock:
+            for job in self.jobs:
+                if job.next_run > now:
+                    continue
+                if job.running:
+                    self.logger.debug(f"Job '{job.name}' is still running; skipping this run.")
+                    METRICS.inc("gw2_job_skipped_total", job=job.name)
+                    job.next_run = now + job.interval
+                    continue
+                if (job.uses_api and not job.priority and self._priority_pending(now)
+                        and self.limiter.available() < self.reserve_tokens):
+                    self.logger.info(f"Deferring job '{job.name}': rate budget reserved for price snapshots.")
+                    METRICS.inc("gw2_job_deferred_total", job=job.name)
+                    job.next_run = now + self.defer_seconds
+                    continue
+                job.running = True
+                job.next_run = now + job.interval
+                self._pool.submit(self._run, job)
+
+    def run_forever(self):
+        while not self._stop.is_set():
+            self.tick()
+            next_due = min(j.next_run for j in self.jobs)
+            self._stop.wait(min(max(next_due - time.time(), 0.1), 1.0))
+        self._pool.shutdown(wait=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run item, recipe and price syncs plus analysis jobs on a schedule.")
+    parser.add_argument("--log-file", default=None, help="Optional path to a rotating log file")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Enable debug logging to console")
+    parser.add_argument("-w", "--workers", type=int, default=DEFAULT_MAX_WORKERS, help="Number of concurrent API requests per job")
+    parser.add_argument("--rate-state", default=None, help="Share the API rate budget with other processes through this file")
+    parser.add_argument("--cache-dir", default=None, help="Cache catalog API responses in this directory")
+    parser.add_argument("--items-interval", type=float, default=24 * 3600, help="Seconds between incremental item syncs")
+    parser.add_argument("--recipes-interval", type=float, default=24 * 3600, help="Seconds between incremental recipe syncs")
+    parser.add_argument("--prices-interval", type=float, default=300, help="Seconds between full-depth order book snapshots")
+    parser.add_argument("--ticks-interval", type=float, default=60, help="Seconds between top-of-book price snapshots")
+    parser.add_argument("--prices-mode", default="tiered", choices=["full", "quick", "tiered"], help="Order book snapshot mode")
+    parser.add_argument("--prices-storage", default="full", choices=["full", "delta"], help="Order book storage: every book, or keyframes plus changed levels")
+    parser.add_argument("--ticks-mode", default="full", choices=["full", "quick", "tiered"], help="Top-of-book snapshot mode")
+    parser.add_argument("--volume-interval", type=float, default=300, help="Seconds between volume stat updates")
+    parser.add_argument("--crafting-interval", type=float, default=600, help="Seconds between crafting analyses")
+    parser.add_argument("--maintenance-interval", type=float, default=3600, help="Seconds between partition maintenance runs")
+    parser.add_argument("--market-file", default=None, help="Refresh this memory-mappable market snapshot (.npy) after every order book snapshot")
+    parser.add_argument("--scan-flips", action="store_true", help="Rank flip opportunities into 't_flip_opportunity' after every order book snapshot")
+    parser.add_argument("--metrics-file", default=None, help="Rewrite metrics here after every job (.json summary, otherwise Prometheus text)")
+    parser.add_argument("--profile", default=None,
+                        help="Write sampled stacks of every job thread into this file (folded, for flamegraph.pl)")
+    args = parser.parse_args()
+    if args.profile and Path(args.profile).suffix == ".prof":
+        parser.error("--profile: cProfile only sees the scheduler thread, which just ticks; use a non-.prof path "
+                     "for sampled stacks of the job threads")
+
+    logger = logging.getLogger("gw2tp")
+    logger.setLevel(logging.DEBUG if args.verbose else logging.INFO)
+
+    console = logging.StreamHandler(sys.stdout)
+    console.setLevel(logging.DEBUG if args.verbose else logging.INFO)
+    console.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] [%(threadName)s] %(message)s"))
+    logger.addHandler(console)
+
+    if args.log_file:
+        Path(args.log_file).parent.mkdir(parents=True, exist_ok=True)
+        file_handler = RotatingFileHandler(args.log_file, maxBytes=5 * 1024 * 1024, backupCount=3)
+        file_handler.setLevel(logging.DEBUG)
+        file_handler.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] [%(threadName)s] %(message)s"))
+        logger.addHandler(file_handler)
+
+    session = create_session(args.workers * 2)
+    limiter = create_limiter(args.rate_state, capacity=DEFAULT_BURST, refill_rate=DEFAULT_REFILL_RATE)
+    cache = HttpCache(args.cache_dir) if args.cache_dir else None
+    item_index = ItemIdIndex()
+
+    def prices():
+        run_price_snapshot(session, limiter, logger, workers=args.workers, mode=args.prices_mode, skip_volume=True,
+                           storage=args.prices_storage)
+        market = None
+        if args.market_file:
+            from utils.market import refresh_market_file  # needs numpy; only imported when asked for
+            market = refresh_market_file(args.market_file, logger)
+        if args.scan_flips:
+            # the snapshot above is already stored; a failed scan must not count against it
+            try:
+                from tasks.flips.flip_scanner import run_flip_scan  # needs numpy; only imported when asked for
+                run_flip_scan(logger, market=market)
+            except Exception as e:
+                METRICS.inc("gw2_job_failures_total", job="flips")
+                logger.exception(f"Flip scan failed: {e}")
+
+    def maintenance():
+        ensure_listing_partitions(logger)
+        apply_listing_retention(logger)
+
+    jobs = [
+        Job("prices", args.prices_interval, uses_api=True, priority=True, func=prices),
+        Job("ticks", args.ticks_interval, uses_api=True, priority=True,
+            func=lambda: run_price_snapshot(session, limiter, logger, workers=args.workers, mode=args.ticks_mode,
+                                            source="prices")),
+        Job("items", args.items_interval, uses_api=True,
+            func=lambda: run_item_sync(session, limiter, logger, workers=args.workers, incremental=True, cache=cache)),
+        Job("recipes", args.recipes_interval, uses_api=True,
+            func=lambda: run_recipe_sync(session, limiter, logger, workers=args.workers, incremental=True,
+                                         cache=cache, item_index=item_index)),
+        Job("volume", args.volume_interval, func=lambda: update_pending_volume_stats(logger)),
+        Job("crafting", args.crafting_interval, func=lambda: run_crafting_analysis(logger)),
+        Job("maintenance", args.maintenance_interval, func=maintenance),
+    ]
+    # every job holds a run transaction and may need a second connection at the same time
+    # (checkpoint heartbeats, failure marks from the fetch thread, streamed reads)
+    init_pool(maxconn=2 * len(jobs) + 2)
+    scheduler = Scheduler(jobs, limiter, logger, metrics_file=args.metrics_file)
+    signal.signal(signal.SIGINT, scheduler.stop)
+    signal.signal(signal.SIGTERM, scheduler.stop)
+
+    logger.info(f"Scheduler started with jobs: {', '.join(f'{j.name} every {j.interval:.0f}s' for j in jobs)}")
+    try:
+        with profiled(args.profile):
+            scheduler.run_forever()
+    finally:
+        logger.info(f"Rate limiter: {limiter.stats()}")
+        close_pool()
+
+
+if __name__ == "__main__":
+    main()
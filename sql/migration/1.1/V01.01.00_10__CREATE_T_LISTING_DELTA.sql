@@ -0,0 +1,62 @@
+-- Changed price levels between keyframes; quantity = 0 marks a level that disappeared.
+CREATE TABLE public.t_listing_delta
+(
+    item_id integer NOT NULL,
+    "time" timestamp with time zone NOT NULL,
+    side character(1) NOT NULL,
+    unit_price integer NOT NULL,
+    quantity integer NOT NULL,
+    listings integer NOT NULL,
+    PRIMARY KEY (item_id, "time", side, unit_price),
+    CONSTRAINT chk_listing_delta_side CHECK (side IN ('B', 'S'))
+) PARTITION BY RANGE ("time");
+
+CREATE TABLE public.t_listing_delta_default
+    PARTITION OF public.t_listing_delta DEFAULT;
+
+DO $$
+DECLARE
+    d date;
+BEGIN
+    FOR d IN SELECT generate_series(current_date, current_date + 2, interval '1 day')::date LOOP
+        EXECUTE format(
+            'CREATE TABLE IF NOT EXISTS public.%I PARTITION OF public.t_listing_delta FOR VALUES FROM (%L) TO (%L)',
+            't_listing_delta_p' || to_char(d, 'YYYYMMDD'),
+            d::timestamp AT TIME ZONE 'UTC',
+            (d + 1)::timestamp AT TIME ZONE 'UTC'
+        );
+    END LOOP;
+END $$;
+
+-- Current price levels per item, the base the next delta is computed against.
+CREATE TABLE public.t_listing_book
+(
+    item_id integer NOT NULL,
+    side character(1) NOT NULL,
+    unit_price integer NOT NULL,
+    quantity integer NOT NULL,
+    listings integer NOT NULL,
+    PRIMARY KEY (item_id, side, unit_price)
+);
+
+-- Snapshot the current book reflects and when its last keyframe went to t_listing.
+CREATE TABLE public.t_listing_book_head
+(
+    item_id integer NOT NULL,
+    snapshot_ts timestamp with time zone NOT NULL,
+    keyframe_ts timestamp with time zone,
+    PRIMARY KEY (item_id),
+    CONSTRAINT fk_listing_book_head_item FOREIGN KEY (item_id)
+        REFERENCES public.t_item (id) MATCH SIMPLE
+        ON UPDATE NO ACTION
+        ON DELETE NO ACTION
+);
+
+ALTER TABLE IF EXISTS public.t_listing_delta
+    OWNER to postgres;
+
+ALTER TABLE IF EXISTS public.t_listing_book
+    OWNER to postgres;
+
+ALTER TABLE IF EXISTS public.t_listing_book_head
+    OWNER to postgres;
@@ -0,0 +1,24 @@
+ALTER TABLE public.t_run_batch
+    ADD COLUMN claimed_by character varying(128),
+    ADD COLUMN claimed_at timestamp with time zone;
+
+CREATE OR REPLACE VIEW public.v_run_progress AS
+SELECT
+    r.run_id,
+    r.task,
+    r.status,
+    r.snapshot_ts,
+    r.total_batches,
+    count(*) FILTER (WHERE b.status = 'done') AS done_batches,
+    count(*) FILTER (WHERE b.status = 'claimed') AS claimed_batches,
+    count(*) FILTER (WHERE b.status = 'failed') AS failed_batches,
+    count(*) FILTER (WHERE b.status = 'pending') AS pending_batches,
+    count(DISTINCT b.claimed_by) AS workers,
+    r.started_at,
+    max(b.updated_at) AS last_update
+FROM public.t_run r
+LEFT JOIN public.t_run_batch b ON b.run_id = r.run_id
+GROUP BY r.run_id;
+
+ALTER VIEW public.v_run_progress
+    OWNER to postgres;
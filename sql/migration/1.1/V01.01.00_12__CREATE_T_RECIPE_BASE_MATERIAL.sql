@@ -0,0 +1,30 @@
+-- Fully expanded base materials consumed by one craft of each recipe.
+CREATE TABLE public.t_recipe_base_material
+(
+    recipe_id integer NOT NULL,
+    output_item_id integer NOT NULL,
+    item_id integer NOT NULL,
+    count numeric NOT NULL,
+    PRIMARY KEY (recipe_id, item_id),
+    CONSTRAINT fk_recipe_base_material_recipe FOREIGN KEY (recipe_id)
+        REFERENCES public.t_recipe (id) MATCH SIMPLE
+        ON UPDATE NO ACTION
+        ON DELETE CASCADE
+);
+
+CREATE INDEX idx_t_recipe_base_material_output
+    ON public.t_recipe_base_material (output_item_id, recipe_id);
+
+-- Recipe content each expansion was built from; a differing hash marks the recipe as changed.
+CREATE TABLE public.t_recipe_base_material_source
+(
+    recipe_id integer NOT NULL,
+    content_hash text,
+    PRIMARY KEY (recipe_id)
+);
+
+ALTER TABLE IF EXISTS public.t_recipe_base_material
+    OWNER to postgres;
+
+ALTER TABLE IF EXISTS public.t_recipe_base_material_source
+    OWNER to postgres;
@@ -0,0 +1,25 @@
+-- kind: 'spread' = place a buy order and relist, 'instant' = buy listings and sell into buy orders,
+-- 'vendor' = buy listings below the vendor price.
+CREATE TABLE public.t_flip_opportunity
+(
+    item_id integer NOT NULL,
+    kind character varying(16) NOT NULL,
+    rank integer NOT NULL,
+    buy_price integer NOT NULL,
+    sell_price integer NOT NULL,
+    unit_profit numeric NOT NULL,
+    roi numeric NOT NULL,
+    fill_qty integer NOT NULL,
+    potential_profit numeric NOT NULL,
+    sold_24h bigint NOT NULL,
+    bought_24h bigint NOT NULL,
+    snapshot_ts timestamp with time zone NOT NULL,
+    computed_at timestamp with time zone NOT NULL,
+    PRIMARY KEY (item_id, kind)
+);
+
+CREATE INDEX idx_t_flip_opportunity_rank
+    ON public.t_flip_opportunity (kind, rank);
+
+ALTER TABLE IF EXISTS public.t_flip_opportunity
+    OWNER to postgres;
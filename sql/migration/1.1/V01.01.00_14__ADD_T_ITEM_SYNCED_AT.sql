@@ -0,0 +1,7 @@
+-- Server-side write time of every item row; set by the database, never by the client, so
+-- readers can pick up changes by "synced_at >= <watermark>" without a full scan.
+ALTER TABLE IF EXISTS public.t_item
+    ADD COLUMN IF NOT EXISTS synced_at timestamp with time zone NOT NULL DEFAULT now();
+
+CREATE INDEX IF NOT EXISTS idx_t_item_synced_at
+    ON public.t_item (synced_at);
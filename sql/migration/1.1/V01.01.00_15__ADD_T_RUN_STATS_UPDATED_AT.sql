@@ -0,0 +1,13 @@
+-- Volume stats are computed per completed price run, never from a snapshot that is still being
+-- written; this marks the runs whose snapshot is already reflected in t_listing_snapshot_stats.
+ALTER TABLE public.t_run
+    ADD COLUMN IF NOT EXISTS stats_updated_at timestamp with time zone;
+
+UPDATE public.t_run
+SET stats_updated_at = now()
+WHERE task = 'prices'
+  AND snapshot_ts <= (SELECT max(snapshot_ts_to) FROM public.t_listing_snapshot_stats);
+
+CREATE INDEX IF NOT EXISTS idx_t_run_stats_pending
+    ON public.t_run (snapshot_ts)
+    WHERE task = 'prices' AND status = 'completed' AND stats_updated_at IS NULL;
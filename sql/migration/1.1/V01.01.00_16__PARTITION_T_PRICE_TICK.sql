@@ -0,0 +1,59 @@
+-- Ticks cover the whole catalog every minute: partition them by UTC day like t_listing so
+-- retention drops whole days, and store NULL instead of 0 for a side without orders.
+DROP INDEX IF EXISTS public.idx_t_price_tick_ts;
+
+ALTER TABLE public.t_price_tick
+    RENAME TO t_price_tick_unpartitioned;
+
+ALTER TABLE public.t_price_tick_unpartitioned
+    RENAME CONSTRAINT fk_price_tick_item TO fk_price_tick_item_unpartitioned;
+
+CREATE TABLE public.t_price_tick
+(
+    item_id integer NOT NULL,
+    ts timestamp with time zone NOT NULL,
+    buy_price integer,
+    buy_qty integer NOT NULL,
+    sell_price integer,
+    sell_qty integer NOT NULL,
+    PRIMARY KEY (item_id, ts),
+    CONSTRAINT fk_price_tick_item FOREIGN KEY (item_id)
+        REFERENCES public.t_item (id) MATCH SIMPLE
+        ON UPDATE NO ACTION
+        ON DELETE NO ACTION
+) PARTITION BY RANGE (ts);
+
+CREATE INDEX idx_t_price_tick_ts
+    ON public.t_price_tick (ts);
+
+CREATE TABLE public.t_price_tick_default
+    PARTITION OF public.t_price_tick DEFAULT;
+
+DO $$
+DECLARE
+    first_day date;
+    d date;
+BEGIN
+    SELECT COALESCE(min((ts AT TIME ZONE 'UTC')::date), current_date)
+    INTO first_day
+    FROM public.t_price_tick_unpartitioned;
+
+    FOR d IN SELECT generate_series(first_day, current_date + 2, interval '1 day')::date LOOP
+        EXECUTE format(
+            'CREATE TABLE IF NOT EXISTS public.%I PARTITION OF public.t_price_tick FOR VALUES FROM (%L) TO (%L)',
+            't_price_tick_p' || to_char(d, 'YYYYMMDD'),
+            d::timestamp AT TIME ZONE 'UTC',
+            (d + 1)::timestamp AT TIME ZONE 'UTC'
+        );
+    END LOOP;
+END $$;
+
+INSERT INTO public.t_price_tick (item_id, ts, buy_price, buy_qty, sell_price, sell_qty)
+SELECT item_id, ts, NULLIF(buy_price, 0), buy_qty, NULLIF(sell_price, 0), sell_qty
+FROM public.t_price_tick_unpartitioned
+ON CONFLICT DO NOTHING;
+
+DROP TABLE public.t_price_tick_unpartitioned;
+
+ALTER TABLE IF EXISTS public.t_price_tick
+    OWNER to postgres;
@@ -0,0 +1,7 @@
+-- Server-side time of the last write per item, so market snapshots can pick up changes by write
+-- order rather than snapshot_ts (resumed runs and slow workers write old snapshots late).
+ALTER TABLE IF EXISTS public.t_price_latest
+    ADD COLUMN IF NOT EXISTS updated_at timestamp with time zone NOT NULL DEFAULT now();
+
+CREATE INDEX IF NOT EXISTS idx_t_price_latest_updated_at
+    ON public.t_price_latest (updated_at);
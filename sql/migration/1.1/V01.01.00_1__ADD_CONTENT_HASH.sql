@@ -0,0 +1,5 @@
+ALTER TABLE IF EXISTS public.t_item
+    ADD COLUMN IF NOT EXISTS content_hash text;
+
+ALTER TABLE IF EXISTS public.t_recipe
+    ADD COLUMN IF NOT EXISTS content_hash text;
@@ -0,0 +1,2 @@
+CREATE INDEX IF NOT EXISTS idx_t_listing_time
+    ON public.t_listing ("time");
@@ -0,0 +1,54 @@
+DROP INDEX IF EXISTS public.idx_t_listing_time;
+
+ALTER TABLE public.t_listing
+    RENAME TO t_listing_unpartitioned;
+
+CREATE TABLE public.t_listing
+(
+    item_id integer NOT NULL,
+    "time" timestamp with time zone NOT NULL,
+    buy_orders jsonb,
+    sell_listings jsonb,
+    PRIMARY KEY (item_id, "time"),
+    CONSTRAINT fk_listing_item FOREIGN KEY (item_id)
+        REFERENCES public.t_item (id) MATCH SIMPLE
+        ON UPDATE NO ACTION
+        ON DELETE NO ACTION
+) PARTITION BY RANGE ("time");
+
+CREATE INDEX idx_t_listing_time
+    ON public.t_listing ("time");
+
+CREATE TABLE public.t_listing_default
+    PARTITION OF public.t_listing DEFAULT;
+
+-- One partition per UTC day, from the oldest existing snapshot up to two days ahead.
+DO $$
+DECLARE
+    first_day date;
+    d date;
+BEGIN
+    SELECT COALESCE(min(("time" AT TIME ZONE 'UTC')::date), current_date)
+    INTO first_day
+    FROM public.t_listing_unpartitioned;
+
+    FOR d IN SELECT generate_series(first_day, current_date + 2, interval '1 day')::date LOOP
+        EXECUTE format(
+            'CREATE TABLE IF NOT EXISTS public.%I PARTITION OF public.t_listing FOR VALUES FROM (%L) TO (%L)',
+            't_listing_p' || to_char(d, 'YYYYMMDD'),
+            d::timestamp AT TIME ZONE 'UTC',
+            (d + 1)::timestamp AT TIME ZONE 'UTC'
+        );
+    END LOOP;
+END $$;
+
+INSERT INTO public.t_listing (item_id, "time", buy_orders, sell_listings)
+SELECT item_id, "time", buy_orders, sell_listings
+FROM public.t_listing_unpartitioned
+WHERE "time" IS NOT NULL
+ON CONFLICT DO NOTHING;
+
+DROP TABLE public.t_listing_unpartitioned;
+
+ALTER TABLE IF EXISTS public.t_listing
+    OWNER to postgres;
@@ -0,0 +1,40 @@
+CREATE TABLE public.t_listing_hourly
+(
+    item_id integer NOT NULL,
+    bucket_ts timestamp with time zone NOT NULL,
+    samples integer NOT NULL,
+    best_buy_min integer,
+    best_buy_max integer,
+    best_buy_avg numeric,
+    best_sell_min integer,
+    best_sell_max integer,
+    best_sell_avg numeric,
+    buy_qty_avg numeric,
+    sell_qty_avg numeric,
+    PRIMARY KEY (item_id, bucket_ts)
+);
+
+CREATE TABLE public.t_listing_daily
+(
+    item_id integer NOT NULL,
+    bucket_ts timestamp with time zone NOT NULL,
+    samples integer NOT NULL,
+    best_buy_min integer,
+    best_buy_max integer,
+    best_buy_avg numeric,
+    best_sell_min integer,
+    best_sell_max integer,
+    best_sell_avg numeric,
+    buy_qty_avg numeric,
+    sell_qty_avg numeric,
+    PRIMARY KEY (item_id, bucket_ts)
+);
+
+CREATE INDEX idx_t_listing_snapshot_stats_ts_to
+    ON public.t_listing_snapshot_stats (snapshot_ts_to);
+
+ALTER TABLE IF EXISTS public.t_listing_hourly
+    OWNER to postgres;
+
+ALTER TABLE IF EXISTS public.t_listing_daily
+    OWNER to postgres;
@@ -0,0 +1,17 @@
+CREATE TABLE public.t_crafting_profit
+(
+    item_id integer NOT NULL,
+    recipe_id integer,
+    buy_cost integer,
+    craft_cost numeric,
+    sell_price integer,
+    profit numeric,
+    computed_at timestamp with time zone NOT NULL,
+    PRIMARY KEY (item_id)
+);
+
+CREATE INDEX idx_t_crafting_profit_profit
+    ON public.t_crafting_profit (profit DESC NULLS LAST);
+
+ALTER TABLE IF EXISTS public.t_crafting_profit
+    OWNER to postgres;
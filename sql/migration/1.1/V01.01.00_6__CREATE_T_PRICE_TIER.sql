@@ -0,0 +1,18 @@
+CREATE TABLE public.t_price_tier
+(
+    item_id integer NOT NULL,
+    tier smallint NOT NULL,
+    score double precision NOT NULL DEFAULT 0,
+    assigned_at timestamp with time zone NOT NULL,
+    PRIMARY KEY (item_id),
+    CONSTRAINT fk_price_tier_item FOREIGN KEY (item_id)
+        REFERENCES public.t_item (id) MATCH SIMPLE
+        ON UPDATE NO ACTION
+        ON DELETE CASCADE
+);
+
+CREATE INDEX idx_t_price_tier_tier
+    ON public.t_price_tier (tier);
+
+ALTER TABLE IF EXISTS public.t_price_tier
+    OWNER to postgres;
@@ -0,0 +1,20 @@
+CREATE TABLE public.t_price_tick
+(
+    item_id integer NOT NULL,
+    ts timestamp with time zone NOT NULL,
+    buy_price integer NOT NULL,
+    buy_qty integer NOT NULL,
+    sell_price integer NOT NULL,
+    sell_qty integer NOT NULL,
+    PRIMARY KEY (item_id, ts),
+    CONSTRAINT fk_price_tick_item FOREIGN KEY (item_id)
+        REFERENCES public.t_item (id) MATCH SIMPLE
+        ON UPDATE NO ACTION
+        ON DELETE NO ACTION
+);
+
+CREATE INDEX idx_t_price_tick_ts
+    ON public.t_price_tick (ts);
+
+ALTER TABLE IF EXISTS public.t_price_tick
+    OWNER to postgres;
@@ -0,0 +1,41 @@
+CREATE TABLE public.t_run
+(
+    run_id bigserial NOT NULL,
+    task character varying(32) NOT NULL,
+    status character varying(16) NOT NULL DEFAULT 'running',
+    snapshot_ts timestamp with time zone,
+    params jsonb,
+    total_batches integer NOT NULL DEFAULT 0,
+    started_at timestamp with time zone NOT NULL DEFAULT now(),
+    finished_at timestamp with time zone,
+    PRIMARY KEY (run_id)
+);
+
+CREATE INDEX idx_t_run_task_status
+    ON public.t_run (task, status, started_at DESC);
+
+CREATE TABLE public.t_run_batch
+(
+    run_id bigint NOT NULL,
+    batch_no integer NOT NULL,
+    item_ids integer[] NOT NULL,
+    status character varying(16) NOT NULL DEFAULT 'pending',
+    attempts integer NOT NULL DEFAULT 0,
+    last_error text,
+    updated_at timestamp with time zone NOT NULL DEFAULT now(),
+    PRIMARY KEY (run_id, batch_no),
+    CONSTRAINT fk_run_batch_run FOREIGN KEY (run_id)
+        REFERENCES public.t_run (run_id) MATCH SIMPLE
+        ON UPDATE NO ACTION
+        ON DELETE CASCADE
+);
+
+CREATE INDEX idx_t_run_batch_pending
+    ON public.t_run_batch (run_id, batch_no)
+    WHERE status <> 'done';
+
+ALTER TABLE IF EXISTS public.t_run
+    OWNER to postgres;
+
+ALTER TABLE IF EXISTS public.t_run_batch
+    OWNER to postgres;
@@ -0,0 +1,68 @@
+CREATE TABLE public.t_price_latest
+(
+    item_id integer NOT NULL,
+    snapshot_ts timestamp with time zone NOT NULL,
+    best_buy integer,
+    best_buy_qty integer,
+    buy_qty bigint NOT NULL DEFAULT 0,
+    buy_levels integer NOT NULL DEFAULT 0,
+    best_sell integer,
+    best_sell_qty integer,
+    sell_qty bigint NOT NULL DEFAULT 0,
+    sell_levels integer NOT NULL DEFAULT 0,
+    PRIMARY KEY (item_id),
+    CONSTRAINT fk_price_latest_item FOREIGN KEY (item_id)
+        REFERENCES public.t_item (id) MATCH SIMPLE
+        ON UPDATE NO ACTION
+        ON DELETE NO ACTION
+);
+
+CREATE INDEX idx_t_price_latest_snapshot_ts
+    ON public.t_price_latest (snapshot_ts);
+
+-- Latest-stats lookups per item (crafting, tiering) become index-only scans.
+CREATE INDEX idx_t_listing_snapshot_stats_latest
+    ON public.t_listing_snapshot_stats (item_id, snapshot_ts_to DESC)
+    INCLUDE (best_buy_curr, best_sell_curr, buy_qty_curr, sell_qty_curr);
+
+-- Seed from the newest stored order book of every item; the ingest keeps it current from here on.
+INSERT INTO public.t_price_latest (
+    item_id, snapshot_ts,
+    best_buy, best_buy_qty, buy_qty, buy_levels,
+    best_sell, best_sell_qty, sell_qty, sell_levels
+)
+SELECT
+    l.item_id,
+    l."time",
+    b.best,
+    b.best_qty,
+    COALESCE(b.qty, 0),
+    b.levels,
+    s.best,
+    s.best_qty,
+    COALESCE(s.qty, 0),
+    s.levels
+FROM (
+    SELECT DISTINCT ON (item_id) item_id, "time", buy_orders, sell_listings
+    FROM public.t_listing
+    ORDER BY item_id, "time" DESC
+) l
+LEFT JOIN LATERAL (
+    SELECT
+        max((e->>'unit_price')::integer) AS best,
+        (array_agg((e->>'quantity')::integer ORDER BY (e->>'unit_price')::integer DESC))[1] AS best_qty,
+        sum((e->>'quantity')::bigint) AS qty,
+        count(*) AS levels
+    FROM jsonb_array_elements(CASE WHEN jsonb_typeof(l.buy_orders) = 'array' THEN l.buy_orders ELSE '[]'::jsonb END) e
+) b ON TRUE
+LEFT JOIN LATERAL (
+    SELECT
+        min((e->>'unit_price')::integer) AS best,
+        (array_agg((e->>'quantity')::integer ORDER BY (e->>'unit_price')::integer))[1] AS best_qty,
+        sum((e->>'quantity')::bigint) AS qty,
+        count(*) AS levels
+    FROM jsonb_array_elements(CASE WHEN jsonb_typeof(l.sell_listings) = 'array' THEN l.sell_listings ELSE '[]'::jsonb END) e
+) s ON TRUE;
+
+ALTER TABLE IF EXISTS public.t_price_latest
+    OWNER to postgres;
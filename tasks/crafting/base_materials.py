@@ -0,0 +1,109 @@
+import time
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+import logging
+import sys
+import argparse
+from typing import Dict, List, Optional, Set
+
+from tasks.crafting.recipe_graph import RecipeGraph, load_recipe_graph
+from utils.db import copy_rows, execute_sql, fetch_all, fetch_column_list, run_transaction
+
+
+BASE_MATERIAL_COLUMNS = ("recipe_id", "output_item_id", "item_id", "count")
+BASE_MATERIAL_SOURCE_COLUMNS = ("recipe_id", "content_hash")
+
+
+def load_changed_recipes() -> Set[int]:
+    """Recipes that were added, changed or removed since their expansion was last written."""
+    return set(fetch_column_list(
+        """
+        SELECT COALESCE(r.id, s.recipe_id)
+        FROM t_recipe r
+        FULL JOIN t_recipe_base_material_source s ON s.recipe_id = r.id
+        WHERE r.id IS NULL OR s.recipe_id IS NULL OR r.content_hash IS DISTINCT FROM s.content_hash
+        """
+    ))
+
+
+def build_base_material_rows(graph: RecipeGraph, recipe_ids: Set[int]) -> List[tuple]:
+    rows = []
+    for recipe_id, bill in graph.base_materials(recipe_ids).items():
+        output_item_id = graph.recipes[recipe_id].output_item_id
+        rows.extend((recipe_id, output_item_id, item_id, round(float(count), 6)) for item_id, count in bill.items())
+    return rows
+
+
+def update_base_materials(logger: logging.Logger, full: bool = False, graph: Optional[RecipeGraph] = None) -> int:
+    """Rebuild ``t_recipe_base_material`` for changed recipes and every recipe that depends on them.
+
+    A change to a recipe changes the bill of its output item, so all recipes whose output
+    transitively consumes that item are rewritten too; everything else is left alone.
+    Returns the number of recipes rewritten.
+    """
+    start_time = time.time()
+    if graph is None:
+        graph = load_recipe_graph()
+    changed = set(graph.recipes) if full else load_changed_recipes()
+    if not changed:
+        logger.info("Base materials are up to date.")
+        return 0
+
+    removed = [rid for rid in changed if rid not in graph.recipes]
+    outputs = {graph.recipes[rid].output_item_id for rid in changed if rid in graph.recipes}
+    if removed:
+        outputs.update(r[0] for r in fetch_all(
+            "SELECT DISTINCT output_item_id FROM t_recipe_base_material WHERE recipe_id = ANY(%s)", (removed,)))
+    affected = graph.consumers_of(outputs)
+    rows = build_base_material_rows(graph, affected)
+    hashes: Dict[int, Optional[str]] = dict(fetch_all("SELECT id, content_hash FROM t_recipe WHERE id = ANY(%s)",
+                                                      (list(affected),)))
+
+    with run_transaction():
+        if full:
+            execute_sql("DELETE FROM t_recipe_base_material")
+            execute_sql("DELETE FROM t_recipe_base_material_source")
+        else:
+            ids = list(affected | set(removed))
+            execute_sql("DELETE FROM t_recipe_base_material WHERE recipe_id = ANY(%s)", (ids,))
+            execute_sql("DELETE FROM t_recipe_base_material_source WHERE recipe_id = ANY(%s)", (ids,))
+        copy_rows("public.t_recipe_base_material", BASE_MATERIAL_COLUMNS, rows, logger=logger)
+        copy_rows("public.t_recipe_base_material_source", BASE_MATERIAL_SOURCE_COLUMNS,
+                  [(rid, hashes.get(rid)) for rid in affected], logger=logger)
+
+    logger.info(f"Rebuilt base materials of {len(affected)} recipes ({len(changed)} changed) "
+                f"into {len(rows)} rows in {time.time() - start_time:.2f}s.")
+    return len(affected)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Expand every recipe into the base materials it consumes.")
+    parser.add_argument("--log-file", default=None, help="Optional path to a rotating log file")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Enable debug logging to console")
+    parser.add_argument("--full", action="store_true", help="Rebuild every recipe instead of only changed ones")
+    args = parser.parse_args()
+
+    logger = logging.getLogger("gw2_base_materials")
+    logger.setLevel(logging.DEBUG if args.verbose else logging.INFO)
+
+    console = logging.StreamHandler(sys.stdout)
+    console.setLevel(logging.DEBUG if args.verbose else logging.INFO)
+    console.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s"))
+    logger.addHandler(console)
+
+    if args.log_file:
+        Path(args.log_file).parent.mkdir(parents=True, exist_ok=True)
+        file_handler = RotatingFileHandler(args.log_file, maxBytes=5 * 1024 * 1024, backupCount=3)
+        file_handler.setLevel(logging.DEBUG)
+        file_handler.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s"))
+        logger.addHandler(file_handler)
+
+    try:
+        update_base_materials(logger, full=args.full)
+    except Exception as e:
+        logger.exception(f"Error while expanding base materials: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
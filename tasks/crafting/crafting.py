@@ -1,13 +1,151 @@
+import time
+from datetime import datetime, timezone
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+import logging
+import sys
+import argparse
+from typing import Dict, List, NamedTuple, Optional
 
+from tasks.crafting.recipe_graph import RecipeGraph, load_recipe_graph
+from utils.db import load_sql, fetch_all, execute_sql, copy_rows, run_transaction
+from utils.constants import TP_FEE_RATE
 
 
+LATEST_PRICES_SQL = load_sql(Path(__file__).parent / 'sql' / 'latest_prices.sql')
+CRAFTING_PROFIT_COLUMNS = (
+    "item_id",
+    "recipe_id",
+    "buy_cost",
+    "craft_cost",
+    "sell_price",
+    "profit",
+    "computed_at",
+)
 
 
+class CraftCost(NamedTuple):
+    item_id: int
+    recipe_id: Optional[int]
+    buy_cost: Optional[int]
+    craft_cost: Optional[float]
+
+    @property
+    def best_cost(self) -> Optional[float]:
+        options = [c for c in (self.buy_cost, self.craft_cost) if c is not None]
+        return min(options) if options else None
+
+
+def load_latest_prices() -> Dict[int, tuple]:
+    """Return ``item_id -> (best_buy, best_sell)`` from the most recent snapshot of each item."""
+    return {item_id: (best_buy, best_sell) for item_id, best_buy, best_sell in fetch_all(LATEST_PRICES_SQL)}
+
+
+def compute_craft_costs(graph: RecipeGraph, buy_prices: Dict[int, int]) -> Dict[int, CraftCost]:
+    """Minimum acquisition cost of every craftable item, buying or crafting each ingredient.
+
+    Items are solved in topological order, so each sub-recipe is evaluated exactly once and its
+    result reused by every recipe that consumes it. Ingredients reached through a cycle are
+    valued at their buy price.
+    """
+    order, _ = graph.topological_order()
+    costs: Dict[int, CraftCost] = {}
+
+    def unit_cost(item_id: int) -> Optional[float]:
+        solved = costs.get(item_id)
+        if solved is not None:
+            return solved.best_cost
+        return buy_prices.get(item_id)
+
+    for item_id in order:
+        best_recipe = None
+        best_craft = None
+        for recipe in graph.by_output[item_id]:
+            total = 0.0
+            for ing_id, count in recipe.ingredients:
+                cost = unit_cost(ing_id)
+                if cost is None:
+                    total = None
+                    break
+                total += cost * count
+            if total is None or not recipe.ingredients:
+                continue
+            craft = total / recipe.output_item_count
+            if best_craft is None or craft < best_craft:
+                best_recipe, best_craft = recipe.id, craft
+
+        costs[item_id] = CraftCost(item_id, best_recipe, buy_prices.get(item_id), best_craft)
+
+    return costs
+
+
+def build_profit_rows(costs: Dict[int, CraftCost], sell_prices: Dict[int, int], computed_at: datetime) -> List[tuple]:
+    rows = []
+    for cost in costs.values():
+        if cost.craft_cost is None:
+            continue
+        sell_price = sell_prices.get(cost.item_id)
+        profit = sell_price * (1 - TP_FEE_RATE) - cost.craft_cost if sell_price is not None else None
+        rows.append((
+            cost.item_id,
+            cost.recipe_id,
+            cost.buy_cost,
+            round(cost.craft_cost, 2),
+            sell_price,
+            round(profit, 2) if profit is not None else None,
+            computed_at,
+        ))
+    return rows
+
+
+def run_crafting_analysis(logger: logging.Logger) -> int:
+    start_time = time.time()
+    graph = load_recipe_graph()
+    prices = load_latest_prices()
+    load_time = time.time() - start_time
+
+    sell_prices = {item_id: best_sell for item_id, (_, best_sell) in prices.items() if best_sell is not None}
+    start_time = time.time()
+    costs = compute_craft_costs(graph, sell_prices)
+    rows = build_profit_rows(costs, sell_prices, datetime.now(timezone.utc))
+    compute_time = time.time() - start_time
+
+    with run_transaction():
+        execute_sql("DELETE FROM t_crafting_profit")
+        copy_rows("public.t_crafting_profit", CRAFTING_PROFIT_COLUMNS, rows, logger=logger)
+
+    logger.info(f"Computed craft costs for {len(costs)} items from {len(graph.recipes)} recipes "
+                f"(load {load_time:.2f}s, compute {compute_time:.3f}s); wrote {len(rows)} rows into 't_crafting_profit'.")
+    return len(rows)
 
 
 def main():
-    print('done')
+    parser = argparse.ArgumentParser(description="Compare buying versus crafting every craftable item at the latest prices.")
+    parser.add_argument("--log-file", default=None, help="Optional path to a rotating log file")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Enable debug logging to console")
+    args = parser.parse_args()
+
+    logger = logging.getLogger("gw2_crafting")
+    logger.setLevel(logging.DEBUG if args.verbose else logging.INFO)
+
+    console = logging.StreamHandler(sys.stdout)
+    console.setLevel(logging.DEBUG if args.verbose else logging.INFO)
+    console.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s"))
+    logger.addHandler(console)
+
+    if args.log_file:
+        Path(args.log_file).parent.mkdir(parents=True, exist_ok=True)
+        file_handler = RotatingFileHandler(args.log_file, maxBytes=5 * 1024 * 1024, backupCount=3)
+        file_handler.setLevel(logging.DEBUG)
+        file_handler.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s"))
+        logger.addHandler(file_handler)
+
+    try:
+        run_crafting_analysis(logger)
+    except Exception as e:
+        logger.exception(f"Error while computing crafting profits: {e}")
+        sys.exit(1)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
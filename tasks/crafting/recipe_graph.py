@@ -0,0 +1,133 @@
+from collections import defaultdict
+from fractions import Fraction
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from utils.db import fetch_all
+
+
+class Recipe(NamedTuple):
+    id: int
+    output_item_id: int
+    output_item_count: int
+    ingredients: Tuple[Tuple[int, int], ...]
+
+
+class RecipeGraph:
+    """In-memory view of ``t_recipe``/``t_ingredient`` keyed by output item."""
+
+    def __init__(self, recipes: List[Recipe]):
+        self.recipes: Dict[int, Recipe] = {r.id: r for r in recipes}
+        self.by_output: Dict[int, List[Recipe]] = defaultdict(list)
+        for recipe in recipes:
+            self.by_output[recipe.output_item_id].append(recipe)
+        for options in self.by_output.values():
+            options.sort(key=lambda r: r.id)
+
+    def is_craftable(self, item_id: int) -> bool:
+        return item_id in self.by_output
+
+    def dependencies(self, item_id: int) -> Set[int]:
+        return {ing for recipe in self.by_output.get(item_id, ()) for ing, _ in recipe.ingredients
+                if ing in self.by_output}
+
+    def topological_order(self) -> Tuple[List[int], Set[Tuple[int, int]]]:
+        """Return craftable items with every craftable ingredient before its outputs.
+
+        Edges that close a cycle are left out of the ordering and returned separately as
+        ``(item_id, ingredient_id)`` pairs.
+        """
+        order: List[int] = []
+        cycle_edges: Set[Tuple[int, int]] = set()
+        state: Dict[int, int] = {}  # 1 = on stack, 2 = done
+
+        for root in self.by_output:
+            if root in state:
+                continue
+            state[root] = 1
+            stack = [(root, iter(self.dependencies(root)))]
+            while stack:
+                item, deps = stack[-1]
+                advanced = False
+                for dep in deps:
+                    dep_state = state.get(dep)
+                    if dep_state is None:
+                        state[dep] = 1
+                        stack.append((dep, iter(self.dependencies(dep))))
+                        advanced = True
+                        break
+                    if dep_state == 1:
+                        cycle_edges.add((item, dep))
+                if not advanced:
+                    stack.pop()
+                    state[item] = 2
+                    order.append(item)
+
+        return order, cycle_edges
+
+    def ancestors(self, item_ids: Iterable[int]) -> Set[int]:
+        """``item_ids`` plus every craftable item that consumes one of them, directly or not."""
+        consumers: Dict[int, Set[int]] = defaultdict(set)
+        for recipe in self.recipes.values():
+            for ing, _ in recipe.ingredients:
+                consumers[ing].add(recipe.output_item_id)
+
+        seen = set(item_ids)
+        stack = list(seen)
+        while stack:
+            for parent in consumers.get(stack.pop(), ()):
+                if parent not in seen:
+                    seen.add(parent)
+                    stack.append(parent)
+        return seen
+
+    def base_materials(self, recipe_ids: Optional[Iterable[int]] = None) -> Dict[int, Dict[int, Fraction]]:
+        """Base materials consumed by one craft of each recipe in ``recipe_ids`` (default: all).
+
+        Craftable ingredients are expanded through their lowest-ID recipe that has ingredients.
+        The per-unit bill of every craftable item is computed once, in topological order, and
+        reused by every recipe that needs it. An ingredient that is only reachable through a
+        cycle is not expanded and counts as a base material, and so is an ingredient whose bill
+        contains the item being crafted: that ingredient is made from the output itself, so
+        expanding it would list the output as its own material.
+        """
+        order, _ = self.topological_order()
+        unit: Dict[int, Dict[int, Fraction]] = {}
+
+        def expand(recipe: Recipe) -> Dict[int, Fraction]:
+            bill: Dict[int, Fraction] = defaultdict(Fraction)
+            for ing, count in recipe.ingredients:
+                sub = unit.get(ing)
+                if sub is None or recipe.output_item_id in sub:
+                    bill[ing] += count
+                    continue
+                for material, n in sub.items():
+                    bill[material] += count * n
+            return bill
+
+        for item_id in order:
+            primary = next((r for r in self.by_output[item_id] if r.ingredients), None)
+            if primary is None:
+                continue
+            unit[item_id] = {m: n / primary.output_item_count for m, n in expand(primary).items()}
+
+        ids = self.recipes if recipe_ids is None else recipe_ids
+        return {rid: dict(expand(self.recipes[rid])) for rid in ids if rid in self.recipes}
+
+    def consumers_of(self, item_ids: Iterable[int]) -> Set[int]:
+        """Recipes whose bill can change when the bills of ``item_ids`` change: every recipe
+        producing one of them or anything that consumes one of them, directly or not."""
+        return {r.id for item_id in self.ancestors(item_ids) for r in self.by_output.get(item_id, ())}
+
+
+def load_recipe_graph() -> RecipeGraph:
+    ingredients: Dict[int, List[Tuple[int, int]]] = defaultdict(list)
+    for recipe_id, item_id, count in fetch_all("SELECT recipe_id, item_id, count FROM t_ingredient"):
+        ingredients[recipe_id].append((item_id, count))
+
+    recipes = [
+        Recipe(id_, output_item_id, output_item_count or 1, tuple(ingredients.get(id_, ())))
+        for id_, output_item_id, output_item_count in fetch_all(
+            "SELECT id, output_item_id, output_item_count FROM t_recipe"
+        )
+    ]
+    return RecipeGraph(recipes)
@@ -0,0 +1,6 @@
+SELECT
+    item_id,
+    best_buy,
+    best_sell
+FROM public.t_price_latest
+WHERE snapshot_ts >= now() - interval '1 day';
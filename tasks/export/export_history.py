@@ -0,0 +1,280 @@
+import json
+import os
+import time
+from datetime import date, datetime, timedelta, timezone, time as dt_time
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+import logging
+import sys
+import argparse
+from typing import Callable, Dict, Iterable, List, Optional
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as pads
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - optional dependency
+    pa = None
+
+from utils.db import load_sql, fetch_column_list, fetch_write_watermark, stream_rows
+from utils.json_codec import loads
+
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 2
+EXPORT_RUNS_SQL = load_sql(Path(__file__).parent / 'sql' / 'select_export_runs.sql')
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise RuntimeError("The history export needs pyarrow: pip install pyarrow")
+
+
+def _level_schema():
+    return pa.schema([
+        ("item_id", pa.int32()),
+        ("time", pa.timestamp("us", tz="UTC")),
+        ("side", pa.string()),
+        ("unit_price", pa.int32()),
+        ("quantity", pa.int32()),
+        ("listings", pa.int32()),
+    ])
+
+
+def _stats_schema():
+    return pa.schema(
+        [("item_id", pa.int32()), ("snapshot_ts_from", pa.timestamp("us", tz="UTC")),
+         ("snapshot_ts_to", pa.timestamp("us", tz="UTC"))]
+        + [(f"{col}_{kind}", pa.int64())
+           for col in ("buy_qty", "sell_qty", "best_buy", "best_sell") for kind in ("prev", "curr", "change")]
+    )
+
+
+def _flatten_books(rows: List[tuple]) -> List[tuple]:
+    """One row per price level from ``(item_id, time, buys_json, sells_json)`` rows."""
+    levels = []
+    for item_id, ts, buys, sells in rows:
+        for side, book in (("B", buys), ("S", sells)):
+            for level in (loads(book) if book else None) or ():
+                levels.append((item_id, ts, side, level.get("unit_price"), level.get("quantity"), level.get("listings")))
+    return levels
+
+
+class Dataset:
+    """An exported table: its day query, Arrow schema, where the timestamp sits in a query row and
+    which completed price runs feed it (``storage`` filter, and whether it is the stats table,
+    which only becomes final once ``update_volume`` has processed a full-storage run)."""
+
+    def __init__(self, name: str, table: str, time_column: str, time_index: int, sql_file: str, schema: Callable,
+                 to_rows: Callable[[List[tuple]], List[tuple]] = list, storage: Optional[str] = None,
+                 stats: bool = False):
+        self.name = name
+        self.table = table
+        self.time_column = time_column
+        self.time_index = time_index
+        self.sql = load_sql(Path(__file__).parent / 'sql' / sql_file)
+        self.schema = schema
+        self.to_rows = to_rows
+        self.storage = storage
+        self.stats = stats
+
+    def to_table(self, rows: List[tuple]):
+        schema = self.schema()
+        rows = self.to_rows(rows)
+        columns = list(zip(*rows)) if rows else [[] for _ in schema]
+        return pa.Table.from_arrays([pa.array(col, type=field.type) for col, field in zip(columns, schema)],
+                                    schema=schema)
+
+
+DATASETS: Dict[str, Dataset] = {
+    "listing": Dataset("listing", "t_listing", '"time"', 1, "select_listing_day.sql", _level_schema, _flatten_books),
+    "listing_delta": Dataset("listing_delta", "t_listing_delta", '"time"', 1, "select_listing_delta_day.sql",
+                             _level_schema, storage="delta"),
+    "stats": Dataset("stats", "t_listing_snapshot_stats", "snapshot_ts_to", 2, "select_stats_day.sql", _stats_schema,
+                     stats=True),
+}
+
+
+def _day_start(day: date) -> datetime:
+    return datetime.combine(day, dt_time.min, tzinfo=timezone.utc)
+
+
+def load_manifest(out_dir: str | Path) -> dict:
+    path = Path(out_dir) / MANIFEST_NAME
+    if not path.exists():
+        return {"version": MANIFEST_VERSION, "datasets": {}}
+    manifest = json.loads(path.read_text(encoding="utf-8"))
+    if manifest.get("version") != MANIFEST_VERSION:
+        raise RuntimeError(f"Export manifest '{path}' has version {manifest.get('version')}, "
+                           f"expected {MANIFEST_VERSION}; export into a new directory.")
+    return manifest
+
+
+def _save_manifest(out_dir: Path, manifest: dict):
+    path = out_dir / MANIFEST_NAME
+    tmp = path.with_name(path.name + f".{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def load_export_snapshots(dataset: Dataset, after: datetime, until: datetime) -> List[datetime]:
+    """Snapshots of completed price runs whose ``dataset`` rows became final in ``[after, until)``."""
+    return fetch_column_list(EXPORT_RUNS_SQL, {"storage": dataset.storage, "stats": dataset.stats,
+                                               "after": after, "until": until})
+
+
+def _export_day(dataset: Dataset, day: date, snapshots: List[datetime], until: datetime, out_dir: Path):
+    """Stream the rows of ``snapshots`` (all on ``day``) into a new temporary part file.
+
+    Returns ``(tmp, path, rows)``; ``tmp`` is ``None`` when nothing was written.
+    """
+    day_dir = out_dir / dataset.name / f"date={day.isoformat()}"
+    path = day_dir / f"part-{int(until.timestamp() * 1000)}.parquet"
+    tmp = path.with_name(path.name + ".tmp")
+    writer = None
+    rows = 0
+    params = {"snapshots": snapshots, "from_ts": _day_start(day), "to_ts": _day_start(day + timedelta(days=1))}
+    try:
+        for chunk in stream_rows(dataset.sql, params):
+            if writer is None:
+                day_dir.mkdir(parents=True, exist_ok=True)
+                writer = pq.ParquetWriter(tmp, dataset.schema(), compression="zstd")
+            table = dataset.to_table(chunk)
+            if table.num_rows:
+                writer.write_table(table)
+            rows += table.num_rows
+    except BaseException:
+        if writer is not None:
+            writer.close()
+            tmp.unlink(missing_ok=True)
+        raise
+
+    if writer is None:
+        return None, path, 0
+    writer.close()
+    return tmp, path, rows
+
+
+def export_dataset(dataset: Dataset, out_dir: str | Path, logger: logging.Logger) -> int:
+    """Append the snapshots of ``dataset`` that became final since the manifest's watermark.
+
+    Only snapshots of completed price runs are exported, so a run that is still being written,
+    resumed or worked on by other workers is never exported half way. The watermark is the
+    server-side write watermark (see :func:`utils.db.fetch_write_watermark`) compared with the
+    time the run completed, or for full-storage stats the time ``update_volume`` wrote them, so a
+    run that completes late for an old snapshot is still picked up. Stats that ``update_volume``
+    rewrites later are exported again into a newer part file, and :func:`load_history` only
+    keeps the rows of the newest part for each item and snapshot.
+
+    Each UTC day of snapshots is streamed through a server-side cursor into its own part file
+    under ``<dataset>/date=YYYY-MM-DD/``. The part files are only moved into place, and the
+    manifest only advanced, once every day of the export has been written.
+    """
+    _require_pyarrow()
+    out_dir = Path(out_dir)
+    manifest = load_manifest(out_dir)
+    state = manifest["datasets"].setdefault(dataset.name, {"watermark": None, "rows": 0, "files": []})
+    after = datetime.fromisoformat(state["watermark"]) if state["watermark"] else EPOCH
+    until = fetch_write_watermark()
+
+    by_day: Dict[date, List[datetime]] = {}
+    for snapshot_ts in load_export_snapshots(dataset, after, until):
+        by_day.setdefault(snapshot_ts.astimezone(timezone.utc).date(), []).append(snapshot_ts)
+
+    written = []
+    try:
+        for day in sorted(by_day):
+            start_time = time.time()
+            tmp, path, rows = _export_day(dataset, day, by_day[day], until, out_dir)
+            if tmp is not None:
+                written.append((tmp, path, rows))
+                logger.info(f"Exported {rows} '{dataset.name}' rows of {len(by_day[day])} snapshots for "
+                            f"{day.isoformat()} in {time.time() - start_time:.2f}s.")
+    except BaseException:
+        for tmp, _, _ in written:
+            tmp.unlink(missing_ok=True)
+        raise
+
+    exported = 0
+    for tmp, path, rows in written:
+        os.replace(tmp, path)
+        state["files"].append({"path": path.relative_to(out_dir).as_posix(), "rows": rows})
+        exported += rows
+    state["rows"] += exported
+    state["watermark"] = until.isoformat()
+    _save_manifest(out_dir, manifest)
+    return exported
+
+
+def export_history(out_dir: str | Path, logger: logging.Logger, datasets: Iterable[str] = tuple(DATASETS)) -> int:
+    return sum(export_dataset(DATASETS[name], out_dir, logger) for name in datasets)
+
+
+def load_history(out_dir: str | Path, start: datetime, end: datetime, item_ids: Optional[Iterable[int]] = None,
+                 dataset: str = "listing", columns: Optional[List[str]] = None):
+    """Read rows of ``dataset`` with ``start <= time < end`` from an export, as a ``pyarrow.Table``.
+
+    Only the day directories that overlap the range are opened and the item filter is pushed
+    down to the Parquet row groups; the database is not involved. A snapshot exported again
+    (stats rewritten by ``update_volume``) appears in several part files of its day; for each
+    item and snapshot only the rows of the newest part file are returned.
+    """
+    _require_pyarrow()
+    time_column = DATASETS[dataset].time_column.strip('"')
+    ds = pads.dataset(Path(out_dir) / dataset, format="parquet", partitioning="hive")
+    expr = ((pads.field("date") >= start.astimezone(timezone.utc).date().isoformat())
+            & (pads.field("date") <= end.astimezone(timezone.utc).date().isoformat())
+            & (pads.field(time_column) >= pa.scalar(start, type=pa.timestamp("us", tz="UTC")))
+            & (pads.field(time_column) < pa.scalar(end, type=pa.timestamp("us", tz="UTC"))))
+    if item_ids is not None:
+        expr = expr & pads.field("item_id").isin(list(item_ids))
+
+    key = ["item_id", time_column]
+    names = list(dict.fromkeys((columns or ds.schema.names) + key))
+    tables = []
+    for fragment in ds.get_fragments(filter=expr):
+        table = fragment.to_table(schema=ds.schema, filter=expr, columns=names)
+        part = int(Path(fragment.path).stem.rsplit("-", 1)[1])
+        tables.append(table.append_column("_part", pa.array([part] * table.num_rows, type=pa.int64())))
+    if not tables:
+        return ds.schema.empty_table().select(columns or ds.schema.names)
+    table = pa.concat_tables(tables)
+    newest = table.group_by(key).aggregate([("_part", "max")]).rename_columns(key + ["_part"])
+    table = table.join(newest, keys=key + ["_part"], join_type="inner").sort_by([(k, "ascending") for k in key])
+    return table.select(columns or ds.schema.names)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export listing history to day-partitioned Parquet files.")
+    parser.add_argument("--log-file", default=None, help="Optional path to a rotating log file")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Enable debug logging to console")
+    parser.add_argument("-o", "--out-dir", required=True, help="Export directory; holds one subdirectory per dataset and the manifest")
+    parser.add_argument("-d", "--datasets", nargs="+", default=list(DATASETS), choices=list(DATASETS), help="Datasets to export")
+    args = parser.parse_args()
+
+    logger = logging.getLogger("gw2_history_export")
+    logger.setLevel(logging.DEBUG if args.verbose else logging.INFO)
+
+    console = logging.StreamHandler(sys.stdout)
+    console.setLevel(logging.DEBUG if args.verbose else logging.INFO)
+    console.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s"))
+    logger.addHandler(console)
+
+    if args.log_file:
+        Path(args.log_file).parent.mkdir(parents=True, exist_ok=True)
+        file_handler = RotatingFileHandler(args.log_file, maxBytes=5 * 1024 * 1024, backupCount=3)
+        file_handler.setLevel(logging.DEBUG)
+        file_handler.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s"))
+        logger.addHandler(file_handler)
+
+    try:
+        count = export_history(args.out_dir, logger, args.datasets)
+        logger.info(f"Exported {count} rows into '{args.out_dir}'.")
+    except Exception as e:
+        logger.exception(f"Error while exporting history: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
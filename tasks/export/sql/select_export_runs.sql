@@ -0,0 +1,16 @@
+-- Snapshots of completed price runs whose data became final in [after, until), by write order.
+SELECT snapshot_ts
+FROM public.t_run
+WHERE task = 'prices'
+  AND status = 'completed'
+  AND COALESCE(params->>'source', 'listings') = 'listings'
+  AND (%(storage)s IS NULL OR COALESCE(params->>'storage', 'full') = %(storage)s)
+  AND CASE
+          WHEN %(stats)s AND COALESCE(params->>'storage', 'full') = 'full' THEN stats_updated_at
+          ELSE finished_at
+      END >= %(after)s
+  AND CASE
+          WHEN %(stats)s AND COALESCE(params->>'storage', 'full') = 'full' THEN stats_updated_at
+          ELSE finished_at
+      END < %(until)s
+ORDER BY snapshot_ts;
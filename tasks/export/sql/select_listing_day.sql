@@ -0,0 +1,6 @@
+SELECT item_id, "time", buy_orders::text, sell_listings::text
+FROM public.t_listing
+WHERE "time" = ANY(%(snapshots)s)
+  AND "time" >= %(from_ts)s
+  AND "time" < %(to_ts)s
+ORDER BY "time", item_id;
@@ -0,0 +1,6 @@
+SELECT item_id, "time", side, unit_price, quantity, listings
+FROM public.t_listing_delta
+WHERE "time" = ANY(%(snapshots)s)
+  AND "time" >= %(from_ts)s
+  AND "time" < %(to_ts)s
+ORDER BY "time", item_id, side, unit_price;
@@ -0,0 +1,21 @@
+SELECT
+    item_id,
+    snapshot_ts_from,
+    snapshot_ts_to,
+    buy_qty_prev,
+    buy_qty_curr,
+    buy_qty_change,
+    sell_qty_prev,
+    sell_qty_curr,
+    sell_qty_change,
+    best_buy_prev,
+    best_buy_curr,
+    best_buy_change,
+    best_sell_prev,
+    best_sell_curr,
+    best_sell_change
+FROM public.t_listing_snapshot_stats
+WHERE snapshot_ts_to = ANY(%(snapshots)s)
+  AND snapshot_ts_to >= %(from_ts)s
+  AND snapshot_ts_to < %(to_ts)s
+ORDER BY snapshot_ts_to, item_id;
@@ -0,0 +1,201 @@
+import time
+from datetime import datetime, timedelta, timezone
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+import logging
+import sys
+import argparse
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from utils.db import load_sql, fetch_all, execute_sql, copy_rows, run_transaction
+from utils.market import MarketSnapshot
+from utils.constants import TP_FEE_RATE
+from utils.constants import FLIP_TOP_N
+from utils.constants import FLIP_MAX_PRICE_AGE_HOURS
+from tasks.prices.order_book import load_order_book
+
+
+VOLUME_24H_SQL = load_sql(Path(__file__).parent / 'sql' / 'volume_24h.sql')
+FLIP_COLUMNS = (
+    "item_id",
+    "kind",
+    "rank",
+    "buy_price",
+    "sell_price",
+    "unit_profit",
+    "roi",
+    "fill_qty",
+    "potential_profit",
+    "sold_24h",
+    "bought_24h",
+    "snapshot_ts",
+    "computed_at",
+)
+
+
+def _aligned(market: MarketSnapshot, rows: List[tuple], columns: int) -> List[np.ndarray]:
+    """Spread ``(item_id, value, ...)`` rows over arrays in the row order of ``market``; 0 where missing."""
+    out = [np.zeros(len(market), dtype=np.int64) for _ in range(columns)]
+    if not rows:
+        return out
+    data = np.array(rows, dtype=np.int64)
+    pos = market.rows(data[:, 0])
+    found = pos >= 0
+    for i, arr in enumerate(out):
+        arr[pos[found]] = data[found, i + 1]
+    return out
+
+
+def vendor_depth(market: MarketSnapshot, vendor_value: np.ndarray, since: int,
+                 at_ts: datetime) -> Tuple[np.ndarray, np.ndarray]:
+    """Units listed below the vendor value and the profit of vendoring all of them, per market row.
+
+    Only items whose best listing is below their vendor value can have any, so only their
+    stored order books are read (see :func:`tasks.prices.order_book.load_order_book`). An item
+    without a stored book falls back to its top level, which is known to be below the vendor value.
+    """
+    snapshot_ts = market.column("snapshot_ts")
+    best_sell = market.column("best_sell")
+    best_sell_qty = market.column("best_sell_qty")
+    fill = np.zeros(len(market), dtype=np.int64)
+    profit = np.zeros(len(market), dtype=np.int64)
+    for i in np.flatnonzero((best_sell > 0) & (best_sell < vendor_value) & (snapshot_ts >= since)).tolist():
+        value = int(vendor_value[i])
+        book = load_order_book(int(market.item_ids[i]), at_ts)
+        levels = [(level["unit_price"], level["quantity"]) for level in book["sells"]] if book else []
+        levels = [(price, qty) for price, qty in levels if price < value]
+        if not levels:
+            levels = [(int(best_sell[i]), int(best_sell_qty[i]))]
+        fill[i] = sum(qty for _, qty in levels)
+        profit[i] = sum((value - price) * qty for price, qty in levels)
+    return fill, profit
+
+
+def scan_flips(market: MarketSnapshot, vendor_value: np.ndarray, sold: np.ndarray, bought: np.ndarray,
+               vendor_fill: np.ndarray, vendor_profit: np.ndarray, since: int,
+               fee_rate: float = TP_FEE_RATE, top_n: int = FLIP_TOP_N) -> List[tuple]:
+    """Rank flip opportunities over every item of ``market`` at once.
+
+    All inputs are aligned with the market rows; rows whose prices are older than ``since``
+    (epoch seconds) are skipped. Two kinds are scored:
+
+    * ``spread``: outbid the best buy order by 1 and undercut the best listing by 1. The fill
+      is what both sides of the book moved over the last day (``sold`` into buy orders,
+      ``bought`` from listings), i.e. what could plausibly flip per day.
+    * ``vendor``: buy every listing below the item's vendor value (``vendor_fill`` units for
+      ``vendor_profit`` in total, see :func:`vendor_depth`). ``unit_profit`` is the average.
+
+    Buying listings to sell straight into buy orders is not scored: the trading post never
+    lets the best buy order reach the best listing, so it can't pay.
+
+    Returns ``(item_id, kind, rank, buy_price, sell_price, unit_profit, roi, fill_qty,
+    potential_profit, sold_24h, bought_24h, snapshot_ts)`` rows, the best ``top_n`` per kind.
+    """
+    snapshot_ts = market.column("snapshot_ts")
+    best_buy = market.column("best_buy")
+    best_sell = market.column("best_sell")
+    keep = 1.0 - fee_rate
+    fresh = snapshot_ts >= since
+    both = fresh & (best_buy > 0) & (best_sell > 0)
+
+    candidates = []
+    buy_at = best_buy + 1
+    sell_at = best_sell - 1
+    candidates.append(("spread", both & (sell_at > buy_at), buy_at, sell_at,
+                       sell_at * keep - buy_at, np.minimum(sold, bought)))
+    candidates.append(("vendor", fresh & (best_sell > 0), best_sell, vendor_value,
+                       vendor_profit / np.maximum(vendor_fill, 1), vendor_fill))
+
+    rows = []
+    for kind, mask, buy_price, sell_price, unit_profit, fill in candidates:
+        mask = mask & (unit_profit > 0) & (fill > 0)
+        idx = np.flatnonzero(mask)
+        potential = unit_profit[idx] * fill[idx]
+        idx = idx[np.argsort(-potential, kind="stable")[:top_n]]
+        roi = unit_profit[idx] / buy_price[idx]
+        potential = unit_profit[idx] * fill[idx]
+        for rank, (i, r, p) in enumerate(zip(idx.tolist(), roi.tolist(), potential.tolist()), start=1):
+            rows.append((
+                int(market.item_ids[i]),
+                kind,
+                rank,
+                int(buy_price[i]),
+                int(sell_price[i]),
+                round(float(unit_profit[i]), 2),
+                round(r, 4),
+                int(fill[i]),
+                round(p, 2),
+                int(sold[i]),
+                int(bought[i]),
+                datetime.fromtimestamp(int(snapshot_ts[i]), tz=timezone.utc),
+            ))
+    return rows
+
+
+def run_flip_scan(logger: logging.Logger, market: Optional[MarketSnapshot] = None, top_n: int = FLIP_TOP_N,
+                  max_age_hours: float = FLIP_MAX_PRICE_AGE_HOURS) -> int:
+    """Scan the latest prices for flips and replace the contents of ``t_flip_opportunity``.
+
+    Pass the snapshot refreshed after a price run as ``market`` to skip reading ``t_price_latest``.
+    Items whose latest prices are older than ``max_age_hours`` are left out.
+    """
+    start_time = time.time()
+    computed_at = datetime.now(timezone.utc)
+    since = int((computed_at - timedelta(hours=max_age_hours)).timestamp())
+    if market is None:
+        market = MarketSnapshot.build()
+    (vendor_value,) = _aligned(market, fetch_all("SELECT id, COALESCE(vendor_value, 0) FROM t_item"), 1)
+    bought, sold = _aligned(market, fetch_all(VOLUME_24H_SQL), 2)
+    vendor_fill, vendor_profit = vendor_depth(market, vendor_value, since, computed_at)
+    load_time = time.time() - start_time
+
+    start_time = time.time()
+    rows = [row + (computed_at,)
+            for row in scan_flips(market, vendor_value, sold, bought, vendor_fill, vendor_profit, since, top_n=top_n)]
+    compute_time = time.time() - start_time
+
+    with run_transaction():
+        execute_sql("DELETE FROM t_flip_opportunity")
+        copy_rows("public.t_flip_opportunity", FLIP_COLUMNS, rows, logger=logger)
+
+    logger.info(f"Scanned {len(market)} items for flips (load {load_time:.2f}s, compute {compute_time:.3f}s); "
+                f"wrote {len(rows)} rows into 't_flip_opportunity'.")
+    return len(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rank spread and vendor flips over the latest prices.")
+    parser.add_argument("--log-file", default=None, help="Optional path to a rotating log file")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Enable debug logging to console")
+    parser.add_argument("--market-file", default=None, help="Read prices from this market snapshot instead of 't_price_latest'")
+    parser.add_argument("--top", type=int, default=FLIP_TOP_N, help="Opportunities to keep per kind")
+    parser.add_argument("--max-age-hours", type=float, default=FLIP_MAX_PRICE_AGE_HOURS, help="Skip items whose latest prices are older than this")
+    args = parser.parse_args()
+
+    logger = logging.getLogger("gw2_flips")
+    logger.setLevel(logging.DEBUG if args.verbose else logging.INFO)
+
+    console = logging.StreamHandler(sys.stdout)
+    console.setLevel(logging.DEBUG if args.verbose else logging.INFO)
+    console.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s"))
+    logger.addHandler(console)
+
+    if args.log_file:
+        Path(args.log_file).parent.mkdir(parents=True, exist_ok=True)
+        file_handler = RotatingFileHandler(args.log_file, maxBytes=5 * 1024 * 1024, backupCount=3)
+        file_handler.setLevel(logging.DEBUG)
+        file_handler.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s"))
+        logger.addHandler(file_handler)
+
+    try:
+        market = MarketSnapshot.load(args.market_file) if args.market_file else None
+        run_flip_scan(logger, market=market, top_n=args.top, max_age_hours=args.max_age_hours)
+    except Exception as e:
+        logger.exception(f"Error while scanning for flips: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,8 @@
+-- Units taken from the sell side (bought) and from the buy side (sold into orders) over the last day.
+SELECT
+    item_id,
+    sum(GREATEST(-sell_qty_change, 0)) AS bought,
+    sum(GREATEST(-buy_qty_change, 0))  AS sold
+FROM public.t_listing_snapshot_stats
+WHERE snapshot_ts_to >= now() - interval '1 day'
+GROUP BY item_id;
@@ -1,4 +1,3 @@
-import time
 from datetime import datetime, timezone
 from logging.handlers import RotatingFileHandler
 from pathlib import Path
@@ -6,103 +5,179 @@ import requests
 import logging
 import sys
 import argparse
-from typing import List, Iterable
+from typing import List, Dict, Optional
 
-from utils.rate_limit import TokenBucket
+from utils.rate_limit import TokenBucket, create_limiter
 from utils.http import http_get
-from utils.db import load_sql, execute_values_batch
+from utils.http_cache import HttpCache
+from utils.fetch import chunked, fetch_batches, create_session
+from utils.checkpoint import RunCheckpoint, run_checkpointed, run_worker
+from utils.sync import content_hash, select_sync_ids
+from utils.json_codec import loads
+from utils.db import load_sql, copy_upsert, fetch_all, init_pool, close_pool
 from utils.constants import GW2_API_ITEMS_URL
-from utils.constants import MAX_IDS_PER_REQUEST
+from utils.metrics import METRICS, profiled
 from utils.constants import DEFAULT_BURST
 from utils.constants import DEFAULT_REFILL_RATE
+from utils.constants import DEFAULT_MAX_WORKERS
+from utils.constants import DEFAULT_COMMIT_EVERY
 
 
 ITEMS_UPSERT_SQL = load_sql(Path(__file__).parent / 'sql' /'upsert_items.sql')
-
-
-def get_all_item_ids(session: requests.Session, limiter: TokenBucket, logger: logging.Logger) -> List[int]:
+ITEM_COLUMNS = (
+    "id",
+    "name",
+    "icon",
+    "description",
+    "type",
+    "rarity",
+    "level",
+    "vendor_value",
+    "accountbound",
+    "soulbound",
+    "last_update",
+    "content_hash",
+)
+
+
+def get_all_item_ids(session: requests.Session, limiter: TokenBucket, logger: logging.Logger,
+                     cache: Optional[HttpCache] = None) -> List[int]:
     logger.info("Fetching full item ID list...")
-    resp = http_get(GW2_API_ITEMS_URL, session, params=None, limiter=limiter, logger=logger)
-    ids = resp.json()
+    resp = http_get(GW2_API_ITEMS_URL, session, params=None, limiter=limiter, logger=logger, cache=cache)
+    ids = loads(resp.content)
     if not isinstance(ids, list):
         raise RuntimeError("Unexpected response for /v2/items (expected a list of IDs).")
     logger.info(f"Received {len(ids)} item IDs.")
     return ids
 
 
-def chunked(iterable: Iterable[int]) -> Iterable[List[int]]:
-    batch = []
-    for x in iterable:
-        batch.append(x)
-        if len(batch) >= MAX_IDS_PER_REQUEST:
-            yield batch
-            batch = []
-    if batch:
-        yield batch
-
-
-def fetch_item_details_and_write(ids: List[int], session: requests.Session, limiter: TokenBucket, logger: logging.Logger):
-    params = {"ids": ",".join(map(str, ids))}
-    response = http_get(GW2_API_ITEMS_URL, session, params=params, limiter=limiter, logger=logger)
-    items = response.json()
-    if not isinstance(items, list):
-        raise RuntimeError(f"Unexpected response for /v2/items (expected a list of IDs). Got Type: {type(items)}")
-    write_item_details(items, logger=logger)
-
-
-def _parse_item_row(item: dict):
-    id_ = int(item.get("id"))
-    name = item.get("name") or None
-    icon = item.get("icon") or None
-    description = item.get("description") or None
-    type_ = item.get("type") or None
-    rarity = item.get("rarity") or None
-    level = item.get("level") or None
-    vendor_value = item.get("vendor_value") or None
-
-    flags = set(item.get("flags") or [])
-    accountbound = 'AccountBound' in flags
-    soulbound = 'SoulbindOnAcquire' in flags
+def load_item_hashes() -> Dict[int, Optional[str]]:
+    return dict(fetch_all("SELECT id, content_hash FROM t_item"))
 
-    last_update = datetime.now(timezone.utc)
+
+def _parse_item_row(item: dict, last_update: datetime, digest: str):
+    get = item.get
+    flags = get("flags") or ()
     return (
-        id_,
-        name,
-        icon,
-        description,
-        type_,
-        rarity,
-        level,
-        vendor_value,
-        accountbound,
-        soulbound,
+        int(get("id")),
+        get("name") or None,
+        get("icon") or None,
+        get("description") or None,
+        get("type") or None,
+        get("rarity") or None,
+        get("level") or None,
+        get("vendor_value") or None,
+        'AccountBound' in flags,
+        'SoulbindOnAcquire' in flags,
         last_update,
+        digest,
     )
 
 
-def write_item_details(items:List, logger: logging.Logger):
-    if not items:
-        return
-
+def parse_item_details(items: List, logger: logging.Logger,
+                       known_hashes: Optional[Dict[int, Optional[str]]] = None) -> List[tuple]:
+    known_hashes = known_hashes or {}
+    last_update = datetime.now(timezone.utc)
     rows = []
     for it in items:
         try:
-            rows.append(_parse_item_row(it))
+            digest = content_hash(it)
+            if known_hashes.get(it.get("id")) == digest:
+                continue
+            rows.append(_parse_item_row(it, last_update, digest))
         except Exception as e:
             logger.warning(f"Skipping item due to parse error: {e} ; payload={str(it)[:200]}")
 
+    return rows
+
+
+def write_item_rows(rows: List[tuple], logger: logging.Logger):
     if not rows:
         return
 
-    execute_values_batch(ITEMS_UPSERT_SQL, rows, page_size=MAX_IDS_PER_REQUEST, logger=logger)
+    copy_upsert(ITEMS_UPSERT_SQL, "public.t_item", ITEM_COLUMNS, rows, logger=logger)
     logger.debug(f"Upserted {len(rows)} items into 't_item'.")
 
 
+def run_item_sync(
+    session: requests.Session,
+    limiter: TokenBucket,
+    logger: logging.Logger,
+    workers: int = DEFAULT_MAX_WORKERS,
+    commit_every: Optional[int] = DEFAULT_COMMIT_EVERY,
+    atomic: bool = False,
+    incremental: bool = False,
+    cache: Optional[HttpCache] = None,
+    resume: bool = False,
+    run_id: Optional[int] = None,
+    role: str = "standalone",
+) -> int:
+    known_hashes = {}
+    if role == "worker":
+        run = RunCheckpoint.open("items", run_id)
+        if run is None:
+            logger.info("No running item run to work on.")
+            return 0
+        if run.params.get("incremental"):
+            known_hashes = load_item_hashes()
+    elif resume:
+        run = RunCheckpoint.resume("items", run_id)
+        if run is None:
+            logger.info("No unfinished item run to resume.")
+            return 0
+        if run.params.get("incremental"):
+            known_hashes = load_item_hashes()
+        logger.info(f"Resuming run {run.run_id}.")
+    else:
+        all_ids = get_all_item_ids(session, limiter, logger, cache=cache)
+        remaining_ids = all_ids
+        if incremental:
+            known_hashes = load_item_hashes()
+            remaining_ids = select_sync_ids(all_ids, known_hashes)
+            logger.info(f"Incremental sync: {len(remaining_ids)} of {len(all_ids)} IDs are new or due for re-validation.")
+        run = RunCheckpoint.start("items", chunked(remaining_ids), params={"incremental": incremental})
+        logger.info(f"Processing {len(remaining_ids)} IDs in run {run.run_id}.")
+        if role == "coordinator":
+            logger.info(f"Queued run {run.run_id}; process it with --role worker --run-id {run.run_id}.")
+            return 0
+
+    return (run_worker if role == "worker" else run_checkpointed)(
+        run,
+        lambda batches, on_error: fetch_batches(GW2_API_ITEMS_URL, batches, session, limiter, max_workers=workers,
+                                                logger=logger, cache=cache, on_error=on_error),
+        lambda items: (parse_item_details(items, logger=logger, known_hashes=known_hashes),),
+        write_item_rows,
+        logger,
+        commit_every=None if atomic else commit_every,
+    )
+
+
 def main():
     parser = argparse.ArgumentParser(description="Dump GW2 items to CSV with batching, rate-limit handling, and retries.")
     parser.add_argument("--log-file", default=None, help="Optional path to a rotating log file")
     parser.add_argument("-v", "--verbose", action="store_true", help="Enable debug logging to console")
+    parser.add_argument("-w", "--workers", type=int, default=DEFAULT_MAX_WORKERS, help="Number of concurrent API requests")
+    parser.add_argument("--rate-state", default=None,
+                        help="Share the API rate budget with other processes on this host through this file")
+    parser.add_argument("--rate-hosts", type=int, default=1,
+                        help="Number of hosts working on the same API budget; each takes an equal share of it")
+    parser.add_argument("--commit-every", type=int, default=DEFAULT_COMMIT_EVERY, help="Commit after this many batches")
+    parser.add_argument("--atomic", action="store_true", help="Write the whole run in a single transaction")
+    parser.add_argument("-i", "--incremental", action="store_true", help="Only fetch new items plus a rotating re-validation slice")
+    parser.add_argument("--cache-dir", default=None, help="Cache API responses in this directory")
+    parser.add_argument("--replay", action="store_true", help="Serve every request from --cache-dir without touching the API")
+    parser.add_argument("--resume", nargs="?", const="latest", default=None, metavar="RUN_ID",
+                        help="Continue the missing batches of RUN_ID, or of the latest failed or partial run")
+    parser.add_argument("--role", default="standalone", choices=["standalone", "coordinator", "worker"],
+                        help="'coordinator' only queues a run, 'worker' processes a queued run alongside other workers")
+    parser.add_argument("--run-id", type=int, default=None, help="Run for --role worker; defaults to the latest running run")
+    parser.add_argument("--metrics-file", default=None, help="Write run metrics here (.json summary, otherwise Prometheus text)")
+    parser.add_argument("--profile", default=None, help="Profile the run into this file (.prof for cProfile, otherwise sampled stacks)")
     args = parser.parse_args()
+    if args.replay and not args.cache_dir:
+        parser.error("--replay requires --cache-dir")
+    if args.rate_hosts < 1:
+        parser.error("--rate-hosts must be at least 1")
 
     logger = logging.getLogger("gw2_item_dump")
     logger.setLevel(logging.DEBUG if args.verbose else logging.INFO)
@@ -119,31 +194,27 @@ def main():
         file_handler.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s"))
         logger.addHandler(file_handler)
 
-    session = requests.Session()
-    limiter = TokenBucket(capacity=DEFAULT_BURST, refill_rate=DEFAULT_REFILL_RATE)
-
-    try:
-        all_ids = get_all_item_ids(session, limiter, logger)
-    except Exception as e:
-        logger.exception(f"Failed to fetch item IDs: {e}")
-        sys.exit(1)
+    init_pool()
+    session = create_session(args.workers)
+    limiter = create_limiter(args.rate_state, capacity=max(1, DEFAULT_BURST // args.rate_hosts),
+                             refill_rate=DEFAULT_REFILL_RATE / args.rate_hosts)
+    cache = HttpCache(args.cache_dir, replay=args.replay) if args.cache_dir else None
 
-    logger.info(f"Processing all {len(all_ids)} IDs.")
-    start_time = time.time()
-    processed = 0
-    remaining_ids = all_ids
     try:
-        for batch in chunked(remaining_ids):
-            fetch_item_details_and_write(batch, session, limiter, logger)
-            processed += len(batch)
-            if processed % (MAX_IDS_PER_REQUEST * 10) == 0 or processed == len(remaining_ids):
-                elapsed = time.time() - start_time
-                rate = processed / elapsed if elapsed > 0 else 0
-                logger.info(f"Progress: {processed}/{len(remaining_ids)} ({rate:.1f} ids/sec)")
+        with profiled(args.profile):
+            run_item_sync(session, limiter, logger, workers=args.workers, commit_every=args.commit_every,
+                          atomic=args.atomic, incremental=args.incremental, cache=cache, resume=args.resume is not None,
+                          run_id=args.run_id if args.role == "worker" else None if args.resume in (None, "latest") else int(args.resume),
+                          role=args.role)
     except Exception as e:
-        logger.exception(f"Error while fetching item details: {e}")
+        logger.exception(f"Error while syncing items: {e}")
         sys.exit(1)
+    finally:
+        logger.info(f"Rate limiter: {limiter.stats()}")
+        if args.metrics_file:
+            METRICS.write(args.metrics_file)
+        close_pool()
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -9,7 +9,8 @@ INSERT INTO t_item (
     vendor_value,
     accountbound,
     soulbound,
-    last_update
+    last_update,
+    content_hash
 )
 VALUES %s
 ON CONFLICT (id) DO UPDATE SET
@@ -22,4 +23,7 @@ ON CONFLICT (id) DO UPDATE SET
     vendor_value = EXCLUDED.vendor_value,
     accountbound = EXCLUDED.accountbound,
     soulbound    = EXCLUDED.soulbound,
-    last_update  = EXCLUDED.last_update;
\ No newline at end of file
+    last_update  = EXCLUDED.last_update,
+    content_hash = EXCLUDED.content_hash,
+    synced_at    = now()
+WHERE t_item.content_hash IS DISTINCT FROM EXCLUDED.content_hash;
\ No newline at end of file
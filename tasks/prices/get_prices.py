@@ -1,25 +1,40 @@
-import time
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 from logging.handlers import RotatingFileHandler
 from pathlib import Path
 import requests
 import logging
 import sys
 import argparse
-from typing import List, Iterable
+from typing import List, Optional, Tuple
 
-from psycopg2._json import Json
-
-from utils.rate_limit import TokenBucket
-from utils.http import http_get
-from utils.db import load_sql, execute_values_batch, fetch_column_list
+from utils.rate_limit import TokenBucket, create_limiter
+from utils.fetch import chunked, fetch_batches, create_session, decode_list
+from utils.json_codec import RawJson, split_listings
+from utils.checkpoint import RunCheckpoint, run_checkpointed, run_worker
+from utils.db import load_sql, copy_rows, copy_staged, fetch_column_list, init_pool, close_pool
 from utils.constants import GW2_API_TP_LIST_URL
-from utils.constants import MAX_IDS_PER_REQUEST
+from utils.constants import GW2_API_TP_PRICES_URL
+from utils.metrics import METRICS, profiled
 from utils.constants import DEFAULT_BURST
 from utils.constants import DEFAULT_REFILL_RATE
+from utils.constants import DEFAULT_MAX_WORKERS
+from utils.constants import DEFAULT_COMMIT_EVERY
+from utils.constants import LISTING_KEYFRAME_HOURS
+from tasks.prices.update_volume import update_pending_volume_stats
+from tasks.prices.partitions import ensure_listing_partitions
+from tasks.prices.tiers import ensure_price_tiers, next_cold_tier, load_tiered_item_ids
 
 
-PRICES_INSERT_SQL = load_sql(Path(__file__).parent / 'sql' /'update_prices.sql')
+INSERT_LISTINGS_SQL = load_sql(Path(__file__).parent / 'sql' / 'insert_listings.sql')
+UPSERT_PRICE_LATEST_SQL = load_sql(Path(__file__).parent / 'sql' / 'upsert_price_latest.sql')
+STAGE_BOOK_LEVELS_SQL = load_sql(Path(__file__).parent / 'sql' / 'stage_book_levels.sql')
+PLAN_BOOK_KEYFRAMES_SQL = load_sql(Path(__file__).parent / 'sql' / 'plan_book_keyframes.sql')
+INSERT_BOOK_KEYFRAMES_SQL = load_sql(Path(__file__).parent / 'sql' / 'insert_book_keyframes.sql')
+INSERT_BOOK_DELTAS_SQL = load_sql(Path(__file__).parent / 'sql' / 'insert_book_deltas.sql')
+ADVANCE_BOOK_SQL = load_sql(Path(__file__).parent / 'sql' / 'advance_book.sql')
+STAGE_VOLUME_STATS_SQL = load_sql(Path(__file__).parent / 'sql' / 'stage_volume_stats.sql')
+LISTING_COLUMNS = ("item_id", '"time"', "buy_orders", "sell_listings")
+TICK_COLUMNS = ("item_id", "ts", "buy_price", "buy_qty", "sell_price", "sell_qty")
 
 
 def load_all_item_ids() -> List[int]:
@@ -27,66 +42,202 @@ def load_all_item_ids() -> List[int]:
 
 
 def load_quick_item_ids() -> List[int]:
-    return fetch_column_list("SELECT id FROM t_item WHERE accountbound = FALSE AND soulbound = FALSE")
+    """Tradable items whose latest order book, at most a day old, was non-empty."""
+    return fetch_column_list(
+        """
+        SELECT p.item_id
+        FROM t_price_latest p
+        JOIN t_item i ON i.id = p.item_id
+        WHERE p.snapshot_ts >= now() - interval '1 day'
+          AND (p.buy_qty > 0 OR p.sell_qty > 0)
+          AND i.accountbound = FALSE AND i.soulbound = FALSE
+        ORDER BY p.item_id
+        """
+    )
+
 
+def parse_listing_rows(listings: List[Tuple[int, Optional[RawJson], Optional[RawJson]]],
+                       snapshot_ts: datetime) -> List[tuple]:
+    """Rows from :func:`split_listings` tuples; the order books stay raw JSON bytes."""
+    return [(id_, snapshot_ts, buys, sells) for id_, buys, sells in listings]
 
-def chunked(iterable: Iterable[int]) -> Iterable[List[int]]:
-    batch = []
-    for x in iterable:
-        batch.append(x)
-        if len(batch) >= MAX_IDS_PER_REQUEST:
-            yield batch
-            batch = []
-    if batch:
-        yield batch
 
+def write_prices(rows: List[tuple], logger: logging.Logger):
+    """Append the order books to ``t_listing`` and refresh ``t_price_latest`` from the same COPY."""
+    if not rows:
+        return
 
-def fetch_prices_details_and_write(ids: List[int], session: requests.Session, limiter: TokenBucket, logger: logging.Logger):
-    params = {"ids": ",".join(map(str, ids))}
-    response = http_get(GW2_API_TP_LIST_URL, session, params=params, limiter=limiter, logger=logger)
-    listings = response.json()
-    if not isinstance(listings, list):
-        raise RuntimeError(f"Unexpected response for /v2/commerce/listings (expected a list of IDs). Got Type: {type(listings)}")
-    write_prices(listings, logger=logger)
+    copy_staged("public.t_listing", LISTING_COLUMNS, rows, (INSERT_LISTINGS_SQL, UPSERT_PRICE_LATEST_SQL),
+                logger=logger)
+    logger.debug(f"Inserted {len(rows)} listings into 't_listing' and 't_price_latest'.")
 
 
-def _parse_price_row(item: dict):
-    id_ = int(item.get("id"))
-    buy_orders = item.get("buys") or None
-    sell_listings = item.get("sells") or None
+def write_prices_delta(rows: List[tuple], logger: logging.Logger, keyframe_hours: float = LISTING_KEYFRAME_HOURS):
+    """Store order books as keyframes in ``t_listing`` plus changed price levels in ``t_listing_delta``.
 
-    return (
-        id_,
-        SNAPSHOT_TIMESTAMP,
-        Json(buy_orders),
-        Json(sell_listings),
+    An item gets a full keyframe when it has none younger than ``keyframe_hours`` or its current
+    book in ``t_listing_book`` is out of date; otherwise only the levels that differ from the
+    current book are written. ``t_price_latest`` and ``t_listing_snapshot_stats`` are updated in
+    the same pass, since most snapshots no longer have a full book in ``t_listing`` to compute
+    them from later.
+    """
+    if not rows:
+        return
+
+    copy_staged(
+        "public.t_listing",
+        LISTING_COLUMNS,
+        rows,
+        (STAGE_BOOK_LEVELS_SQL, PLAN_BOOK_KEYFRAMES_SQL, INSERT_BOOK_KEYFRAMES_SQL, INSERT_BOOK_DELTAS_SQL,
+         ADVANCE_BOOK_SQL, UPSERT_PRICE_LATEST_SQL, STAGE_VOLUME_STATS_SQL),
+        params={"keyframe_interval": timedelta(hours=keyframe_hours)},
+        logger=logger,
     )
+    logger.debug(f"Stored {len(rows)} listings as keyframes or deltas.")
 
 
-def write_prices(listings:List, logger: logging.Logger):
-    if not listings:
-        return
+def _parse_tick_row(item: dict, snapshot_ts: datetime):
+    buys = item.get("buys") or {}
+    sells = item.get("sells") or {}
+    return (
+        int(item.get("id")),
+        snapshot_ts,
+        int(buys["unit_price"]) if buys.get("unit_price") else None,
+        int(buys.get("quantity") or 0),
+        int(sells["unit_price"]) if sells.get("unit_price") else None,
+        int(sells.get("quantity") or 0),
+    )
+
 
+def parse_price_ticks(prices: List, snapshot_ts: datetime, logger: logging.Logger) -> List[tuple]:
     rows = []
-    for it in listings:
+    for it in prices:
         try:
-            rows.append(_parse_price_row(it))
+            rows.append(_parse_tick_row(it, snapshot_ts))
         except Exception as e:
-            logger.warning(f"Skipping listing due to parse error: {e} ; payload={str(it)[:200]}")
+            logger.warning(f"Skipping price due to parse error: {e} ; payload={str(it)[:200]}")
+    return rows
 
+
+def write_price_ticks(rows: List[tuple], logger: logging.Logger):
     if not rows:
         return
 
-    execute_values_batch(PRICES_INSERT_SQL, rows, page_size=MAX_IDS_PER_REQUEST, logger=logger)
-    logger.debug(f"Upserted {len(rows)} items into 't_item'.")
+    copy_rows("public.t_price_tick", TICK_COLUMNS, rows, logger=logger)
+    logger.debug(f"Inserted {len(rows)} ticks into 't_price_tick'.")
+
+
+def run_price_snapshot(
+    session: requests.Session,
+    limiter: TokenBucket,
+    logger: logging.Logger,
+    workers: int = DEFAULT_MAX_WORKERS,
+    commit_every: Optional[int] = DEFAULT_COMMIT_EVERY,
+    atomic: bool = False,
+    mode: str = "full",
+    skip_volume: bool = False,
+    source: str = "listings",
+    resume: bool = False,
+    run_id: Optional[int] = None,
+    storage: str = "full",
+    role: str = "standalone",
+) -> Optional[datetime]:
+    """Snapshot trading post prices for the IDs selected by ``mode``.
+
+    ``source="listings"`` stores full order-book depth, either as a complete copy per snapshot in
+    ``t_listing`` (``storage="full"``) or as keyframes plus changed levels (``storage="delta"``,
+    see :func:`write_prices_delta`); ``source="prices"`` only stores best bid/ask and total
+    quantities from ``/commerce/prices`` in ``t_price_tick``. A resumed run keeps the source,
+    storage and snapshot timestamp of the run it continues, and so do workers of a queued run.
+    Volume stats are only written once the run is completed, by whichever process closes it
+    or by a later ``update_volume`` job.
+    """
+    run = None
+    if role == "worker" or resume:
+        run = RunCheckpoint.open("prices", run_id) if role == "worker" else RunCheckpoint.resume("prices", run_id)
+        if run is None:
+            logger.info("No unfinished price run to work on.")
+            return None
+        source = run.params.get("source", "listings")
+        storage = run.params.get("storage", "full")
+        snapshot_ts = run.snapshot_ts
+        logger.info(f"Working on run {run.run_id} ({source}) for snapshot {snapshot_ts.isoformat()}.")
+    else:
+        snapshot_ts = datetime.now(timezone.utc)
+
+    if source == "prices":
+        url, decode, write_rows = GW2_API_TP_PRICES_URL, decode_list, write_price_ticks
+        parse = lambda prices: (parse_price_ticks(prices, snapshot_ts, logger),)
+    else:
+        url, decode = GW2_API_TP_LIST_URL, split_listings
+        write_rows = write_prices_delta if storage == "delta" else write_prices
+        parse = lambda listings: (parse_listing_rows(listings, snapshot_ts),)
+    ensure_listing_partitions(logger)
+
+    if run is None:
+        params = {"source": source, "mode": mode, "storage": storage}
+        if mode == "tiered":
+            ensure_price_tiers(logger)
+            params["rotation"], params["cold_tier"] = next_cold_tier(source)
+            all_ids = load_tiered_item_ids(params["cold_tier"])
+            logger.info(f"Tiered mode: polling the hot tier and cold tier {params['cold_tier']} "
+                        f"(rotation {params['rotation']}).")
+        elif mode == "quick":
+            all_ids = load_quick_item_ids() or load_all_item_ids()
+        else:
+            all_ids = load_all_item_ids()
+        run = RunCheckpoint.start("prices", chunked(all_ids), snapshot_ts=snapshot_ts, params=params)
+        logger.info(f"Processing {len(all_ids)} IDs in run {run.run_id}.")
+        if role == "coordinator":
+            logger.info(f"Queued run {run.run_id}; process it with --role worker --run-id {run.run_id}.")
+            return snapshot_ts
+
+    (run_worker if role == "worker" else run_checkpointed)(
+        run,
+        lambda batches, on_error: fetch_batches(url, batches, session, limiter, max_workers=workers, logger=logger,
+                                                decode=decode, on_error=on_error),
+        parse,
+        write_rows,
+        logger,
+        commit_every=None if atomic else commit_every,
+    )
+
+    if source == "listings" and storage == "full" and not skip_volume:
+        update_pending_volume_stats(logger)
+    return snapshot_ts
 
 
 def main():
     parser = argparse.ArgumentParser(description="Get prices for items, rate-limit handling, and retries.")
     parser.add_argument("--log-file", default=None, help="Optional path to a rotating log file")
     parser.add_argument("-v", "--verbose", action="store_true", help="Enable debug logging to console")
-    parser.add_argument("-m", "--mode", default='full', action="store_true", help="'full' for full index, 'quick' for only tradable items")
+    parser.add_argument("-w", "--workers", type=int, default=DEFAULT_MAX_WORKERS, help="Number of concurrent API requests")
+    parser.add_argument("--rate-state", default=None,
+                        help="Share the API rate budget with other processes on this host through this file")
+    parser.add_argument("--rate-hosts", type=int, default=1,
+                        help="Number of hosts working on the same API budget; each takes an equal share of it")
+    parser.add_argument("--commit-every", type=int, default=DEFAULT_COMMIT_EVERY, help="Commit after this many batches")
+    parser.add_argument("--atomic", action="store_true", help="Write the whole run in a single transaction")
+    parser.add_argument("--skip-volume", action="store_true", help="Do not update 't_listing_snapshot_stats' after the snapshot")
+    parser.add_argument("-m", "--mode", default='full', choices=['full', 'quick', 'tiered'],
+                        help="'full' for all tradable items, 'quick' for items with open orders, "
+                             "'tiered' for the hot tier plus one rotating cold tier")
+    parser.add_argument("-s", "--source", default="listings", choices=["listings", "prices"],
+                        help="'listings' for full order-book depth, 'prices' for best bid/ask and quantities only")
+    parser.add_argument("--storage", default="full", choices=["full", "delta"],
+                        help="'full' stores every order book, 'delta' periodic keyframes plus changed price levels")
+    parser.add_argument("--resume", nargs="?", const="latest", default=None, metavar="RUN_ID",
+                        help="Continue the missing batches of RUN_ID, or of the latest failed or partial run, in its snapshot")
+    parser.add_argument("--role", default="standalone", choices=["standalone", "coordinator", "worker"],
+                        help="'coordinator' only queues a run, 'worker' processes a queued run alongside other workers")
+    parser.add_argument("--run-id", type=int, default=None, help="Run for --role worker; defaults to the latest running run")
+    parser.add_argument("--scan-flips", action="store_true", help="Rank flip opportunities into 't_flip_opportunity' after the run")
+    parser.add_argument("--market-file", default=None, help="Refresh this memory-mappable market snapshot (.npy) after the run")
+    parser.add_argument("--metrics-file", default=None, help="Write run metrics here (.json summary, otherwise Prometheus text)")
+    parser.add_argument("--profile", default=None, help="Profile the run into this file (.prof for cProfile, otherwise sampled stacks)")
     args = parser.parse_args()
+    if args.rate_hosts < 1:
+        parser.error("--rate-hosts must be at least 1")
 
     logger = logging.getLogger("gw2_price_dump")
     logger.setLevel(logging.DEBUG if args.verbose else logging.INFO)
@@ -103,37 +254,34 @@ def main():
         file_handler.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s"))
         logger.addHandler(file_handler)
 
-    session = requests.Session()
-    limiter = TokenBucket(capacity=DEFAULT_BURST, refill_rate=DEFAULT_REFILL_RATE)
-
-    try:
-        if args.mode == "quick":
-            all_ids = load_quick_item_ids()
-        else:
-            all_ids = load_all_item_ids()
-
-    except Exception as e:
-        logger.exception(f"Failed to fetch item IDs: {e}")
-        sys.exit(1)
+    init_pool()
+    session = create_session(args.workers)
+    limiter = create_limiter(args.rate_state, capacity=max(1, DEFAULT_BURST // args.rate_hosts),
+                             refill_rate=DEFAULT_REFILL_RATE / args.rate_hosts)
 
-    logger.info(f"Processing all {len(all_ids)} IDs.")
-    start_time = time.time()
-    global SNAPSHOT_TIMESTAMP
-    SNAPSHOT_TIMESTAMP = datetime.fromtimestamp(start_time, tz=timezone.utc)
-    processed = 0
-    remaining_ids = all_ids
     try:
-        for batch in chunked(remaining_ids):
-            fetch_prices_details_and_write(batch, session, limiter, logger)
-            processed += len(batch)
-            if processed % (MAX_IDS_PER_REQUEST * 10) == 0 or processed == len(remaining_ids):
-                elapsed = time.time() - start_time
-                rate = processed / elapsed if elapsed > 0 else 0
-                logger.info(f"Progress: {processed}/{len(remaining_ids)} ({rate:.1f} ids/sec)")
+        with profiled(args.profile):
+            run_price_snapshot(session, limiter, logger, workers=args.workers, commit_every=args.commit_every,
+                               atomic=args.atomic, mode=args.mode, skip_volume=args.skip_volume,
+                               source=args.source, resume=args.resume is not None,
+                               run_id=args.run_id if args.role == "worker" else None if args.resume in (None, "latest") else int(args.resume),
+                               storage=args.storage, role=args.role)
+        market = None
+        if args.market_file:
+            from utils.market import refresh_market_file  # needs numpy; only imported when asked for
+            market = refresh_market_file(args.market_file, logger)
+        if args.scan_flips:
+            from tasks.flips.flip_scanner import run_flip_scan  # needs numpy; only imported when asked for
+            run_flip_scan(logger, market=market)
     except Exception as e:
         logger.exception(f"Error while fetching prices: {e}")
         sys.exit(1)
+    finally:
+        logger.info(f"Rate limiter: {limiter.stats()}")
+        if args.metrics_file:
+            METRICS.write(args.metrics_file)
+        close_pool()
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,99 @@
+from datetime import datetime, timezone
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+import json
+import logging
+import sys
+import argparse
+from typing import Dict, List, Optional
+
+from utils.db import fetch_all
+
+
+def _levels(book) -> Dict[int, dict]:
+    if not isinstance(book, list):
+        return {}
+    return {int(level["unit_price"]): level for level in book}
+
+
+def load_order_book(item_id: int, at_ts: datetime) -> Optional[Dict[str, object]]:
+    """Order book of ``item_id`` as it was stored at or before ``at_ts``; ``None`` without a keyframe.
+
+    Starts from the newest keyframe in ``t_listing`` not after ``at_ts`` and applies the latest
+    delta of every price level recorded since, so the work is bounded by one keyframe interval.
+    Works the same for full storage, where every snapshot is a keyframe.
+    """
+    keyframe = fetch_all(
+        """
+        SELECT "time", buy_orders, sell_listings
+        FROM t_listing
+        WHERE item_id = %s AND "time" <= %s
+        ORDER BY "time" DESC
+        LIMIT 1
+        """,
+        (item_id, at_ts),
+    )
+    if not keyframe:
+        return None
+    keyframe_ts, buys, sells = keyframe[0]
+    sides = {"B": _levels(buys), "S": _levels(sells)}
+
+    deltas = fetch_all(
+        """
+        SELECT DISTINCT ON (side, unit_price) side, unit_price, quantity, listings, "time"
+        FROM t_listing_delta
+        WHERE item_id = %s AND "time" > %s AND "time" <= %s
+        ORDER BY side, unit_price, "time" DESC
+        """,
+        (item_id, keyframe_ts, at_ts),
+    )
+    snapshot_ts = keyframe_ts
+    for side, unit_price, quantity, listings, ts in deltas:
+        snapshot_ts = max(snapshot_ts, ts)
+        if quantity == 0:
+            sides[side].pop(unit_price, None)
+        else:
+            sides[side][unit_price] = {"listings": listings, "unit_price": unit_price, "quantity": quantity}
+
+    buys: List[dict] = [sides["B"][p] for p in sorted(sides["B"], reverse=True)]
+    sells: List[dict] = [sides["S"][p] for p in sorted(sides["S"])]
+    return {"id": item_id, "time": snapshot_ts, "buys": buys, "sells": sells}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Print the stored order book of an item at a point in time.")
+    parser.add_argument("--log-file", default=None, help="Optional path to a rotating log file")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Enable debug logging to console")
+    parser.add_argument("item_id", type=int, help="Item ID")
+    parser.add_argument("-t", "--time", default=None, help="Timestamp (ISO 8601); defaults to now")
+    args = parser.parse_args()
+
+    logger = logging.getLogger("gw2_order_book")
+    logger.setLevel(logging.DEBUG if args.verbose else logging.INFO)
+
+    console = logging.StreamHandler(sys.stdout)
+    console.setLevel(logging.DEBUG if args.verbose else logging.INFO)
+    console.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s"))
+    logger.addHandler(console)
+
+    if args.log_file:
+        Path(args.log_file).parent.mkdir(parents=True, exist_ok=True)
+        file_handler = RotatingFileHandler(args.log_file, maxBytes=5 * 1024 * 1024, backupCount=3)
+        file_handler.setLevel(logging.DEBUG)
+        file_handler.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s"))
+        logger.addHandler(file_handler)
+
+    try:
+        at_ts = datetime.fromisoformat(args.time) if args.time else datetime.now(timezone.utc)
+        book = load_order_book(args.item_id, at_ts)
+        if book is None:
+            logger.info(f"No stored order book for item {args.item_id} at {at_ts.isoformat()}.")
+            return
+        print(json.dumps(book, default=str, indent=2))
+    except Exception as e:
+        logger.exception(f"Error while loading the order book: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
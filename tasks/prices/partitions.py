@@ -0,0 +1,132 @@
+from datetime import date, datetime, timedelta, timezone, time as dt_time
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+import logging
+import sys
+import argparse
+from typing import List, Tuple
+
+from psycopg2 import sql
+
+from utils.db import load_sql, execute_sql, fetch_column_list, run_transaction
+from utils.constants import LISTING_PARTITION_DAYS_AHEAD
+from utils.constants import LISTING_RETENTION_DAYS
+
+
+ROLLUP_HOURLY_SQL = load_sql(Path(__file__).parent / 'sql' / 'rollup_listing_hourly.sql')
+ROLLUP_DAILY_SQL = load_sql(Path(__file__).parent / 'sql' / 'rollup_listing_daily.sql')
+PARTITIONED_TABLES = ("t_listing", "t_listing_delta", "t_price_tick")
+
+
+def _day_start(day: date) -> datetime:
+    return datetime.combine(day, dt_time.min, tzinfo=timezone.utc)
+
+
+def partition_name(day: date, table: str = "t_listing") -> str:
+    return f"{table}_p{day:%Y%m%d}"
+
+
+def list_listing_partitions(table: str = "t_listing") -> List[Tuple[str, date]]:
+    names = fetch_column_list(
+        """
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class p ON p.oid = i.inhparent
+        WHERE p.relname = %s
+        """,
+        (table,),
+    )
+    prefix = f"{table}_p"
+    partitions = []
+    for name in names:
+        if not name.startswith(prefix):
+            continue
+        try:
+            partitions.append((name, datetime.strptime(name[len(prefix):], "%Y%m%d").date()))
+        except ValueError:
+            continue
+    return sorted(partitions, key=lambda p: p[1])
+
+
+def ensure_listing_partitions(logger: logging.Logger, days_ahead: int = LISTING_PARTITION_DAYS_AHEAD) -> int:
+    today = datetime.now(timezone.utc).date()
+    created = 0
+    for table in PARTITIONED_TABLES:
+        existing = {day for _, day in list_listing_partitions(table)}
+        for offset in range(days_ahead + 1):
+            day = today + timedelta(days=offset)
+            if day in existing:
+                continue
+            execute_sql(
+                sql.SQL("CREATE TABLE IF NOT EXISTS public.{} PARTITION OF public.{} FOR VALUES FROM (%s) TO (%s)")
+                .format(sql.Identifier(partition_name(day, table)), sql.Identifier(table)),
+                (_day_start(day), _day_start(day + timedelta(days=1))),
+            )
+            created += 1
+            logger.info(f"Created partition '{partition_name(day, table)}'.")
+    return created
+
+
+def apply_listing_retention(logger: logging.Logger, keep_days: int = LISTING_RETENTION_DAYS) -> int:
+    """Roll up and drop ``t_listing``, ``t_listing_delta`` and ``t_price_tick`` partitions older than ``keep_days``.
+
+    Hourly and daily rollups are built from ``t_listing_snapshot_stats`` for the partition's day
+    before the partitions of that day are detached and dropped, all in one transaction per day.
+    """
+    cutoff = datetime.now(timezone.utc).date() - timedelta(days=keep_days)
+    expired = {}
+    for table in PARTITIONED_TABLES:
+        for name, day in list_listing_partitions(table):
+            if day < cutoff:
+                expired.setdefault(day, []).append((table, name))
+
+    dropped = 0
+    for day in sorted(expired):
+        params = {"from_ts": _day_start(day), "to_ts": _day_start(day + timedelta(days=1))}
+        with run_transaction():
+            hourly = execute_sql(ROLLUP_HOURLY_SQL, params)
+            daily = execute_sql(ROLLUP_DAILY_SQL, params)
+            for table, name in expired[day]:
+                execute_sql(sql.SQL("ALTER TABLE public.{} DETACH PARTITION public.{}")
+                            .format(sql.Identifier(table), sql.Identifier(name)))
+                execute_sql(sql.SQL("DROP TABLE public.{}").format(sql.Identifier(name)))
+        for _, name in expired[day]:
+            dropped += 1
+            logger.info(f"Dropped partition '{name}' after rolling up {hourly} hourly and {daily} daily rows.")
+    return dropped
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain t_listing, t_listing_delta and t_price_tick partitions, rollups and retention.")
+    parser.add_argument("--log-file", default=None, help="Optional path to a rotating log file")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Enable debug logging to console")
+    parser.add_argument("--days-ahead", type=int, default=LISTING_PARTITION_DAYS_AHEAD, help="Number of future daily partitions to create")
+    parser.add_argument("--keep-days", type=int, default=LISTING_RETENTION_DAYS, help="Keep full order books and price ticks for this many days")
+    args = parser.parse_args()
+
+    logger = logging.getLogger("gw2_listing_partitions")
+    logger.setLevel(logging.DEBUG if args.verbose else logging.INFO)
+
+    console = logging.StreamHandler(sys.stdout)
+    console.setLevel(logging.DEBUG if args.verbose else logging.INFO)
+    console.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s"))
+    logger.addHandler(console)
+
+    if args.log_file:
+        Path(args.log_file).parent.mkdir(parents=True, exist_ok=True)
+        file_handler = RotatingFileHandler(args.log_file, maxBytes=5 * 1024 * 1024, backupCount=3)
+        file_handler.setLevel(logging.DEBUG)
+        file_handler.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s"))
+        logger.addHandler(file_handler)
+
+    try:
+        ensure_listing_partitions(logger, days_ahead=args.days_ahead)
+        apply_listing_retention(logger, keep_days=args.keep_days)
+    except Exception as e:
+        logger.exception(f"Error while maintaining listing partitions: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
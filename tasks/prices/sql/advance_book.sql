@@ -0,0 +1,18 @@
+DELETE FROM public.t_listing_book b
+USING _stage_book_plan k
+WHERE k.item_id = b.item_id AND k.advance;
+
+INSERT INTO public.t_listing_book (item_id, side, unit_price, quantity, listings)
+SELECT n.item_id, n.side, n.unit_price, n.quantity, n.listings
+FROM _stage_levels n
+JOIN _stage_book_plan k ON k.item_id = n.item_id
+WHERE k.advance;
+
+INSERT INTO public.t_listing_book_head (item_id, snapshot_ts, keyframe_ts)
+SELECT l.item_id, l."time", CASE WHEN k.keyframe THEN l."time" END
+FROM _stage_t_listing l
+JOIN _stage_book_plan k ON k.item_id = l.item_id
+WHERE k.advance
+ON CONFLICT (item_id) DO UPDATE SET
+    snapshot_ts = EXCLUDED.snapshot_ts,
+    keyframe_ts = COALESCE(EXCLUDED.keyframe_ts, t_listing_book_head.keyframe_ts);
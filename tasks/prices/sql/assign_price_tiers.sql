@@ -0,0 +1,39 @@
+WITH activity AS (
+    SELECT
+        s.item_id,
+        count(*) AS samples,
+        count(*) FILTER (
+            WHERE s.buy_qty_change <> 0 OR s.sell_qty_change <> 0
+               OR s.best_buy_change <> 0 OR s.best_sell_change <> 0
+        ) AS moves,
+        sum(abs(COALESCE(s.buy_qty_change, 0)) + abs(COALESCE(s.sell_qty_change, 0))) AS moved_qty,
+        stddev_samp(s.best_sell_curr) / NULLIF(avg(s.best_sell_curr), 0) AS volatility
+    FROM public.t_listing_snapshot_stats s
+    WHERE s.snapshot_ts_to >= %(since)s
+    GROUP BY s.item_id
+),
+scored AS (
+    SELECT
+        i.id AS item_id,
+        COALESCE(a.moves::double precision / NULLIF(a.samples, 0), 0)
+            + ln(1 + COALESCE(a.moved_qty, 0)) / 10
+            + LEAST(COALESCE(a.volatility, 0), 1) AS score
+    FROM public.t_item i
+    LEFT JOIN activity a ON a.item_id = i.id
+    WHERE i.accountbound = FALSE AND i.soulbound = FALSE
+),
+ranked AS (
+    SELECT item_id, score, row_number() OVER (ORDER BY score DESC, item_id) AS rank
+    FROM scored
+)
+INSERT INTO public.t_price_tier (item_id, tier, score, assigned_at)
+SELECT
+    item_id,
+    CASE WHEN rank <= %(hot_size)s AND score > 0 THEN 0 ELSE 1 + item_id %% %(cold_tiers)s END,
+    score,
+    now()
+FROM ranked
+ON CONFLICT (item_id) DO UPDATE SET
+    tier        = EXCLUDED.tier,
+    score       = EXCLUDED.score,
+    assigned_at = EXCLUDED.assigned_at;
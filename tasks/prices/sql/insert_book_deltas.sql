@@ -0,0 +1,28 @@
+WITH new_levels AS (
+    SELECT n.*
+    FROM _stage_levels n
+    JOIN _stage_book_plan k ON k.item_id = n.item_id
+    WHERE NOT k.keyframe
+),
+old_levels AS (
+    SELECT b.*
+    FROM public.t_listing_book b
+    JOIN _stage_book_plan k ON k.item_id = b.item_id
+    WHERE NOT k.keyframe
+)
+INSERT INTO public.t_listing_delta (item_id, "time", side, unit_price, quantity, listings)
+SELECT
+    l.item_id,
+    l."time",
+    COALESCE(n.side, o.side),
+    COALESCE(n.unit_price, o.unit_price),
+    COALESCE(n.quantity, 0),
+    COALESCE(n.listings, 0)
+FROM new_levels n
+FULL JOIN old_levels o
+    ON o.item_id = n.item_id AND o.side = n.side AND o.unit_price = n.unit_price
+JOIN _stage_t_listing l ON l.item_id = COALESCE(n.item_id, o.item_id)
+WHERE n.item_id IS NULL
+   OR o.item_id IS NULL
+   OR n.quantity <> o.quantity
+   OR n.listings <> o.listings;
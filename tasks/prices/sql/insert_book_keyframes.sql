@@ -0,0 +1,5 @@
+INSERT INTO public.t_listing (item_id, "time", buy_orders, sell_listings)
+SELECT l.item_id, l."time", l.buy_orders, l.sell_listings
+FROM _stage_t_listing l
+JOIN _stage_book_plan k ON k.item_id = l.item_id
+WHERE k.keyframe;
@@ -0,0 +1,3 @@
+INSERT INTO public.t_listing (item_id, "time", buy_orders, sell_listings)
+SELECT item_id, "time", buy_orders, sell_listings
+FROM _stage_t_listing;
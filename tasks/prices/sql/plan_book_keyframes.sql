@@ -0,0 +1,25 @@
+-- keyframe: store the full book in t_listing. It is needed when the item has no current book,
+-- when the book does not reflect the latest stored snapshot (a full-storage run came in between),
+-- when the snapshot is not newer than the book, or when the last keyframe is too old.
+-- advance: the snapshot is newer than the current book and replaces it.
+CREATE TEMP TABLE IF NOT EXISTS _stage_book_plan
+(
+    item_id integer PRIMARY KEY,
+    keyframe boolean NOT NULL,
+    advance boolean NOT NULL
+) ON COMMIT DROP;
+
+TRUNCATE _stage_book_plan;
+
+INSERT INTO _stage_book_plan (item_id, keyframe, advance)
+SELECT
+    l.item_id,
+    h.item_id IS NULL
+        OR h.snapshot_ts IS DISTINCT FROM p.snapshot_ts
+        OR l."time" <= h.snapshot_ts
+        OR h.keyframe_ts IS NULL
+        OR h.keyframe_ts <= l."time" - %(keyframe_interval)s,
+    h.item_id IS NULL OR l."time" > h.snapshot_ts
+FROM _stage_t_listing l
+LEFT JOIN public.t_listing_book_head h ON h.item_id = l.item_id
+LEFT JOIN public.t_price_latest p ON p.item_id = l.item_id;
@@ -0,0 +1,39 @@
+INSERT INTO public.t_listing_daily (
+    item_id,
+    bucket_ts,
+    samples,
+    best_buy_min,
+    best_buy_max,
+    best_buy_avg,
+    best_sell_min,
+    best_sell_max,
+    best_sell_avg,
+    buy_qty_avg,
+    sell_qty_avg
+)
+SELECT
+    item_id,
+    %(from_ts)s,
+    sum(samples),
+    min(best_buy_min),
+    max(best_buy_max),
+    sum(best_buy_avg * samples) / NULLIF(sum(samples) FILTER (WHERE best_buy_avg IS NOT NULL), 0),
+    min(best_sell_min),
+    max(best_sell_max),
+    sum(best_sell_avg * samples) / NULLIF(sum(samples) FILTER (WHERE best_sell_avg IS NOT NULL), 0),
+    sum(buy_qty_avg * samples) / NULLIF(sum(samples), 0),
+    sum(sell_qty_avg * samples) / NULLIF(sum(samples), 0)
+FROM public.t_listing_hourly
+WHERE bucket_ts >= %(from_ts)s
+  AND bucket_ts < %(to_ts)s
+GROUP BY item_id
+ON CONFLICT (item_id, bucket_ts) DO UPDATE SET
+    samples       = EXCLUDED.samples,
+    best_buy_min  = EXCLUDED.best_buy_min,
+    best_buy_max  = EXCLUDED.best_buy_max,
+    best_buy_avg  = EXCLUDED.best_buy_avg,
+    best_sell_min = EXCLUDED.best_sell_min,
+    best_sell_max = EXCLUDED.best_sell_max,
+    best_sell_avg = EXCLUDED.best_sell_avg,
+    buy_qty_avg   = EXCLUDED.buy_qty_avg,
+    sell_qty_avg  = EXCLUDED.sell_qty_avg;
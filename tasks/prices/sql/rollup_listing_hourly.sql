@@ -0,0 +1,39 @@
+INSERT INTO public.t_listing_hourly (
+    item_id,
+    bucket_ts,
+    samples,
+    best_buy_min,
+    best_buy_max,
+    best_buy_avg,
+    best_sell_min,
+    best_sell_max,
+    best_sell_avg,
+    buy_qty_avg,
+    sell_qty_avg
+)
+SELECT
+    item_id,
+    date_trunc('hour', snapshot_ts_to),
+    count(*),
+    min(best_buy_curr),
+    max(best_buy_curr),
+    avg(best_buy_curr),
+    min(best_sell_curr),
+    max(best_sell_curr),
+    avg(best_sell_curr),
+    avg(buy_qty_curr),
+    avg(sell_qty_curr)
+FROM public.t_listing_snapshot_stats
+WHERE snapshot_ts_to >= %(from_ts)s
+  AND snapshot_ts_to < %(to_ts)s
+GROUP BY item_id, date_trunc('hour', snapshot_ts_to)
+ON CONFLICT (item_id, bucket_ts) DO UPDATE SET
+    samples       = EXCLUDED.samples,
+    best_buy_min  = EXCLUDED.best_buy_min,
+    best_buy_max  = EXCLUDED.best_buy_max,
+    best_buy_avg  = EXCLUDED.best_buy_avg,
+    best_sell_min = EXCLUDED.best_sell_min,
+    best_sell_max = EXCLUDED.best_sell_max,
+    best_sell_avg = EXCLUDED.best_sell_avg,
+    buy_qty_avg   = EXCLUDED.buy_qty_avg,
+    sell_qty_avg  = EXCLUDED.sell_qty_avg;
@@ -0,0 +1,7 @@
+SELECT i.id
+FROM public.t_item i
+LEFT JOIN public.t_price_tier t ON t.item_id = i.id
+WHERE i.accountbound = FALSE
+  AND i.soulbound = FALSE
+  AND COALESCE(t.tier, 1 + i.id %% %(cold_tiers)s) IN (0, %(cold_tier)s)
+ORDER BY i.id;
@@ -0,0 +1,19 @@
+CREATE TEMP TABLE IF NOT EXISTS _stage_levels
+(
+    item_id integer,
+    side character(1),
+    unit_price integer,
+    quantity integer,
+    listings integer
+) ON COMMIT DROP;
+
+TRUNCATE _stage_levels;
+
+INSERT INTO _stage_levels (item_id, side, unit_price, quantity, listings)
+SELECT l.item_id, 'B', (e->>'unit_price')::integer, (e->>'quantity')::integer, (e->>'listings')::integer
+FROM _stage_t_listing l
+CROSS JOIN LATERAL jsonb_array_elements(CASE WHEN jsonb_typeof(l.buy_orders) = 'array' THEN l.buy_orders ELSE '[]'::jsonb END) e
+UNION ALL
+SELECT l.item_id, 'S', (e->>'unit_price')::integer, (e->>'quantity')::integer, (e->>'listings')::integer
+FROM _stage_t_listing l
+CROSS JOIN LATERAL jsonb_array_elements(CASE WHEN jsonb_typeof(l.sell_listings) = 'array' THEN l.sell_listings ELSE '[]'::jsonb END) e;
@@ -0,0 +1,67 @@
+WITH curr AS (
+    SELECT
+        p.item_id,
+        p.snapshot_ts,
+        p.buy_qty,
+        p.sell_qty,
+        p.best_buy,
+        p.best_sell
+    FROM public.t_price_latest p
+    JOIN _stage_t_listing l ON l.item_id = p.item_id AND l."time" = p.snapshot_ts
+)
+INSERT INTO public.t_listing_snapshot_stats (
+    item_id,
+    snapshot_ts_from,
+    snapshot_ts_to,
+    buy_qty_prev,
+    buy_qty_curr,
+    buy_qty_change,
+    sell_qty_prev,
+    sell_qty_curr,
+    sell_qty_change,
+    best_buy_prev,
+    best_buy_curr,
+    best_buy_change,
+    best_sell_prev,
+    best_sell_curr,
+    best_sell_change
+)
+SELECT
+    c.item_id,
+    p.snapshot_ts_to,
+    c.snapshot_ts,
+    p.buy_qty_curr,
+    c.buy_qty,
+    c.buy_qty - p.buy_qty_curr,
+    p.sell_qty_curr,
+    c.sell_qty,
+    c.sell_qty - p.sell_qty_curr,
+    p.best_buy_curr,
+    c.best_buy,
+    c.best_buy - p.best_buy_curr,
+    p.best_sell_curr,
+    c.best_sell,
+    c.best_sell - p.best_sell_curr
+FROM curr c
+LEFT JOIN LATERAL (
+    SELECT s.snapshot_ts_to, s.buy_qty_curr, s.sell_qty_curr, s.best_buy_curr, s.best_sell_curr
+    FROM public.t_listing_snapshot_stats s
+    WHERE s.item_id = c.item_id
+      AND s.snapshot_ts_to < c.snapshot_ts
+    ORDER BY s.snapshot_ts_to DESC
+    LIMIT 1
+) p ON TRUE
+ON CONFLICT (item_id, snapshot_ts_to) DO UPDATE SET
+    snapshot_ts_from = EXCLUDED.snapshot_ts_from,
+    buy_qty_prev     = EXCLUDED.buy_qty_prev,
+    buy_qty_curr     = EXCLUDED.buy_qty_curr,
+    buy_qty_change   = EXCLUDED.buy_qty_change,
+    sell_qty_prev    = EXCLUDED.sell_qty_prev,
+    sell_qty_curr    = EXCLUDED.sell_qty_curr,
+    sell_qty_change  = EXCLUDED.sell_qty_change,
+    best_buy_prev    = EXCLUDED.best_buy_prev,
+    best_buy_curr    = EXCLUDED.best_buy_curr,
+    best_buy_change  = EXCLUDED.best_buy_change,
+    best_sell_prev   = EXCLUDED.best_sell_prev,
+    best_sell_curr   = EXCLUDED.best_sell_curr,
+    best_sell_change = EXCLUDED.best_sell_change;
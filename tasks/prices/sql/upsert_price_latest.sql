@@ -0,0 +1,45 @@
+INSERT INTO public.t_price_latest (
+    item_id, snapshot_ts,
+    best_buy, best_buy_qty, buy_qty, buy_levels,
+    best_sell, best_sell_qty, sell_qty, sell_levels
+)
+SELECT
+    l.item_id,
+    l."time",
+    b.best,
+    b.best_qty,
+    COALESCE(b.qty, 0),
+    b.levels,
+    s.best,
+    s.best_qty,
+    COALESCE(s.qty, 0),
+    s.levels
+FROM _stage_t_listing l
+LEFT JOIN LATERAL (
+    SELECT
+        max((e->>'unit_price')::integer) AS best,
+        (array_agg((e->>'quantity')::integer ORDER BY (e->>'unit_price')::integer DESC))[1] AS best_qty,
+        sum((e->>'quantity')::bigint) AS qty,
+        count(*) AS levels
+    FROM jsonb_array_elements(CASE WHEN jsonb_typeof(l.buy_orders) = 'array' THEN l.buy_orders ELSE '[]'::jsonb END) e
+) b ON TRUE
+LEFT JOIN LATERAL (
+    SELECT
+        min((e->>'unit_price')::integer) AS best,
+        (array_agg((e->>'quantity')::integer ORDER BY (e->>'unit_price')::integer))[1] AS best_qty,
+        sum((e->>'quantity')::bigint) AS qty,
+        count(*) AS levels
+    FROM jsonb_array_elements(CASE WHEN jsonb_typeof(l.sell_listings) = 'array' THEN l.sell_listings ELSE '[]'::jsonb END) e
+) s ON TRUE
+ON CONFLICT (item_id) DO UPDATE SET
+    snapshot_ts   = EXCLUDED.snapshot_ts,
+    best_buy      = EXCLUDED.best_buy,
+    best_buy_qty  = EXCLUDED.best_buy_qty,
+    buy_qty       = EXCLUDED.buy_qty,
+    buy_levels    = EXCLUDED.buy_levels,
+    best_sell     = EXCLUDED.best_sell,
+    best_sell_qty = EXCLUDED.best_sell_qty,
+    sell_qty      = EXCLUDED.sell_qty,
+    sell_levels   = EXCLUDED.sell_levels,
+    updated_at    = now()
+WHERE t_price_latest.snapshot_ts <= EXCLUDED.snapshot_ts;
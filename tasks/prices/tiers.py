@@ -0,0 +1,108 @@
+import time
+from datetime import datetime, timedelta, timezone
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+import logging
+import sys
+import argparse
+from typing import List, Optional, Tuple
+
+from utils.db import load_sql, execute_sql, fetch_all
+from utils.constants import PRICE_HOT_TIER_SIZE
+from utils.constants import PRICE_COLD_TIERS
+from utils.constants import PRICE_TIER_WINDOW_HOURS
+from utils.constants import PRICE_TIER_MAX_AGE_SECONDS
+
+
+ASSIGN_TIERS_SQL = load_sql(Path(__file__).parent / 'sql' / 'assign_price_tiers.sql')
+SELECT_TIER_IDS_SQL = load_sql(Path(__file__).parent / 'sql' / 'select_tier_item_ids.sql')
+
+
+def assign_price_tiers(logger: logging.Logger, hot_size: int = PRICE_HOT_TIER_SIZE,
+                       cold_tiers: int = PRICE_COLD_TIERS, window_hours: int = PRICE_TIER_WINDOW_HOURS) -> int:
+    """Rank tradable items by recent book activity and price volatility and store their tier.
+
+    Tier 0 holds the ``hot_size`` most active items and is polled every cycle. Everything else is
+    spread over ``cold_tiers`` tiers by item ID, so each cold item is polled once every
+    ``cold_tiers`` completed runs (see :func:`next_cold_tier`) no matter how its score moves between reassignments.
+    """
+    start_time = time.time()
+    since = datetime.now(timezone.utc) - timedelta(hours=window_hours)
+    count = execute_sql(ASSIGN_TIERS_SQL, {"since": since, "hot_size": hot_size, "cold_tiers": cold_tiers}, logger=logger)
+    logger.info(f"Assigned price tiers for {count} items in {time.time() - start_time:.2f}s.")
+    return count
+
+
+def tiers_assigned_at() -> Optional[datetime]:
+    rows = fetch_all("SELECT min(assigned_at) FROM t_price_tier")
+    return rows[0][0] if rows else None
+
+
+def ensure_price_tiers(logger: logging.Logger, max_age_seconds: float = PRICE_TIER_MAX_AGE_SECONDS, **kwargs) -> bool:
+    assigned_at = tiers_assigned_at()
+    if assigned_at is not None and (datetime.now(timezone.utc) - assigned_at).total_seconds() < max_age_seconds:
+        return False
+    assign_price_tiers(logger, **kwargs)
+    return True
+
+
+def next_cold_tier(source: str, cold_tiers: int = PRICE_COLD_TIERS) -> Tuple[int, int]:
+    """``(rotation, cold_tier)`` for the next tiered run of ``source``.
+
+    The rotation counter is stored in the params of each tiered run and only advances past a
+    run that completed, so a run that slips, overruns or fails does not skip a cold tier: each
+    cold item is polled once per ``cold_tiers`` completed runs.
+    """
+    rows = fetch_all(
+        """
+        SELECT (params->>'rotation')::bigint FROM t_run
+        WHERE task = 'prices' AND status = 'completed' AND params->>'mode' = 'tiered'
+          AND params->>'source' = %s AND params ? 'rotation'
+        ORDER BY started_at DESC
+        LIMIT 1
+        """,
+        (source,),
+    )
+    rotation = rows[0][0] + 1 if rows else 0
+    return rotation, 1 + rotation % cold_tiers
+
+
+def load_tiered_item_ids(cold_tier: int, cold_tiers: int = PRICE_COLD_TIERS) -> List[int]:
+    """IDs of the hot tier plus ``cold_tier``; items without an assignment yet count as cold."""
+    rows = fetch_all(SELECT_TIER_IDS_SQL, {"cold_tier": cold_tier, "cold_tiers": cold_tiers})
+    return [row[0] for row in rows]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute hot/cold price polling tiers from recent volume stats.")
+    parser.add_argument("--log-file", default=None, help="Optional path to a rotating log file")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Enable debug logging to console")
+    parser.add_argument("--hot-size", type=int, default=PRICE_HOT_TIER_SIZE, help="Number of items polled every cycle")
+    parser.add_argument("--cold-tiers", type=int, default=PRICE_COLD_TIERS, help="Number of rotating cold tiers")
+    parser.add_argument("--window-hours", type=int, default=PRICE_TIER_WINDOW_HOURS, help="Hours of stats used for scoring")
+    args = parser.parse_args()
+
+    logger = logging.getLogger("gw2_price_tiers")
+    logger.setLevel(logging.DEBUG if args.verbose else logging.INFO)
+
+    console = logging.StreamHandler(sys.stdout)
+    console.setLevel(logging.DEBUG if args.verbose else logging.INFO)
+    console.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s"))
+    logger.addHandler(console)
+
+    if args.log_file:
+        Path(args.log_file).parent.mkdir(parents=True, exist_ok=True)
+        file_handler = RotatingFileHandler(args.log_file, maxBytes=5 * 1024 * 1024, backupCount=3)
+        file_handler.setLevel(logging.DEBUG)
+        file_handler.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s"))
+        logger.addHandler(file_handler)
+
+    try:
+        assign_price_tiers(logger, hot_size=args.hot_size, cold_tiers=args.cold_tiers, window_hours=args.window_hours)
+    except Exception as e:
+        logger.exception(f"Error while assigning price tiers: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
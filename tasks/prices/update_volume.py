@@ -0,0 +1,95 @@
+import time
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+import logging
+import sys
+import argparse
+from typing import List, Tuple
+
+from utils.db import load_sql, execute_sql, fetch_all, run_transaction
+
+
+VOLUME_STATS_SQL = load_sql(Path(__file__).parent / 'sql' / 'update_volume_stats.sql')
+
+
+def load_pending_snapshots() -> List[Tuple[int, datetime]]:
+    """``(run_id, snapshot_ts)`` of completed full-depth price runs whose stats are not written yet.
+
+    Only completed runs are considered, so a snapshot that is still being written (or has
+    batches left for ``--resume`` or other workers) is never diffed half way. Runs with delta
+    storage write their stats during the ingest and are skipped.
+    """
+    return fetch_all(
+        """
+        SELECT run_id, snapshot_ts
+        FROM t_run
+        WHERE task = 'prices' AND status = 'completed' AND stats_updated_at IS NULL
+          AND COALESCE(params->>'source', 'listings') = 'listings'
+          AND COALESCE(params->>'storage', 'full') = 'full'
+        ORDER BY snapshot_ts
+        """
+    )
+
+
+def update_volume_stats(snapshot_ts: datetime, logger: logging.Logger) -> int:
+    """Write per-item deltas between ``snapshot_ts`` and each item's previous stats row.
+
+    Only the order books of ``snapshot_ts`` are expanded; the previous side of the diff is read
+    from the ``*_curr`` columns of the last stats row, so history is never rescanned.
+    """
+    start_time = time.time()
+    count = execute_sql(VOLUME_STATS_SQL, {"snapshot_ts": snapshot_ts}, logger=logger)
+    logger.info(f"Wrote {count} rows into 't_listing_snapshot_stats' for snapshot {snapshot_ts.isoformat()} "
+                f"in {time.time() - start_time:.2f}s.")
+    return count
+
+
+def update_pending_volume_stats(logger: logging.Logger) -> int:
+    count = 0
+    for run_id, snapshot_ts in load_pending_snapshots():
+        with run_transaction():
+            count += update_volume_stats(snapshot_ts, logger)
+            execute_sql("UPDATE t_run SET stats_updated_at = now() WHERE run_id = %s", (run_id,))
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compute per-item volume and best price deltas for a price snapshot.")
+    parser.add_argument("--log-file", default=None, help="Optional path to a rotating log file")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Enable debug logging to console")
+    parser.add_argument("-s", "--snapshot", default=None,
+                        help="Snapshot timestamp (ISO 8601); defaults to every completed run not reflected in the stats yet")
+    args = parser.parse_args()
+
+    logger = logging.getLogger("gw2_volume_stats")
+    logger.setLevel(logging.DEBUG if args.verbose else logging.INFO)
+
+    console = logging.StreamHandler(sys.stdout)
+    console.setLevel(logging.DEBUG if args.verbose else logging.INFO)
+    console.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s"))
+    logger.addHandler(console)
+
+    if args.log_file:
+        Path(args.log_file).parent.mkdir(parents=True, exist_ok=True)
+        file_handler = RotatingFileHandler(args.log_file, maxBytes=5 * 1024 * 1024, backupCount=3)
+        file_handler.setLevel(logging.DEBUG)
+        file_handler.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s"))
+        logger.addHandler(file_handler)
+
+    try:
+        if args.snapshot:
+            snapshot_ts = datetime.fromisoformat(args.snapshot)
+            with run_transaction():
+                update_volume_stats(snapshot_ts, logger)
+                execute_sql("UPDATE t_run SET stats_updated_at = now() WHERE task = 'prices' AND snapshot_ts = %s",
+                            (snapshot_ts,))
+        elif not update_pending_volume_stats(logger):
+            logger.info("No completed price run is waiting for volume stats.")
+    except Exception as e:
+        logger.exception(f"Error while updating volume stats: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,85 +1,75 @@
-import time
 from logging.handlers import RotatingFileHandler
 from pathlib import Path
 import requests
 import logging
 import sys
 import argparse
-from typing import List, Iterable
+from typing import List, Dict, Optional, Tuple
 
-from utils.rate_limit import TokenBucket
+from utils.rate_limit import TokenBucket, create_limiter
 from utils.http import http_get
-from utils.db import load_sql, execute_values_batch, fetch_column_list
+from utils.http_cache import HttpCache
+from utils.fetch import chunked, fetch_batches, create_session
+from utils.checkpoint import RunCheckpoint, run_checkpointed, run_worker
+from utils.sync import content_hash, select_sync_ids
+from utils.json_codec import loads
+from utils.item_index import ItemIdIndex
+from utils.db import load_sql, copy_upsert, fetch_all, init_pool, close_pool
 from utils.constants import GW2_API_RECIPE_URL
-from utils.constants import MAX_IDS_PER_REQUEST
+from utils.metrics import METRICS, profiled
+from tasks.crafting.base_materials import update_base_materials
 from utils.constants import DEFAULT_BURST
 from utils.constants import DEFAULT_REFILL_RATE
+from utils.constants import DEFAULT_MAX_WORKERS
+from utils.constants import DEFAULT_COMMIT_EVERY
 
 
 RECIPE_UPSERT_SQL = load_sql(Path(__file__).parent / 'sql' /'upsert_recipes.sql')
 INGREDIENTS_UPSERT_SQL = load_sql(Path(__file__).parent / 'sql' /'upsert_ingredients.sql')
-
-
-def get_all_recipes_ids(session: requests.Session, limiter: TokenBucket, logger: logging.Logger) -> List[int]:
+RECIPE_COLUMNS = (
+    "id",
+    "output_item_id",
+    "output_item_count",
+    "disciplines",
+    "min_rating",
+    "auto_learned",
+    "learned_from_item",
+    "time_to_craft_ms",
+    "content_hash",
+)
+INGREDIENT_COLUMNS = ("recipe_id", "item_id", "count")
+
+
+def get_all_recipes_ids(session: requests.Session, limiter: TokenBucket, logger: logging.Logger,
+                        cache: Optional[HttpCache] = None) -> List[int]:
     logger.info("Fetching full recipe ID list...")
-    resp = http_get(GW2_API_RECIPE_URL, session, params=None, limiter=limiter, logger=logger)
-    ids = resp.json()
+    resp = http_get(GW2_API_RECIPE_URL, session, params=None, limiter=limiter, logger=logger, cache=cache)
+    ids = loads(resp.content)
     if not isinstance(ids, list):
         raise RuntimeError("Unexpected response for /v2/recipes (expected a list of IDs).")
     logger.info(f"Received {len(ids)} recipe IDs.")
     return ids
 
 
-def chunked(iterable: Iterable[int]) -> Iterable[List[int]]:
-    batch = []
-    for x in iterable:
-        batch.append(x)
-        if len(batch) >= MAX_IDS_PER_REQUEST:
-            yield batch
-            batch = []
-    if batch:
-        yield batch
-
-
-def fetch_recipes_details_and_write(ids: List[int], session: requests.Session, limiter: TokenBucket, logger: logging.Logger):
-    params = {"ids": ",".join(map(str, ids))}
-    response = http_get(GW2_API_RECIPE_URL, session, params=params, limiter=limiter, logger=logger)
-    recipes = response.json()
-    if not isinstance(recipes, list):
-        raise RuntimeError(f"Unexpected response for /v2/recipes (expected a list of IDs). Got Type: {type(recipes)}")
-    write_recipes_details(recipes, logger=logger)
-
-
-def _parse_recipes_row(recipe: dict):
-    id_ = int(recipe.get('id'))
-    output_item_id = recipe.get('output_item_id') or None
-    output_item_count = recipe.get('output_item_count') or None
-    disciplines = recipe.get('disciplines') or None
-    min_rating = recipe.get('min_rating') or None
-    time_to_craft_ms = recipe.get('time_to_craft_ms') or None
-
-    flags = set(recipe.get('flags') or [])
-    auto_learned = 'AutoLearned' in flags
-    learned_from_item = 'LearnedFromItem' in flags
-
+def _parse_recipes_row(recipe: dict, digest: str):
+    get = recipe.get
+    flags = get('flags') or ()
     return (
-        id_,
-        output_item_id,
-        output_item_count,
-        disciplines,
-        min_rating,
-        auto_learned,
-        learned_from_item,
-        time_to_craft_ms,
+        int(get('id')),
+        get('output_item_id') or None,
+        get('output_item_count') or None,
+        get('disciplines') or None,
+        get('min_rating') or None,
+        'AutoLearned' in flags,
+        'LearnedFromItem' in flags,
+        get('time_to_craft_ms') or None,
+        digest,
     )
 
 
-def _parse_ingredients_rows(recipe: dict):
-    recipe_id = int(recipe.get("id"))
-    ingredients = recipe.get("ingredients") or []
+def _parse_ingredients_rows(recipe_id: int, recipe: dict):
     rows = []
-
-    for ing in ingredients:
+    for ing in recipe.get("ingredients") or ():
         try:
             item_id = ing.get("item_id")
             count = ing.get("count")
@@ -92,45 +82,144 @@ def _parse_ingredients_rows(recipe: dict):
     return rows
 
 
-def write_recipes_details(recipes:List, logger: logging.Logger):
-    if not recipes:
-        return
-
-    valid_item_ids = load_item_ids()
+def parse_recipes_details(recipes: List, item_index: ItemIdIndex, logger: logging.Logger,
+                          known_hashes: Optional[Dict[int, Optional[str]]] = None) -> Tuple[List[tuple], List[tuple]]:
+    known_hashes = known_hashes or {}
 
     recipe_rows = []
     ingredient_rows = []
     for it in recipes:
         try:
-            if it.get('output_item_id') not in valid_item_ids:
+            if it.get('output_item_id') not in item_index:
                 logger.warning(f"Skipping recipe {it.get('id')} due to invalid item id: {it['output_item_id']}")
                 continue
 
-            recipe_rows.append(_parse_recipes_row(it))
-            ingredient_rows.extend(_parse_ingredients_rows(it))
+            digest = content_hash(it)
+            if known_hashes.get(it.get('id')) == digest:
+                continue
+
+            row = _parse_recipes_row(it, digest)
+            ingredients = _parse_ingredients_rows(row[0], it)
+            missing = item_index.missing(ing[1] for ing in ingredients)
+            if missing:
+                logger.warning(f"Skipping recipe {row[0]} due to unknown ingredient item ids: {missing}")
+                continue
+
+            recipe_rows.append(row)
+            ingredient_rows.extend(ingredients)
         except Exception as e:
             logger.warning(f"Skipping recipe due to parse error: {e} ; payload={str(it)[:200]}")
 
+    return recipe_rows, ingredient_rows
+
+
+def write_recipe_rows(recipe_rows: List[tuple], ingredient_rows: List[tuple], logger: logging.Logger):
     if not recipe_rows:
         return
 
-    execute_values_batch(RECIPE_UPSERT_SQL, recipe_rows, page_size=MAX_IDS_PER_REQUEST, logger=logger)
+    copy_upsert(RECIPE_UPSERT_SQL, "public.t_recipe", RECIPE_COLUMNS, recipe_rows, logger=logger)
     logger.debug(f"Upserted {len(recipe_rows)} recipe into 't_recipe'.")
 
     if ingredient_rows:
-        execute_values_batch(INGREDIENTS_UPSERT_SQL, ingredient_rows, page_size=MAX_IDS_PER_REQUEST, logger=logger)
+        copy_upsert(INGREDIENTS_UPSERT_SQL, "public.t_ingredient", INGREDIENT_COLUMNS, ingredient_rows, logger=logger)
         logger.debug(f"Upserted {len(ingredient_rows)} ingredient rows into 't_ingredient'.")
 
 
-def load_item_ids():
-    return fetch_column_list("SELECT id FROM t_item")
+def load_recipe_hashes() -> Dict[int, Optional[str]]:
+    return dict(fetch_all("SELECT id, content_hash FROM t_recipe"))
+
+
+def run_recipe_sync(
+    session: requests.Session,
+    limiter: TokenBucket,
+    logger: logging.Logger,
+    workers: int = DEFAULT_MAX_WORKERS,
+    commit_every: Optional[int] = DEFAULT_COMMIT_EVERY,
+    atomic: bool = False,
+    incremental: bool = False,
+    cache: Optional[HttpCache] = None,
+    item_index: Optional[ItemIdIndex] = None,
+    resume: bool = False,
+    run_id: Optional[int] = None,
+    role: str = "standalone",
+) -> int:
+    run = None
+    if role == "worker":
+        run = RunCheckpoint.open("recipes", run_id)
+        if run is None:
+            logger.info("No running recipe run to work on.")
+            return 0
+    elif resume:
+        run = RunCheckpoint.resume("recipes", run_id)
+        if run is None:
+            logger.info("No unfinished recipe run to resume.")
+            return 0
+    else:
+        all_ids = get_all_recipes_ids(session, limiter, logger, cache=cache)
+
+    if item_index is None:
+        item_index = ItemIdIndex.load()
+    else:
+        item_index.refresh()
+    logger.info(f"Loaded {len(item_index)} known item IDs.")
+
+    known_hashes = {}
+    if run is not None:
+        if run.params.get("incremental"):
+            known_hashes = load_recipe_hashes()
+        logger.info(f"Working on run {run.run_id}.")
+    else:
+        remaining_ids = all_ids
+        if incremental:
+            known_hashes = load_recipe_hashes()
+            remaining_ids = select_sync_ids(all_ids, known_hashes)
+            logger.info(f"Incremental sync: {len(remaining_ids)} of {len(all_ids)} IDs are new or due for re-validation.")
+        run = RunCheckpoint.start("recipes", chunked(remaining_ids), params={"incremental": incremental})
+        logger.info(f"Processing {len(remaining_ids)} IDs in run {run.run_id}.")
+        if role == "coordinator":
+            logger.info(f"Queued run {run.run_id}; process it with --role worker --run-id {run.run_id}.")
+            return 0
+
+    processed = (run_worker if role == "worker" else run_checkpointed)(
+        run,
+        lambda batches, on_error: fetch_batches(GW2_API_RECIPE_URL, batches, session, limiter, max_workers=workers,
+                                                logger=logger, cache=cache, on_error=on_error),
+        lambda recipes: parse_recipes_details(recipes, item_index, logger=logger, known_hashes=known_hashes),
+        write_recipe_rows,
+        logger,
+        commit_every=None if atomic else commit_every,
+    )
+    if role == "standalone":
+        update_base_materials(logger)
+    return processed
 
 
 def main():
     parser = argparse.ArgumentParser(description="get recipes, rate-limit handling, and retries.")
     parser.add_argument("--log-file", default=None, help="Optional path to a rotating log file")
     parser.add_argument("-v", "--verbose", action="store_true", help="Enable debug logging to console")
+    parser.add_argument("-w", "--workers", type=int, default=DEFAULT_MAX_WORKERS, help="Number of concurrent API requests")
+    parser.add_argument("--rate-state", default=None,
+                        help="Share the API rate budget with other processes on this host through this file")
+    parser.add_argument("--rate-hosts", type=int, default=1,
+                        help="Number of hosts working on the same API budget; each takes an equal share of it")
+    parser.add_argument("--commit-every", type=int, default=DEFAULT_COMMIT_EVERY, help="Commit after this many batches")
+    parser.add_argument("--atomic", action="store_true", help="Write the whole run in a single transaction")
+    parser.add_argument("-i", "--incremental", action="store_true", help="Only fetch new recipes plus a rotating re-validation slice")
+    parser.add_argument("--cache-dir", default=None, help="Cache API responses in this directory")
+    parser.add_argument("--replay", action="store_true", help="Serve every request from --cache-dir without touching the API")
+    parser.add_argument("--resume", nargs="?", const="latest", default=None, metavar="RUN_ID",
+                        help="Continue the missing batches of RUN_ID, or of the latest failed or partial run")
+    parser.add_argument("--role", default="standalone", choices=["standalone", "coordinator", "worker"],
+                        help="'coordinator' only queues a run, 'worker' processes a queued run alongside other workers")
+    parser.add_argument("--run-id", type=int, default=None, help="Run for --role worker; defaults to the latest running run")
+    parser.add_argument("--metrics-file", default=None, help="Write run metrics here (.json summary, otherwise Prometheus text)")
+    parser.add_argument("--profile", default=None, help="Profile the run into this file (.prof for cProfile, otherwise sampled stacks)")
     args = parser.parse_args()
+    if args.replay and not args.cache_dir:
+        parser.error("--replay requires --cache-dir")
+    if args.rate_hosts < 1:
+        parser.error("--rate-hosts must be at least 1")
 
     logger = logging.getLogger("gw2_recipe_dump")
     logger.setLevel(logging.DEBUG if args.verbose else logging.INFO)
@@ -147,31 +236,27 @@ def main():
         file_handler.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s"))
         logger.addHandler(file_handler)
 
-    session = requests.Session()
-    limiter = TokenBucket(capacity=DEFAULT_BURST, refill_rate=DEFAULT_REFILL_RATE)
-
-    try:
-        all_ids = get_all_recipes_ids(session, limiter, logger)
-    except Exception as e:
-        logger.exception(f"Failed to fetch recipe IDs: {e}")
-        sys.exit(1)
+    init_pool()
+    session = create_session(args.workers)
+    limiter = create_limiter(args.rate_state, capacity=max(1, DEFAULT_BURST // args.rate_hosts),
+                             refill_rate=DEFAULT_REFILL_RATE / args.rate_hosts)
+    cache = HttpCache(args.cache_dir, replay=args.replay) if args.cache_dir else None
 
-    logger.info(f"Processing all {len(all_ids)} IDs.")
-    start_time = time.time()
-    processed = 0
-    remaining_ids = all_ids
     try:
-        for batch in chunked(remaining_ids):
-            fetch_recipes_details_and_write(batch, session, limiter, logger)
-            processed += len(batch)
-            if processed % (MAX_IDS_PER_REQUEST * 10) == 0 or processed == len(remaining_ids):
-                elapsed = time.time() - start_time
-                rate = processed / elapsed if elapsed > 0 else 0
-                logger.info(f"Progress: {processed}/{len(remaining_ids)} ({rate:.1f} ids/sec)")
+        with profiled(args.profile):
+            run_recipe_sync(session, limiter, logger, workers=args.workers, commit_every=args.commit_every,
+                            atomic=args.atomic, incremental=args.incremental, cache=cache, resume=args.resume is not None,
+                            run_id=args.run_id if args.role == "worker" else None if args.resume in (None, "latest") else int(args.resume),
+                            role=args.role)
     except Exception as e:
-        logger.exception(f"Error while fetching recipe details: {e}")
+        logger.exception(f"Error while syncing recipes: {e}")
         sys.exit(1)
+    finally:
+        logger.info(f"Rate limiter: {limiter.stats()}")
+        if args.metrics_file:
+            METRICS.write(args.metrics_file)
+        close_pool()
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -5,4 +5,5 @@ INSERT INTO public.t_ingredient (
 )
 VALUES %s
 ON CONFLICT (recipe_id, item_id) DO UPDATE SET
-    count = EXCLUDED.count;
+    count = EXCLUDED.count
+WHERE t_ingredient.count IS DISTINCT FROM EXCLUDED.count;
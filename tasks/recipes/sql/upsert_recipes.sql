@@ -6,7 +6,8 @@ INSERT INTO public.t_recipe (
     min_rating,
     auto_learned,
     learned_from_item,
-    time_to_craft_ms
+    time_to_craft_ms,
+    content_hash
 )
 VALUES %s
 ON CONFLICT (id) DO UPDATE SET
@@ -16,4 +17,6 @@ ON CONFLICT (id) DO UPDATE SET
     min_rating        = EXCLUDED.min_rating,
     auto_learned      = EXCLUDED.auto_learned,
     learned_from_item = EXCLUDED.learned_from_item,
-    time_to_craft_ms  = EXCLUDED.time_to_craft_ms;
\ No newline at end of file
+    time_to_craft_ms  = EXCLUDED.time_to_craft_ms,
+    content_hash      = EXCLUDED.content_hash
+WHERE t_recipe.content_hash IS DISTINCT FROM EXCLUDED.content_hash;
\ No newline at end of file
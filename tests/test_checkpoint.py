@@ -0,0 +1,217 @@
+import logging
+from contextlib import contextmanager
+
+import pytest
+
+import utils.checkpoint as checkpoint
+from utils.checkpoint import RunCheckpoint, run_checkpointed, run_worker
+from utils.constants import DEFAULT_BATCH_RETRIES
+
+
+LOGGER = logging.getLogger("gw2tp.tests")
+
+
+class FakeTx:
+    def __init__(self, commit_every=None):
+        self.commit_every = commit_every
+        self.commits = 0
+
+    def batch_done(self, count=1):
+        pass
+
+    def commit(self):
+        self.commits += 1
+
+
+class FakeDb:
+    """Stands in for ``fetch_all``/``execute_sql`` of ``utils.checkpoint``.
+
+    ``answer(sql, params)`` returns the rows for a query; every statement is recorded in ``log``.
+    """
+
+    def __init__(self, monkeypatch, answer):
+        self.answer = answer
+        self.log = []
+        monkeypatch.setattr(checkpoint, "fetch_all", self.fetch_all)
+        monkeypatch.setattr(checkpoint, "execute_sql", self.execute_sql)
+        monkeypatch.setattr(checkpoint, "run_transaction", self.run_transaction)
+        monkeypatch.setattr(checkpoint, "get_connection", self.get_connection)
+        monkeypatch.setattr(checkpoint.time, "sleep", lambda seconds: self.log.append(("sleep", seconds)))
+
+    def fetch_all(self, sql, params=None):
+        self.log.append((" ".join(sql.split()), params))
+        return self.answer(" ".join(sql.split()), params)
+
+    def execute_sql(self, sql, params=None, **kwargs):
+        self.log.append((" ".join(sql.split()), params))
+        return 0
+
+    @contextmanager
+    def run_transaction(self, commit_every=None):
+        yield FakeTx(commit_every)
+
+    @contextmanager
+    def get_connection(self):
+        db = self
+
+        class Cursor:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def execute(self, sql, params=None):
+                db.log.append((" ".join(sql.split()), params))
+
+        class Conn:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def cursor(self):
+                return Cursor()
+
+        yield Conn()
+
+    def statements(self, prefix):
+        return [(sql, params) for sql, params in self.log if isinstance(sql, str) and sql.startswith(prefix)]
+
+
+def _source(batches, payloads=None):
+    return [(batch, payloads.get(batch[0], batch) if payloads else batch) for batch in batches]
+
+
+def _parse(payload):
+    return ([(item_id,) for item_id in payload],)
+
+
+def test_resume_latest_only_considers_closed_runs(monkeypatch):
+    db = FakeDb(monkeypatch, lambda sql, params: [])
+    assert RunCheckpoint.resume("prices") is None
+    (select, _), = db.statements("SELECT")
+    assert "status IN ('failed', 'partial')" in select
+    assert not db.statements("UPDATE t_run")
+
+
+def test_resume_refuses_run_with_live_claims(monkeypatch):
+    runs = {7: "running"}
+    claim_ages = {7: [10.0]}  # seconds since each claimed batch of the run was claimed
+
+    def answer(sql, params):
+        task, run_id, timeout = params
+        live = any(age < timeout.total_seconds() for age in claim_ages.get(run_id, ()))
+        if "NOT EXISTS" in sql and runs.get(run_id) != "completed" and not live:
+            return [(run_id, None, {})]
+        return []
+
+    db = FakeDb(monkeypatch, answer)
+    assert RunCheckpoint.resume("prices", 7, claim_timeout=300) is None
+    assert not db.statements("UPDATE t_run")
+
+    claim_ages[7] = [900.0]  # the worker holding it died a while ago
+    run = RunCheckpoint.resume("prices", 7, claim_timeout=300)
+    assert run is not None and run.run_id == 7
+    (reopen, params), = db.statements("UPDATE t_run")
+    assert "status = 'running'" in reopen and params == (7,)
+
+
+class MemoryRun(RunCheckpoint):
+    """A run whose batches live in memory; ``fail`` holds batch numbers that always fail."""
+
+    def __init__(self, batches, fail=()):
+        super().__init__(1, "prices")
+        self.batches = dict(enumerate(batches))
+        self.status = {no: "pending" for no in self.batches}
+        self.attempts = {no: 0 for no in self.batches}
+        self.fail = set(fail)
+        self.finished = None
+
+    def pending(self):
+        rows = [(no, ids) for no, ids in sorted(self.batches.items()) if self.status[no] != "done"]
+        self._batch_nos = {ids[0]: no for no, ids in rows}
+        return [ids for _, ids in rows]
+
+    def mark_done(self, batches):
+        nos = [self._batch_nos[b[0]] for b in batches]
+        for no in nos:
+            self.status[no] = "done"
+            self.attempts[no] += 1
+        return nos
+
+    def mark_failed(self, batch, error):
+        no = self._batch_nos[batch[0]]
+        self.status[no] = "failed"
+        self.attempts[no] += 1
+
+    def finish(self, status=None):
+        if status is None:
+            status = "completed" if all(s == "done" for s in self.status.values()) else "partial"
+        self.finished = status
+        return status
+
+
+def _failing_fetch(run, fetched):
+    def fetch(batches, on_error):
+        fetched.append([run._batch_nos[b[0]] for b in batches])
+        ok = []
+        for batch in batches:
+            if run._batch_nos[batch[0]] in run.fail:
+                on_error(batch, RuntimeError("503 from the API"))
+            else:
+                ok.append(batch)
+        return _source(ok)
+    return fetch
+
+
+@pytest.mark.parametrize("commit_every, sleeps", [(None, 0), (5, DEFAULT_BATCH_RETRIES)])
+def test_failed_batches_are_retried_up_to_the_limit(monkeypatch, commit_every, sleeps):
+    db = FakeDb(monkeypatch, lambda sql, params: [])
+    run = MemoryRun([[1, 2], [3], [4, 5]], fail={1})
+    fetched = []
+    written = []
+
+    processed = run_checkpointed(run, _failing_fetch(run, fetched), _parse,
+                                 lambda rows, logger: written.extend(r[0] for r in rows), LOGGER,
+                                 commit_every=commit_every)
+
+    assert fetched == [[0, 1, 2]] + [[1]] * DEFAULT_BATCH_RETRIES
+    assert run.attempts[1] == DEFAULT_BATCH_RETRIES + 1
+    assert sorted(written) == [1, 2, 4, 5] and processed == 4
+    assert run.finished == "partial"
+    # an atomic run must not sleep with its transaction open
+    assert len([entry for entry in db.log if entry[0] == "sleep"]) == sleeps
+
+
+def test_worker_rolls_back_flush_when_a_claim_was_lost(monkeypatch):
+    claims = [[(0, [1, 2]), (1, [3])], []]
+
+    def answer(sql, params):
+        if sql.startswith("UPDATE t_run_batch b SET status = 'claimed'"):
+            return claims.pop(0)
+        if sql.startswith("UPDATE t_run_batch SET status = 'done'"):
+            # another worker took over batch 1 after its claim went stale
+            return [(no,) for no in params[1] if no != 1]
+        if sql.startswith("SELECT status, count(*)"):
+            return [("done", 1), ("claimed", 1)]
+        if sql.startswith("SELECT count(*) FROM t_run_batch WHERE run_id = %s AND (status IN"):
+            return [(0,)]
+        if sql.startswith("SELECT count(*)"):
+            return [(1,)]
+        return []
+
+    db = FakeDb(monkeypatch, answer)
+    monkeypatch.setattr(checkpoint, "worker_name", lambda: "host-a:1")
+    run = RunCheckpoint(1, "prices")
+    written = []
+
+    processed = run_worker(run, lambda batches, on_error: _source(batches), _parse,
+                           lambda rows, logger: written.extend(r[0] for r in rows), LOGGER, claim_timeout=300)
+
+    assert 3 not in written
+    assert db.statements("ROLLBACK TO SAVEPOINT gw2_worker_flush")
+    released = [params for sql, params in db.statements("UPDATE t_run_batch SET status = 'pending'")]
+    assert released and all(params[2] == "host-a:1" and 1 not in params[1] for params in released)
+    assert processed == len(written)
@@ -0,0 +1,29 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+pq = pytest.importorskip("pyarrow.parquet")
+
+from tasks.export.export_history import DATASETS, load_history  # noqa: E402
+
+
+def _stats_row(item_id, snapshot_ts, value):
+    return (item_id, snapshot_ts - timedelta(minutes=5), snapshot_ts) + (value,) * 12
+
+
+def test_load_history_keeps_newest_part_per_snapshot(tmp_path):
+    stats = DATASETS["stats"]
+    t0 = datetime(2026, 10, 1, 1, tzinfo=timezone.utc)
+    t1 = t0 + timedelta(hours=1)
+    day = tmp_path / "stats" / "date=2026-10-01"
+    day.mkdir(parents=True)
+    pq.write_table(stats.to_table([_stats_row(1, t0, 1), _stats_row(2, t0, 1), _stats_row(1, t1, 1)]),
+                   day / "part-1000.parquet")
+    # update_volume rewrote the stats of item 1 at t0 and the snapshot was exported again
+    pq.write_table(stats.to_table([_stats_row(1, t0, 9)]), day / "part-2000.parquet")
+
+    table = load_history(tmp_path, t0, t1 + timedelta(minutes=1), dataset="stats",
+                         columns=["item_id", "snapshot_ts_to", "buy_qty_curr"])
+    rows = {(r["item_id"], r["snapshot_ts_to"]): r["buy_qty_curr"] for r in table.to_pylist()}
+    assert table.num_rows == 3
+    assert rows == {(1, t0): 9, (1, t1): 1, (2, t0): 1}
@@ -0,0 +1,45 @@
+import json
+
+import pytest
+
+from utils.json_codec import split_listings
+
+
+def _decoded(data):
+    """What the regex path must agree with: the listings decoded the slow way."""
+    return [(it["id"], it.get("buys") or None, it.get("sells") or None) for it in json.loads(data)]
+
+
+def _split(data):
+    return [(id_, json.loads(buys) if buys else None, json.loads(sells) if sells else None)
+            for id_, buys, sells in split_listings(data)]
+
+
+def test_regex_path_keeps_raw_spans():
+    data = (b'[{"id":19721,"buys":[{"listings":1,"unit_price":80,"quantity":250}],'
+            b'"sells":[ {"listings":2,"unit_price":95,"quantity":10} ]}]')
+    ((id_, buys, sells),) = split_listings(data)
+    assert id_ == 19721
+    assert buys == b'[{"listings":1,"unit_price":80,"quantity":250}]'
+    assert sells == b'[ {"listings":2,"unit_price":95,"quantity":10} ]'
+
+
+@pytest.mark.parametrize("data", [
+    # empty sides
+    b'[{"id":1,"buys":[],"sells":[{"listings":1,"unit_price":5,"quantity":1}]},{"id":2,"buys":[ ],"sells":[]}]',
+    # reordered keys
+    b'[{"buys":[{"listings":1,"unit_price":3,"quantity":7}],"id":3,"sells":[]},'
+    b'{"id":4,"sells":[{"listings":2,"unit_price":9,"quantity":1}],"buys":[]}]',
+    # extra keys
+    b'[{"id":5,"buys":[],"sells":[{"listings":1,"unit_price":4,"quantity":2}],"whitelisted":false},'
+    b'{"name":"id","id":6,"buys":[],"sells":[]}]',
+    b'[]',
+])
+def test_regex_path_matches_decode_path(data):
+    assert _split(data) == _decoded(data)
+
+
+@pytest.mark.parametrize("data", [b'{"text":"too many requests"}', b' {"text": "all ids provided are invalid"}'])
+def test_error_object_is_not_an_empty_result(data):
+    with pytest.raises(RuntimeError, match="Unexpected listings payload"):
+        split_listings(data)
@@ -0,0 +1,31 @@
+from tasks.crafting.recipe_graph import Recipe, RecipeGraph
+
+
+def test_cycle_does_not_bill_output_to_itself():
+    graph = RecipeGraph([
+        Recipe(1, 100, 1, ((200, 10),)),
+        Recipe(2, 200, 10, ((100, 1),)),
+        Recipe(3, 300, 1, ((100, 2), (5, 1))),
+    ])
+    bills = graph.base_materials()
+    assert bills[1] == {200: 10}
+    assert bills[2] == {100: 1}
+    assert bills[3] == {200: 20, 5: 1}
+
+
+def test_incremental_rebuild_matches_full_rebuild():
+    recipes = [
+        Recipe(1, 100, 1, ((1000, 2), (1001, 1))),
+        Recipe(2, 200, 2, ((100, 3),)),
+        Recipe(3, 300, 1, ((200, 1), (1002, 4))),
+        Recipe(4, 400, 1, ((1003, 5),)),
+    ]
+    before = RecipeGraph(recipes).base_materials()
+
+    changed = Recipe(1, 100, 1, ((1000, 1), (1004, 2)))
+    graph = RecipeGraph([changed] + recipes[1:])
+    affected = graph.consumers_of([changed.output_item_id])
+    assert affected == {1, 2, 3}
+
+    rebuilt = {**before, **graph.base_materials(affected)}
+    assert rebuilt == graph.base_materials()
@@ -0,0 +1,395 @@
+import logging
+import os
+import socket
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+from psycopg2.extras import Json
+
+from utils.db import copy_rows, execute_sql, fetch_all, get_connection, run_transaction
+from utils.pipeline import run_pipeline
+from utils.constants import DEFAULT_BATCH_RETRIES
+from utils.constants import DEFAULT_BATCH_RETRY_DELAY
+from utils.constants import DEFAULT_CLAIM_BATCHES
+from utils.constants import DEFAULT_CLAIM_TIMEOUT
+from utils.constants import DEFAULT_WORKER_POLL_SECONDS
+
+
+RUN_BATCH_COLUMNS = ("run_id", "batch_no", "item_ids")
+
+
+def worker_name() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class RunCheckpoint:
+    """Durable record of which ID batches of a run have been written, kept in ``t_run``/``t_run_batch``.
+
+    Batches are marked done inside the same transaction that writes their rows, so after a crash
+    the checkpoint never claims more than what was committed. Failed batches are marked
+    ``failed`` on their own connection and stay pending until a retry or ``--resume`` succeeds.
+    Once :meth:`claim` has been called, marking a batch done or failed only succeeds while this
+    worker still holds its claim.
+    """
+
+    def __init__(self, run_id: int, task: str, snapshot_ts: Optional[datetime] = None,
+                 params: Optional[Dict[str, Any]] = None):
+        self.run_id = run_id
+        self.task = task
+        self.snapshot_ts = snapshot_ts
+        self.params = params or {}
+        self.worker: Optional[str] = None
+        self._batch_nos: Dict[int, int] = {}
+        self._open: Set[int] = set()
+
+    @classmethod
+    def start(cls, task: str, batches: Iterable[List[int]], snapshot_ts: Optional[datetime] = None,
+              params: Optional[Dict[str, Any]] = None) -> "RunCheckpoint":
+        batches = list(batches)
+        with run_transaction():
+            rows = fetch_all(
+                "INSERT INTO t_run (task, snapshot_ts, params, total_batches) VALUES (%s, %s, %s, %s) RETURNING run_id",
+                (task, snapshot_ts, Json(params or {}), len(batches)),
+            )
+            run = cls(rows[0][0], task, snapshot_ts, params)
+            copy_rows("public.t_run_batch", RUN_BATCH_COLUMNS,
+                      [(run.run_id, no, batch) for no, batch in enumerate(batches)])
+        return run
+
+    @classmethod
+    def resume(cls, task: str, run_id: Optional[int] = None,
+               claim_timeout: float = DEFAULT_CLAIM_TIMEOUT) -> Optional["RunCheckpoint"]:
+        """Load ``run_id``, or the latest failed or partial run of ``task``; ``None`` if there is nothing to resume.
+
+        Without ``run_id`` only runs that were closed as ``failed`` or ``partial`` qualify, never
+        one that is still ``running`` in another process. An explicit ``run_id`` may also name a
+        ``running`` run left behind by a crash, but not one that workers still hold live claims on.
+        """
+        if run_id is None:
+            rows = fetch_all(
+                """
+                SELECT run_id, snapshot_ts, params FROM t_run
+                WHERE task = %s AND status IN ('failed', 'partial')
+                ORDER BY started_at DESC
+                LIMIT 1
+                """,
+                (task,),
+            )
+        else:
+            rows = fetch_all(
+                """
+                SELECT run_id, snapshot_ts, params FROM t_run r
+                WHERE task = %s AND run_id = %s AND status <> 'completed'
+                  AND NOT EXISTS (
+                      SELECT 1 FROM t_run_batch b
+                      WHERE b.run_id = r.run_id AND b.status = 'claimed' AND b.claimed_at >= now() - %s
+                  )
+                """,
+                (task, run_id, timedelta(seconds=claim_timeout)),
+            )
+        if not rows:
+            return None
+        run_id, snapshot_ts, params = rows[0]
+        execute_sql("UPDATE t_run SET status = 'running', finished_at = NULL WHERE run_id = %s", (run_id,))
+        return cls(run_id, task, snapshot_ts, params)
+
+    @classmethod
+    def open(cls, task: str, run_id: Optional[int] = None) -> Optional["RunCheckpoint"]:
+        """Load ``run_id``, or the latest running run of ``task``, for a worker; ``None`` if there is none."""
+        if run_id is None:
+            rows = fetch_all(
+                """
+                SELECT run_id, snapshot_ts, params FROM t_run
+                WHERE task = %s AND status = 'running'
+                ORDER BY started_at DESC
+                LIMIT 1
+                """,
+                (task,),
+            )
+        else:
+            rows = fetch_all("SELECT run_id, snapshot_ts, params FROM t_run WHERE task = %s AND run_id = %s",
+                             (task, run_id))
+        if not rows:
+            return None
+        run_id, snapshot_ts, params = rows[0]
+        return cls(run_id, task, snapshot_ts, params)
+
+    def claim(self, worker: str, limit: int = DEFAULT_CLAIM_BATCHES, timeout: float = DEFAULT_CLAIM_TIMEOUT,
+              retries: int = DEFAULT_BATCH_RETRIES, retry_delay: float = DEFAULT_BATCH_RETRY_DELAY) -> List[List[int]]:
+        """Claim up to ``limit`` batches for ``worker`` and commit the claim right away.
+
+        Pending batches come first in batch order. Claims older than ``timeout`` seconds are
+        taken over, as their worker is presumed dead, and failed batches are retried
+        ``retry_delay`` seconds after their last attempt, up to ``retries`` times.
+        ``SKIP LOCKED`` lets concurrent workers claim without waiting on each other.
+        """
+        with run_transaction():
+            rows = fetch_all(
+                """
+                UPDATE t_run_batch b
+                SET status = 'claimed', claimed_by = %(worker)s, claimed_at = now(), updated_at = now()
+                FROM (
+                    SELECT batch_no FROM t_run_batch
+                    WHERE run_id = %(run_id)s
+                      AND (status = 'pending'
+                           OR (status = 'claimed' AND claimed_at < now() - %(timeout)s)
+                           OR (status = 'failed' AND attempts <= %(retries)s AND updated_at < now() - %(retry_delay)s))
+                    ORDER BY batch_no
+                    LIMIT %(limit)s
+                    FOR UPDATE SKIP LOCKED
+                ) c
+                WHERE b.run_id = %(run_id)s AND b.batch_no = c.batch_no
+                RETURNING b.batch_no, b.item_ids
+                """,
+                {"worker": worker, "run_id": self.run_id, "timeout": timedelta(seconds=timeout),
+                 "retries": retries, "retry_delay": timedelta(seconds=retry_delay), "limit": limit},
+            )
+        rows.sort()
+        self.worker = worker
+        self._batch_nos = {ids[0]: no for no, ids in rows}
+        self._open = set(self._batch_nos.values())
+        return [ids for _, ids in rows]
+
+    def heartbeat(self):
+        """Refresh ``claimed_at`` of the claims this worker has not written yet, so they don't go stale.
+
+        Runs on its own connection and commits at once, as the worker's write transaction only
+        commits at the end of a claim round. Batches already touched by that transaction are
+        left out, so the update never waits on the worker's own row locks.
+        """
+        if self.worker is None or not self._open:
+            return
+        with get_connection() as conn:
+            with conn:
+                with conn.cursor() as cur:
+                    cur.execute(
+                        """
+                        UPDATE t_run_batch SET claimed_at = now()
+                        WHERE run_id = %s AND claimed_by = %s AND status = 'claimed' AND batch_no = ANY(%s)
+                        """,
+                        (self.run_id, self.worker, list(self._open)),
+                    )
+
+    def release(self, worker: str):
+        """Hand the batches still claimed by ``worker`` back to the queue."""
+        execute_sql(
+            """
+            UPDATE t_run_batch SET status = 'pending', claimed_by = NULL, claimed_at = NULL, updated_at = now()
+            WHERE run_id = %s AND claimed_by = %s AND status = 'claimed'
+            """,
+            (self.run_id, worker),
+        )
+
+    def progress(self, retries: int = DEFAULT_BATCH_RETRIES) -> Dict[str, int]:
+        """Batch counts of the run by status, plus ``open``: batches some worker may still write."""
+        counts = dict(fetch_all("SELECT status, count(*) FROM t_run_batch WHERE run_id = %s GROUP BY status",
+                                (self.run_id,)))
+        counts["open"] = fetch_all(
+            """
+            SELECT count(*) FROM t_run_batch
+            WHERE run_id = %s AND (status IN ('pending', 'claimed') OR (status = 'failed' AND attempts <= %s))
+            """,
+            (self.run_id, retries),
+        )[0][0]
+        return counts
+
+    def pending(self) -> List[List[int]]:
+        rows = fetch_all(
+            "SELECT batch_no, item_ids FROM t_run_batch WHERE run_id = %s AND status <> 'done' ORDER BY batch_no",
+            (self.run_id,),
+        )
+        self._batch_nos = {ids[0]: no for no, ids in rows}
+        return [ids for _, ids in rows]
+
+    def mark_done(self, batches: List[List[int]]) -> List[int]:
+        """Mark ``batches`` done; returns the batch numbers that were, which after :meth:`claim`
+        excludes any batch whose claim another worker has taken over in the meantime."""
+        batch_nos = [self._batch_nos[b[0]] for b in batches]
+        self._open.difference_update(batch_nos)
+        if self.worker is None:
+            execute_sql(
+                """
+                UPDATE t_run_batch
+                SET status = 'done', attempts = attempts + 1, last_error = NULL, updated_at = now()
+                WHERE run_id = %s AND batch_no = ANY(%s)
+                """,
+                (self.run_id, batch_nos),
+            )
+            return batch_nos
+        rows = fetch_all(
+            """
+            UPDATE t_run_batch
+            SET status = 'done', attempts = attempts + 1, last_error = NULL, updated_at = now()
+            WHERE run_id = %s AND batch_no = ANY(%s) AND claimed_by = %s AND status = 'claimed'
+            RETURNING batch_no
+            """,
+            (self.run_id, batch_nos, self.worker),
+        )
+        return [row[0] for row in rows]
+
+    def mark_failed(self, batch: List[int], error: BaseException):
+        batch_no = self._batch_nos[batch[0]]
+        self._open.discard(batch_no)
+        if self.worker is None:
+            execute_sql(
+                """
+                UPDATE t_run_batch
+                SET status = 'failed', attempts = attempts + 1, last_error = %s, updated_at = now()
+                WHERE run_id = %s AND batch_no = %s
+                """,
+                (str(error)[:1000], self.run_id, batch_no),
+            )
+            return
+        execute_sql(
+            """
+            UPDATE t_run_batch
+            SET status = 'failed', attempts = attempts + 1, last_error = %s, updated_at = now()
+            WHERE run_id = %s AND batch_no = %s AND claimed_by = %s AND status = 'claimed'
+            """,
+            (str(error)[:1000], self.run_id, batch_no, self.worker),
+        )
+
+    def release_batches(self, batch_nos: List[int]):
+        """Hand ``batch_nos`` back to the queue, in the current transaction."""
+        execute_sql(
+            """
+            UPDATE t_run_batch SET status = 'pending', claimed_by = NULL, claimed_at = NULL, updated_at = now()
+            WHERE run_id = %s AND batch_no = ANY(%s) AND claimed_by = %s
+            """,
+            (self.run_id, batch_nos, self.worker),
+        )
+
+    def finish(self, status: Optional[str] = None) -> str:
+        """Close the run as ``completed`` when no batch is left, otherwise as ``partial`` (or ``status``)."""
+        if status is None:
+            left = fetch_all("SELECT count(*) FROM t_run_batch WHERE run_id = %s AND status <> 'done'",
+                             (self.run_id,))[0][0]
+            status = "completed" if left == 0 else "partial"
+        execute_sql("UPDATE t_run SET status = %s, finished_at = now() WHERE run_id = %s", (status, self.run_id))
+        return status
+
+
+def run_checkpointed(
+    run: RunCheckpoint,
+    fetch: Callable[[List[List[int]], Callable[[List[int], BaseException], None]], Iterable],
+    parse: Callable[[Any], tuple],
+    write_rows: Callable[..., None],
+    logger: logging.Logger,
+    commit_every: Optional[int] = None,
+    retries: int = DEFAULT_BATCH_RETRIES,
+    retry_delay: float = DEFAULT_BATCH_RETRY_DELAY,
+) -> int:
+    """Process the pending batches of ``run`` through :func:`run_pipeline` and close the run.
+
+    ``fetch(batches, on_error)`` must return the pipeline source and pass ``on_error`` on to
+    :func:`utils.fetch.fetch_batches`, so failed batches are quarantined instead of raised. They
+    are retried up to ``retries`` more times; whatever is still failing is left for ``--resume``.
+    With ``commit_every`` set, the work so far is committed and the retry waits
+    ``retry_delay * attempt`` seconds first; an atomic run (no ``commit_every``) retries right
+    away instead of sleeping with its transaction open.
+    Returns the number of IDs written.
+    """
+    processed = 0
+    try:
+        with run_transaction(commit_every=commit_every) as tx:
+            def write(batches, *tables):
+                write_rows(*tables, logger=logger)
+                run.mark_done(batches)
+                tx.batch_done(len(batches))
+
+            for attempt in range(retries + 1):
+                batches = run.pending()
+                if not batches:
+                    break
+                if attempt:
+                    logger.warning(f"Run {run.run_id}: retrying {len(batches)} failed batches "
+                                   f"(attempt {attempt}/{retries}).")
+                    if tx.commit_every:
+                        tx.commit()
+                        time.sleep(retry_delay * attempt)
+                processed += run_pipeline(fetch(batches, run.mark_failed), parse, write,
+                             total=sum(len(b) for b in batches), logger=logger)
+    except BaseException:
+        run.finish("failed")
+        logger.error(f"Run {run.run_id} failed; continue it with --resume {run.run_id}.")
+        raise
+
+    status = run.finish()
+    if status == "completed":
+        logger.info(f"Run {run.run_id} completed.")
+    else:
+        logger.warning(f"Run {run.run_id} finished with failed batches; continue it with --resume {run.run_id}.")
+    return processed
+
+
+def run_worker(
+    run: RunCheckpoint,
+    fetch: Callable[[List[List[int]], Callable[[List[int], BaseException], None]], Iterable],
+    parse: Callable[[Any], tuple],
+    write_rows: Callable[..., None],
+    logger: logging.Logger,
+    commit_every: Optional[int] = None,
+    retries: int = DEFAULT_BATCH_RETRIES,
+    retry_delay: float = DEFAULT_BATCH_RETRY_DELAY,
+    claim_batches: int = DEFAULT_CLAIM_BATCHES,
+    claim_timeout: float = DEFAULT_CLAIM_TIMEOUT,
+    poll_seconds: float = DEFAULT_WORKER_POLL_SECONDS,
+) -> int:
+    """Work on a shared run next to any number of other workers, on this host or others.
+
+    Claims ``claim_batches`` batches at a time from ``t_run_batch`` and processes them like
+    :func:`run_checkpointed`. While other workers still hold claims the worker polls, so it can
+    take over claims that went stale. Whichever worker finds nothing left to do closes the run.
+
+    Every flush first marks its batches done under this worker's claim and only then writes
+    their rows. If another worker took over any of them, the flush is rolled back to a savepoint,
+    the batches still owned are handed back to the queue and nothing is written, so a batch is
+    never written twice. Each flush also refreshes the claims not written yet.
+    Returns the number of IDs this worker wrote.
+    """
+    worker = worker_name()
+    processed = 0
+    lost = 0
+    logger.info(f"Worker {worker} joined run {run.run_id}.")
+    try:
+        while True:
+            batches = run.claim(worker, claim_batches, claim_timeout, retries, retry_delay)
+            if not batches:
+                if run.progress(retries)["open"]:
+                    time.sleep(poll_seconds)
+                    continue
+                break
+
+            with run_transaction(commit_every=commit_every) as tx:
+                def write(done, *tables):
+                    nonlocal lost
+                    execute_sql("SAVEPOINT gw2_worker_flush")
+                    owned = run.mark_done(done)
+                    if len(owned) < len(done):
+                        execute_sql("ROLLBACK TO SAVEPOINT gw2_worker_flush")
+                        run.release_batches(owned)
+                        lost += sum(len(b) for b in done)
+                        logger.warning(f"Worker {worker} lost {len(done) - len(owned)} of {len(done)} claims on run "
+                                       f"{run.run_id} to another worker; skipped writing them.")
+                    else:
+                        write_rows(*tables, logger=logger)
+                        execute_sql("RELEASE SAVEPOINT gw2_worker_flush")
+                        tx.batch_done(len(done))
+                    run.heartbeat()
+
+                processed += run_pipeline(fetch(batches, run.mark_failed), parse, write,
+                                          total=sum(len(b) for b in batches), logger=logger)
+
+            progress = run.progress(retries)
+            logger.info(f"Run {run.run_id}: {progress.get('done', 0)} batches done, {progress.get('claimed', 0)} claimed, "
+                        f"{progress.get('pending', 0)} pending, {progress.get('failed', 0)} failed.")
+    except BaseException:
+        run.release(worker)
+        logger.error(f"Worker {worker} stopped; its claims on run {run.run_id} were released.")
+        raise
+
+    processed -= lost
+    status = run.finish()
+    logger.info(f"Worker {worker} finished after writing {processed} IDs; run {run.run_id} is {status}.")
+    return processed
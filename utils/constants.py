@@ -1,12 +1,73 @@
+import os
+
+
 # GW2 API
-GW2_API_BASE_URL = "https://api.guildwars2.com/v2"
+GW2_API_BASE_URL = os.getenv("GW2_API_BASE_URL", "https://api.guildwars2.com/v2")
 GW2_API_ITEMS_URL = GW2_API_BASE_URL + "/items"
 GW2_API_RECIPE_SEARCH_URL = GW2_API_BASE_URL + "/recipes/search"
 GW2_API_RECIPE_URL = GW2_API_BASE_URL + "/recipes"
 GW2_API_TP_LIST_URL = GW2_API_BASE_URL + "/commerce/listings"
+GW2_API_TP_PRICES_URL = GW2_API_BASE_URL + "/commerce/prices"
 
 
 # Rate
 DEFAULT_BURST = 300
 DEFAULT_REFILL_RATE = 5.0
-MAX_IDS_PER_REQUEST = 200
\ No newline at end of file
+MIN_REFILL_RATE = 0.5
+MAX_IDS_PER_REQUEST = 200
+DEFAULT_MAX_WORKERS = 8
+PRICE_RESERVE_TOKENS = 100
+
+
+# DB
+DEFAULT_DB_POOL_SIZE = 4
+DEFAULT_DB_POOL_TIMEOUT = 60.0
+DEFAULT_COMMIT_EVERY = 20
+DEFAULT_STREAM_ROWS = 20000
+
+
+# Sync
+REVALIDATE_BUCKETS = 7
+
+
+# Listing history
+LISTING_PARTITION_DAYS_AHEAD = 2
+LISTING_RETENTION_DAYS = 30
+LISTING_KEYFRAME_HOURS = 6
+
+
+# Trading post
+TP_FEE_RATE = 0.15
+FLIP_TOP_N = 500
+FLIP_MAX_PRICE_AGE_HOURS = 24
+
+
+# HTTP cache
+DEFAULT_CACHE_TTLS = {
+    GW2_API_ITEMS_URL: 24 * 3600,
+    GW2_API_RECIPE_URL: 24 * 3600,
+}
+DEFAULT_CACHE_MAX_BYTES = 1024 * 1024 * 1024
+
+
+# Price tiers
+PRICE_HOT_TIER_SIZE = 2000
+PRICE_COLD_TIERS = 6
+PRICE_TIER_WINDOW_HOURS = 24
+PRICE_TIER_MAX_AGE_SECONDS = 3600
+
+
+# Pipeline
+DEFAULT_PIPELINE_QUEUE_SIZE = 4
+DEFAULT_FLUSH_ROWS = 2000
+DEFAULT_FLUSH_BATCHES = 10
+DEFAULT_FLUSH_SECONDS = 1.0
+
+
+# Runs
+DEFAULT_BATCH_RETRIES = 2
+DEFAULT_BATCH_RETRY_DELAY = 30.0
+DEFAULT_CLAIM_BATCHES = 10
+DEFAULT_CLAIM_TIMEOUT = 300.0
+DEFAULT_WORKER_POLL_SECONDS = 5.0
+
@@ -1,26 +1,142 @@
+import io
 import os
+import re
+import time
+import threading
+from datetime import datetime
 from contextlib import contextmanager
 from pathlib import Path
-from typing import Iterable, Sequence, Any, Optional
+from typing import Iterable, Iterator, Sequence, Any, Optional
 
 import psycopg2
-from psycopg2.extras import execute_values
+from psycopg2.pool import PoolError, ThreadedConnectionPool
+from psycopg2.extras import execute_values, Json
 import logging
 
+from utils.constants import DEFAULT_DB_POOL_SIZE
+from utils.constants import DEFAULT_DB_POOL_TIMEOUT
+from utils.constants import DEFAULT_STREAM_ROWS
+from utils.json_codec import RawJson, dumps
+from utils.metrics import METRICS
 
-@contextmanager
-def get_connection():
-    conn = psycopg2.connect(
+
+_pool: Optional[ThreadedConnectionPool] = None
+_pool_slots: Optional[threading.BoundedSemaphore] = None
+_pool_lock = threading.Lock()
+_local = threading.local()
+
+
+def _connect_kwargs() -> dict:
+    return dict(
         host=os.getenv("PGHOST", "localhost"),
         port=int(os.getenv("PGPORT", "5432")),
         dbname=os.getenv("PGDATABASE", "gw2tp"),
         user=os.getenv("PGUSER", "postgres"),
         password=os.getenv("PGPASSWORD", "1234"),
     )
+
+
+def init_pool(minconn: int = 1, maxconn: int = DEFAULT_DB_POOL_SIZE):
+    global _pool, _pool_slots
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadedConnectionPool(minconn, maxconn, **_connect_kwargs())
+            _pool_slots = threading.BoundedSemaphore(maxconn)
+
+
+def close_pool():
+    global _pool, _pool_slots
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+            _pool_slots = None
+
+
+@contextmanager
+def get_connection(timeout: float = DEFAULT_DB_POOL_TIMEOUT):
+    """Borrow a connection from the pool, waiting up to ``timeout`` seconds for a free one.
+
+    ``ThreadedConnectionPool`` raises as soon as every connection is out, so callers queue on a
+    semaphore sized to the pool first. Without a pool a fresh connection is opened and closed.
+    """
+    if _pool is None:
+        conn = psycopg2.connect(**_connect_kwargs())
+        try:
+            yield conn
+        finally:
+            conn.close()
+        return
+
+    pool, slots = _pool, _pool_slots
+    if not slots.acquire(timeout=timeout):
+        raise PoolError(f"No database connection became free within {timeout:g}s")
     try:
-        yield conn
+        conn = pool.getconn()
+        try:
+            yield conn
+        finally:
+            if not conn.closed and conn.status != psycopg2.extensions.STATUS_READY:
+                conn.rollback()
+            pool.putconn(conn)
     finally:
-        conn.close()
+        slots.release()
+
+
+class RunTransaction:
+    """Keeps one connection and transaction open across many batch writes.
+
+    With ``commit_every`` set, the transaction is committed after that many batches, so a run
+    is split into a few large transactions instead of one per batch. Without it the whole run
+    commits (or rolls back) atomically.
+    """
+
+    def __init__(self, conn, commit_every: Optional[int] = None):
+        self.conn = conn
+        self.commit_every = commit_every
+        self.pending_batches = 0
+
+    def batch_done(self, count: int = 1):
+        self.pending_batches += count
+        if self.commit_every and self.pending_batches >= self.commit_every:
+            self.commit()
+
+    def commit(self):
+        self.conn.commit()
+        self.pending_batches = 0
+
+
+@contextmanager
+def run_transaction(commit_every: Optional[int] = None):
+    if getattr(_local, "tx", None) is not None:
+        yield _local.tx
+        return
+
+    with get_connection() as conn:
+        tx = RunTransaction(conn, commit_every=commit_every)
+        _local.tx = tx
+        try:
+            yield tx
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            _local.tx = None
+
+
+@contextmanager
+def _write_cursor():
+    tx = getattr(_local, "tx", None)
+    if tx is not None:
+        with tx.conn.cursor() as cur:
+            yield cur
+        return
+
+    with get_connection() as conn:
+        with conn:
+            with conn.cursor() as cur:
+                yield cur
 
 
 def load_sql(path: str | Path) -> str:
@@ -31,6 +147,15 @@ def load_sql(path: str | Path) -> str:
     return p.read_text(encoding="utf-8")
 
 
+_INSERT_TABLE_RE = re.compile(r"INSERT\s+INTO\s+([\w.\"]+)", re.IGNORECASE)
+
+
+def _record_write(table: str, rows: int, started: float):
+    table = table.split(".")[-1].strip('"')
+    METRICS.observe("gw2_db_write_seconds", time.perf_counter() - started, table=table)
+    METRICS.inc("gw2_db_rows_total", rows, table=table)
+
+
 def execute_values_batch(
     sql: str,
     rows: Iterable[Sequence[Any]],
@@ -41,11 +166,12 @@ def execute_values_batch(
     if not rows:
         return
 
-    with get_connection() as conn:
-        with conn:
-            with conn.cursor() as cur:
-                cur.execute("SET LOCAL statement_timeout = '30s'")
-                execute_values(cur, sql, rows, page_size=page_size)
+    started = time.perf_counter()
+    with _write_cursor() as cur:
+        cur.execute("SET LOCAL statement_timeout = '30s'")
+        execute_values(cur, sql, rows, page_size=page_size)
+    match = _INSERT_TABLE_RE.search(sql)
+    _record_write(match.group(1) if match else "unknown", len(rows), started)
 
     if logger:
         logger.debug(f"execute_values_batch: executed {len(rows)} rows.")
@@ -53,10 +179,16 @@ def execute_values_batch(
 
 def fetch_all(sql: str, params: Optional[Sequence[Any]] = None,
               logger: Optional[logging.Logger] = None) -> list[tuple]:
-    with get_connection() as conn:
-        with conn.cursor() as cur:
+    tx = getattr(_local, "tx", None)
+    if tx is not None:
+        with tx.conn.cursor() as cur:
             cur.execute(sql, params)
             rows = cur.fetchall()
+    else:
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(sql, params)
+                rows = cur.fetchall()
 
     if logger:
         logger.debug(f"fetch_all: fetched {len(rows)} rows for query: {sql}")
@@ -64,6 +196,177 @@ def fetch_all(sql: str, params: Optional[Sequence[Any]] = None,
     return rows
 
 
+def fetch_write_watermark() -> datetime:
+    """Server time before which every write in this database is already visible.
+
+    Rows stamped with ``now()`` carry the start time of their transaction, so anything not yet
+    committed belongs to a transaction that is still open. The oldest open transaction start
+    (or the current time when there is none) is therefore a safe lower bound for the next
+    ``>= watermark`` change query, however long those transactions run.
+    """
+    return fetch_all(
+        """
+        SELECT LEAST(clock_timestamp(), min(xact_start))
+        FROM pg_stat_activity
+        WHERE datname = current_database() AND xact_start IS NOT NULL AND pid <> pg_backend_pid()
+        """
+    )[0][0]
+
+
+def stream_rows(sql: str, params: Optional[Any] = None, size: int = DEFAULT_STREAM_ROWS) -> Iterator[list[tuple]]:
+    """Yield the result of ``sql`` in chunks of ``size`` rows from a server-side cursor.
+
+    Only one chunk is held in memory at a time, however large the result is.
+    """
+    with get_connection() as conn:
+        with conn.cursor(name=f"gw2_stream_{threading.get_ident()}") as cur:
+            cur.itersize = size
+            cur.execute(sql, params)
+            while True:
+                rows = cur.fetchmany(size)
+                if not rows:
+                    break
+                yield rows
+
+
 def fetch_column_list(sql: str, params=None) -> list[Any]:
     rows = fetch_all(sql, params)
     return [row[0] for row in rows]
+
+
+def _copy_array_element(value: Any) -> str:
+    if value is None:
+        return "NULL"
+    text = str(value).replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{text}"'
+
+
+def _copy_escape(text: str) -> str:
+    if "\\" in text or "\t" in text or "\n" in text or "\r" in text:
+        text = (text.replace("\\", "\\\\")
+                    .replace("\t", "\\t")
+                    .replace("\n", "\\n")
+                    .replace("\r", "\\r"))
+    return text
+
+
+# COPY text encoders by exact type; looked up once per value instead of walking an isinstance chain.
+_COPY_ENCODERS = {
+    type(None): lambda value: "\\N",
+    bool: lambda value: "t" if value else "f",
+    int: str,
+    float: repr,
+    str: _copy_escape,
+    datetime: datetime.isoformat,
+    RawJson: lambda value: _copy_escape(value.decode("utf-8")),
+    Json: lambda value: _copy_escape(dumps(value.adapted).decode("utf-8")),
+    dict: lambda value: _copy_escape(dumps(value).decode("utf-8")),
+    list: lambda value: _copy_escape("{" + ",".join(_copy_array_element(v) for v in value) + "}"),
+    tuple: lambda value: _copy_escape("{" + ",".join(_copy_array_element(v) for v in value) + "}"),
+}
+
+
+def _copy_value(value: Any) -> str:
+    encode = _COPY_ENCODERS.get(type(value))
+    if encode is None:
+        return _copy_escape(str(value))
+    return encode(value)
+
+
+def _copy_buffer(rows: Iterable[Sequence[Any]]) -> io.BytesIO:
+    buf = io.BytesIO()
+    write = buf.write
+    for row in rows:
+        write(("\t".join([_copy_value(v) for v in row]) + "\n").encode("utf-8"))
+    buf.seek(0)
+    return buf
+
+
+def _copy_into(cur, table: str, columns: Sequence[str], rows: list):
+    cols = ", ".join(columns)
+    cur.copy_expert(f"COPY {table} ({cols}) FROM STDIN WITH (FORMAT text)", _copy_buffer(rows))
+
+
+def copy_rows(
+    table: str,
+    columns: Sequence[str],
+    rows: Iterable[Sequence[Any]],
+    logger: Optional[logging.Logger] = None,
+):
+    """Append rows to ``table`` with ``COPY ... FROM STDIN``."""
+    rows = list(rows)
+    if not rows:
+        return
+
+    started = time.perf_counter()
+    with _write_cursor() as cur:
+        cur.execute("SET LOCAL statement_timeout = '30s'")
+        _copy_into(cur, table, columns, rows)
+    _record_write(table, len(rows), started)
+
+    if logger:
+        logger.debug(f"copy_rows: copied {len(rows)} rows into {table}.")
+
+
+def copy_staged(
+    table: str,
+    columns: Sequence[str],
+    rows: Iterable[Sequence[Any]],
+    statements: Sequence[str],
+    params: Optional[Any] = None,
+    logger: Optional[logging.Logger] = None,
+):
+    """COPY ``rows`` into a temporary staging table shaped like ``table`` and run ``statements`` on it.
+
+    The stage is named ``_stage_<table>`` (without schema), so the statements can select from it
+    and fan one COPY out to several tables in the same transaction. ``params`` are passed to
+    every statement.
+    """
+    rows = list(rows)
+    if not rows:
+        return
+
+    stage = "_stage_" + table.split(".")[-1]
+    started = time.perf_counter()
+    with _write_cursor() as cur:
+        cur.execute("SET LOCAL statement_timeout = '30s'")
+        cur.execute(f"CREATE TEMP TABLE IF NOT EXISTS {stage} (LIKE {table} INCLUDING DEFAULTS) ON COMMIT DROP")
+        _copy_into(cur, stage, columns, rows)
+        for sql in statements:
+            cur.execute(sql, params)
+        cur.execute(f"TRUNCATE {stage}")
+    _record_write(table, len(rows), started)
+
+    if logger:
+        logger.debug(f"copy_staged: staged {len(rows)} rows for {table}.")
+
+
+def copy_upsert(
+    sql: str,
+    table: str,
+    columns: Sequence[str],
+    rows: Iterable[Sequence[Any]],
+    logger: Optional[logging.Logger] = None,
+):
+    """Run an ``INSERT ... VALUES %s ON CONFLICT ...`` statement from a COPY-loaded staging table.
+
+    ``sql`` is the same statement used with :func:`execute_values_batch`; its ``VALUES %s``
+    clause is replaced by a select over a temporary table with the layout of ``table``.
+    """
+    if "VALUES %s" not in sql:
+        raise ValueError("copy_upsert expects an INSERT statement with a 'VALUES %s' clause.")
+
+    stage = "_stage_" + table.split(".")[-1]
+    copy_staged(table, columns, rows, [sql.replace("VALUES %s", f"SELECT {', '.join(columns)} FROM {stage}")],
+                logger=logger)
+
+
+def execute_sql(sql: str, params: Optional[Any] = None, logger: Optional[logging.Logger] = None) -> int:
+    with _write_cursor() as cur:
+        cur.execute(sql, params)
+        rowcount = cur.rowcount
+
+    if logger:
+        logger.debug(f"execute_sql: {rowcount} rows affected.")
+
+    return rowcount
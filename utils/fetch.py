@@ -0,0 +1,102 @@
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from utils.http import http_get
+from utils.http_cache import HttpCache
+from utils.json_codec import loads
+from utils.metrics import METRICS, endpoint
+from utils.constants import MAX_IDS_PER_REQUEST
+from utils.constants import DEFAULT_MAX_WORKERS
+
+
+def chunked(iterable: Iterable[int], size: int = MAX_IDS_PER_REQUEST) -> Iterable[List[int]]:
+    batch = []
+    for x in iterable:
+        batch.append(x)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def create_session(max_workers: int = DEFAULT_MAX_WORKERS) -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def decode_list(content: bytes) -> List[Any]:
+    payload = loads(content)
+    if not isinstance(payload, list):
+        raise RuntimeError(f"Unexpected response (expected a list). Got Type: {type(payload)}")
+    return payload
+
+
+def _fetch_batch(url: str, ids: List[int], session: requests.Session, limiter, logger: Optional[logging.Logger],
+                 cache: Optional[HttpCache], decode: Callable[[bytes], Any]):
+    params = {"ids": ",".join(map(str, ids))}
+    response = http_get(url, session, params=params, limiter=limiter, logger=logger, cache=cache)
+    with METRICS.timer("gw2_json_parse_seconds", endpoint=endpoint(url)):
+        return decode(response.content)
+
+
+def fetch_batches(
+    url: str,
+    batches: Iterable[List[int]],
+    session: requests.Session,
+    limiter=None,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    logger: Optional[logging.Logger] = None,
+    cache: Optional[HttpCache] = None,
+    decode: Callable[[bytes], Any] = decode_list,
+    on_error: Optional[Callable[[List[int], Exception], None]] = None,
+) -> Iterator[Tuple[List[int], List[Any]]]:
+    """Fetch ``?ids=`` batches concurrently and yield ``(batch, payload)`` in submission order.
+
+    At most ``max_workers`` requests are in flight; all workers share ``limiter``, so the
+    total request rate stays within a single token bucket. ``decode`` turns the raw response
+    body into the payload and runs in the worker thread. With ``on_error`` set, a batch that
+    still fails after the HTTP retries is handed to it and skipped instead of ending the run.
+    """
+    batches = iter(batches)
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="gw2-fetch") as pool:
+        in_flight = deque()
+
+        def submit_next() -> bool:
+            batch = next(batches, None)
+            if batch is None:
+                return False
+            in_flight.append((batch, pool.submit(_fetch_batch, url, batch, session, limiter, logger, cache, decode)))
+            return True
+
+        for _ in range(max_workers):
+            if not submit_next():
+                break
+
+        try:
+            while in_flight:
+                batch, future = in_flight.popleft()
+                try:
+                    payload = future.result()
+                except Exception as e:
+                    if on_error is None:
+                        raise
+                    METRICS.inc("gw2_fetch_batches_failed_total", endpoint=endpoint(url))
+                    if logger:
+                        logger.warning(f"Batch starting at ID {batch[0]} failed: {e}")
+                    on_error(batch, e)
+                    submit_next()
+                    continue
+                submit_next()
+                yield batch, payload
+        finally:
+            for _, future in in_flight:
+                future.cancel()
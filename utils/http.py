@@ -3,6 +3,9 @@ import logging
 from typing import Dict, Optional
 import requests
 
+from utils.http_cache import HttpCache, CacheMiss
+from utils.metrics import METRICS, endpoint
+
 def http_get(
     url: str,
     session: requests.Session,
@@ -10,27 +13,52 @@ def http_get(
     limiter=None,
     max_retries: int = 5,
     logger: Optional[logging.Logger] = None,
+    cache: Optional[HttpCache] = None,
 ):
-    if limiter:
-        limiter.consume(1)
+    entry = None
+    headers = None
+    label = endpoint(url)
+    if cache and cache.is_cacheable(url):
+        entry = cache.get(url, params)
+        if entry and (cache.replay or cache.is_fresh(url, entry)):
+            METRICS.inc("gw2_http_cache_hits_total", endpoint=label)
+            return cache.to_response(url, entry)
+        if cache.replay:
+            raise CacheMiss(f"No cached response for {url} params={params}")
+        headers = cache.revalidation_headers(entry)
 
     backoff = 1.0
     for attempt in range(1, max_retries + 1):
+        if limiter:
+            limiter.consume(1)
         try:
-            resp = session.get(url, params=params, timeout=60)
+            start = time.perf_counter()
+            resp = session.get(url, params=params, timeout=60, headers=headers)
+            METRICS.observe("gw2_http_request_seconds", time.perf_counter() - start, endpoint=label, status=resp.status_code)
+            METRICS.inc("gw2_http_response_bytes_total", len(resp.content), endpoint=label)
+            if limiter:
+                limiter.observe(resp.status_code, resp.headers)
             if resp.status_code in (200, 206):
                 if logger:
                     rem = resp.headers.get("X-Rate-Limit-Remaining")
                     reset = resp.headers.get("X-Rate-Limit-Reset")
                     if rem is not None:
                         logger.debug(f"Rate remaining: {rem}, reset: {reset}")
+                if cache and resp.status_code == 200 and cache.ttl_for(url) is not None:
+                    cache.put(url, params, resp)
                 return resp
+            elif resp.status_code == 304 and entry is not None:
+                cache.refresh(entry)
+                return cache.to_response(url, entry)
             elif resp.status_code == 429:
+                METRICS.inc("gw2_http_retries_total", endpoint=label, reason="429")
                 retry_after = float(resp.headers.get("Retry-After", backoff))
                 if logger:
                     logger.warning(f"429 Too Many Requests. Sleeping {retry_after:.2f}s (attempt {attempt}/{max_retries}).")
-                time.sleep(retry_after)
+                if not limiter:
+                    time.sleep(retry_after)
             elif 500 <= resp.status_code < 600:
+                METRICS.inc("gw2_http_retries_total", endpoint=label, reason="5xx")
                 if logger:
                     logger.warning(f"Server error {resp.status_code}. Backing off {backoff:.1f}s (attempt {attempt}/{max_retries}).")
                 time.sleep(backoff)
@@ -40,9 +68,11 @@ def http_get(
                     logger.error(f"HTTP {resp.status_code} for {url} params={params} body={resp.text[:300]}")
                 resp.raise_for_status()
         except (requests.Timeout, requests.ConnectionError) as e:
+            METRICS.inc("gw2_http_retries_total", endpoint=label, reason="network")
             if logger:
                 logger.warning(f"Network error '{e}'. Backing off {backoff:.1f}s (attempt {attempt}/{max_retries}).")
             time.sleep(backoff)
             backoff = min(backoff * 2, 60)
 
+    METRICS.inc("gw2_http_failures_total", endpoint=label)
     raise RuntimeError(f"Failed to GET {url} after {max_retries} attempts")
@@ -0,0 +1,153 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from utils.constants import DEFAULT_CACHE_TTLS
+from utils.constants import DEFAULT_CACHE_MAX_BYTES
+
+
+class CacheMiss(RuntimeError):
+    pass
+
+
+class CacheEntry:
+    def __init__(self, key: str, meta: dict, body_path: Path):
+        self.key = key
+        self.meta = meta
+        self.body_path = body_path
+
+    @property
+    def stored_at(self) -> float:
+        return self.meta.get("stored_at", 0.0)
+
+
+class HttpCache:
+    """On-disk cache of GET response bodies, keyed by a SHA-256 of the URL and sorted params.
+
+    Freshness is decided per endpoint from ``ttls`` (longest matching URL prefix wins; endpoints
+    without a TTL are never cached). Stale entries are revalidated with ``If-None-Match`` /
+    ``If-Modified-Since`` when the server sent validators. The cache is kept below ``max_bytes``
+    by evicting least recently used entries. In ``replay`` mode nothing is fetched and a missing
+    entry raises :class:`CacheMiss`.
+    """
+
+    def __init__(self, directory: str | Path, ttls: Optional[Dict[str, float]] = None,
+                 max_bytes: int = DEFAULT_CACHE_MAX_BYTES, replay: bool = False):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.ttls = dict(DEFAULT_CACHE_TTLS if ttls is None else ttls)
+        self.max_bytes = max_bytes
+        self.replay = replay
+        self._lock = threading.Lock()
+        self._size = sum(p.stat().st_size for p in self.directory.glob("*/*") if p.is_file())
+
+    @staticmethod
+    def key(url: str, params: Optional[Dict] = None) -> str:
+        canonical = json.dumps([url, sorted((params or {}).items())], separators=(",", ":"), default=str)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def ttl_for(self, url: str) -> Optional[float]:
+        matches = [prefix for prefix in self.ttls if url == prefix or url.startswith(prefix + "/")]
+        if not matches:
+            return None
+        return self.ttls[max(matches, key=len)]
+
+    def is_cacheable(self, url: str) -> bool:
+        return self.replay or self.ttl_for(url) is not None
+
+    def _paths(self, key: str) -> tuple[Path, Path]:
+        folder = self.directory / key[:2]
+        return folder / f"{key}.json", folder / f"{key}.body"
+
+    def get(self, url: str, params: Optional[Dict] = None) -> Optional[CacheEntry]:
+        key = self.key(url, params)
+        meta_path, body_path = self._paths(key)
+        try:
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            return None
+        if not body_path.exists():
+            return None
+        return CacheEntry(key, meta, body_path)
+
+    def is_fresh(self, url: str, entry: CacheEntry) -> bool:
+        ttl = self.ttl_for(url)
+        return ttl is not None and time.time() - entry.stored_at < ttl
+
+    @staticmethod
+    def revalidation_headers(entry: Optional[CacheEntry]) -> Dict[str, str]:
+        if entry is None:
+            return {}
+        headers = {}
+        if entry.meta.get("etag"):
+            headers["If-None-Match"] = entry.meta["etag"]
+        if entry.meta.get("last_modified"):
+            headers["If-Modified-Since"] = entry.meta["last_modified"]
+        return headers
+
+    def put(self, url: str, params: Optional[Dict], resp: requests.Response) -> CacheEntry:
+        key = self.key(url, params)
+        meta_path, body_path = self._paths(key)
+        meta_path.parent.mkdir(parents=True, exist_ok=True)
+        meta = {
+            "url": url,
+            "params": params,
+            "stored_at": time.time(),
+            "etag": resp.headers.get("ETag"),
+            "last_modified": resp.headers.get("Last-Modified"),
+            "content_type": resp.headers.get("Content-Type"),
+        }
+        old_size = sum(p.stat().st_size for p in (meta_path, body_path) if p.exists())
+        self._atomic_write(body_path, resp.content)
+        self._atomic_write(meta_path, json.dumps(meta).encode("utf-8"))
+        new_size = meta_path.stat().st_size + body_path.stat().st_size
+
+        with self._lock:
+            self._size += new_size - old_size
+            if self._size > self.max_bytes:
+                self._evict()
+        return CacheEntry(key, meta, body_path)
+
+    def refresh(self, entry: CacheEntry):
+        entry.meta["stored_at"] = time.time()
+        meta_path, _ = self._paths(entry.key)
+        self._atomic_write(meta_path, json.dumps(entry.meta).encode("utf-8"))
+
+    def to_response(self, url: str, entry: CacheEntry) -> requests.Response:
+        os.utime(entry.body_path)
+        resp = requests.Response()
+        resp.status_code = 200
+        resp.url = url
+        resp._content = entry.body_path.read_bytes()
+        resp.headers = CaseInsensitiveDict({"Content-Type": entry.meta.get("content_type") or "application/json",
+                                            "X-Cache": "HIT"})
+        resp.encoding = "utf-8"
+        return resp
+
+    def _evict(self):
+        target = int(self.max_bytes * 0.9)
+        bodies = sorted(self.directory.glob("*/*.body"), key=lambda p: p.stat().st_mtime)
+        for body_path in bodies:
+            if self._size <= target:
+                break
+            meta_path = body_path.with_suffix(".json")
+            for p in (meta_path, body_path):
+                try:
+                    size = p.stat().st_size
+                    p.unlink()
+                    self._size -= size
+                except FileNotFoundError:
+                    continue
+
+    @staticmethod
+    def _atomic_write(path: Path, data: bytes):
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
@@ -0,0 +1,46 @@
+from datetime import datetime
+from typing import Iterable, List, Optional
+
+from utils.db import fetch_all, fetch_column_list, fetch_write_watermark
+
+
+class ItemIdIndex:
+    """Run-scoped set of known ``t_item`` IDs.
+
+    ``refresh()`` only reads rows whose server-side ``synced_at`` is at or after the write
+    watermark taken at the previous load (an index range scan), so it is cheap to call after an
+    item sync has added rows, and rows committed late by a long transaction are not missed.
+    """
+
+    def __init__(self):
+        self.ids: set[int] = set()
+        self.loaded_at: Optional[datetime] = None
+
+    @classmethod
+    def load(cls) -> "ItemIdIndex":
+        index = cls()
+        index.loaded_at = fetch_write_watermark()
+        index.ids = set(fetch_column_list("SELECT id FROM t_item"))
+        return index
+
+    def refresh(self) -> int:
+        if self.loaded_at is None:
+            self.loaded_at = fetch_write_watermark()
+            self.ids = set(fetch_column_list("SELECT id FROM t_item"))
+            return len(self.ids)
+
+        since = self.loaded_at
+        self.loaded_at = fetch_write_watermark()
+        rows = fetch_all("SELECT id FROM t_item WHERE synced_at >= %s", (since,))
+        before = len(self.ids)
+        self.ids.update(row[0] for row in rows)
+        return len(self.ids) - before
+
+    def missing(self, item_ids: Iterable[int]) -> List[int]:
+        return [i for i in item_ids if i not in self.ids]
+
+    def __contains__(self, item_id) -> bool:
+        return item_id in self.ids
+
+    def __len__(self) -> int:
+        return len(self.ids)
@@ -0,0 +1,68 @@
+import json
+import re
+from typing import Any, List, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional accelerator
+    orjson = None
+
+
+BACKEND = "orjson" if orjson is not None else "json"
+
+# One /commerce/listings entry: the API always emits "id", "buys", "sells" in this order and the
+# order-book arrays only hold flat objects of numbers, so neither array contains a nested bracket.
+_LISTING_RE = re.compile(
+    rb'"id"\s*:\s*(\d+)\s*,\s*"buys"\s*:\s*(\[[^\[\]]*\])\s*,\s*"sells"\s*:\s*(\[[^\[\]]*\])\s*}'
+)
+_EMPTY_ARRAY_RE = re.compile(rb'^\[\s*\]$')
+
+
+class RawJson(bytes):
+    """Already-encoded JSON that is written to the database as is."""
+
+
+def loads(data: bytes | str) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def canonical_dumps(obj: Any) -> bytes:
+    """Compact, key-sorted UTF-8 encoding; identical for both backends on API payloads."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS)
+    return json.dumps(obj, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def _raw_array(span: bytes) -> Optional[RawJson]:
+    return None if _EMPTY_ARRAY_RE.match(span) else RawJson(span)
+
+
+def split_listings(data: bytes) -> List[Tuple[int, Optional[RawJson], Optional[RawJson]]]:
+    """Extract ``(id, buys, sells)`` from a raw ``/commerce/listings`` response without decoding it.
+
+    ``buys``/``sells`` are the untouched JSON byte spans (``None`` when empty). If the payload does
+    not have the expected shape, it is decoded and re-encoded instead; anything but a list (an
+    API error object, say) raises.
+    """
+    if data.lstrip().startswith(b"["):
+        matches = _LISTING_RE.findall(data)
+        if len(matches) == data.count(b'"id"'):
+            return [(int(id_), _raw_array(buys), _raw_array(sells)) for id_, buys, sells in matches]
+
+    payload = loads(data)
+    if not isinstance(payload, list):
+        raise RuntimeError(f"Unexpected listings payload (expected a list). Got Type: {type(payload)}")
+    return [
+        (int(it["id"]),
+         RawJson(dumps(it["buys"])) if it.get("buys") else None,
+         RawJson(dumps(it["sells"])) if it.get("sells") else None)
+        for it in payload
+    ]
@@ -0,0 +1,180 @@
+import json
+import logging
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+from utils.db import fetch_all, fetch_write_watermark
+
+
+MARKET_COLUMNS = (
+    "item_id",
+    "snapshot_ts",
+    "best_buy",
+    "best_buy_qty",
+    "buy_qty",
+    "buy_levels",
+    "best_sell",
+    "best_sell_qty",
+    "sell_qty",
+    "sell_levels",
+)
+
+_COL = {name: i for i, name in enumerate(MARKET_COLUMNS)}
+_SELECT_LATEST = """
+    SELECT item_id, extract(epoch FROM snapshot_ts)::bigint, COALESCE(best_buy, 0), COALESCE(best_buy_qty, 0),
+           buy_qty, buy_levels, COALESCE(best_sell, 0), COALESCE(best_sell_qty, 0), sell_qty, sell_levels
+    FROM t_price_latest
+"""
+
+
+class MarketSnapshot:
+    """Latest price summary of every item as one ``int64`` array with a row per column.
+
+    Rows are sorted by item ID and looked up through a dense ``item_id -> position`` array, so
+    both single lookups and whole-column scans are plain array indexing. Missing prices are 0.
+    :meth:`save` writes an ``.npy`` file that :meth:`load` maps read-only, so any number of
+    processes can share one copy of the data. ``watermark`` is the server-side write watermark
+    (see :func:`utils.db.fetch_write_watermark`) the data is complete up to; it is kept next to
+    the ``.npy`` file in ``<file>.json``.
+    """
+
+    def __init__(self, data: np.ndarray, watermark: Optional[datetime] = None):
+        if data.ndim != 2 or data.shape[0] != len(MARKET_COLUMNS):
+            raise ValueError(f"Expected an array of shape ({len(MARKET_COLUMNS)}, n), got {data.shape}.")
+        self.data = data
+        self.watermark = watermark
+        self.item_ids = data[_COL["item_id"]]
+        size = int(self.item_ids.max()) + 1 if len(self.item_ids) else 0
+        self.positions = np.full(size, -1, dtype=np.int32)
+        self.positions[self.item_ids] = np.arange(len(self.item_ids), dtype=np.int32)
+
+    @classmethod
+    def _from_rows(cls, rows, watermark: Optional[datetime] = None) -> "MarketSnapshot":
+        data = np.array(rows, dtype=np.int64).reshape(-1, len(MARKET_COLUMNS)).T
+        return cls(np.ascontiguousarray(data[:, np.argsort(data[_COL["item_id"]], kind="stable")]), watermark)
+
+    @classmethod
+    def build(cls) -> "MarketSnapshot":
+        watermark = fetch_write_watermark()
+        return cls._from_rows(fetch_all(_SELECT_LATEST), watermark)
+
+    @staticmethod
+    def _meta_path(path: Path) -> Path:
+        return path.with_name(path.name + ".json")
+
+    @classmethod
+    def load(cls, path: str | Path) -> "MarketSnapshot":
+        """Map the snapshot at ``path``; without its ``.json`` watermark the next refresh rereads everything."""
+        path = Path(path)
+        meta = cls._meta_path(path)
+        watermark = None
+        if meta.exists():
+            value = json.loads(meta.read_text(encoding="utf-8")).get("watermark")
+            watermark = datetime.fromisoformat(value) if value else None
+        return cls(np.load(path, mmap_mode="r"), watermark)
+
+    def save(self, path: str | Path):
+        """Write the snapshot atomically; readers that mapped the old file keep their copy.
+
+        The watermark is written after the data, so a crash in between leaves an older watermark
+        and the next refresh merely rereads a little more.
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + f".{os.getpid()}.tmp")
+        with open(tmp, "wb") as f:
+            np.save(f, self.data)
+        os.replace(tmp, path)
+        self.save_watermark(path)
+
+    def save_watermark(self, path: str | Path):
+        meta = self._meta_path(Path(path))
+        tmp = meta.with_name(meta.name + f".{os.getpid()}.tmp")
+        tmp.write_text(json.dumps({"watermark": self.watermark.isoformat() if self.watermark else None}),
+                       encoding="utf-8")
+        os.replace(tmp, meta)
+
+    @property
+    def as_of(self) -> Optional[datetime]:
+        ts = self.data[_COL["snapshot_ts"]]
+        return datetime.fromtimestamp(int(ts.max()), tz=timezone.utc) if len(ts) else None
+
+    def refresh(self) -> int:
+        """Merge rows of ``t_price_latest`` written since :attr:`watermark` and advance it.
+
+        Changes are found by the server-side ``updated_at`` of each row rather than its
+        ``snapshot_ts``, so rows committed late for an older snapshot are not missed.
+        Returns the number of items that changed or were added.
+        """
+        since = self.watermark
+        self.watermark = fetch_write_watermark()
+        if since is None:
+            rows = fetch_all(_SELECT_LATEST)
+        else:
+            rows = fetch_all(_SELECT_LATEST + " WHERE updated_at >= %s", (since,))
+        if not rows:
+            return 0
+
+        fresh = MarketSnapshot._from_rows(rows)
+        known = self.rows(fresh.item_ids)
+        data = np.array(self.data)
+        data[:, known[known >= 0]] = fresh.data[:, known >= 0]
+        if (known < 0).any():
+            data = np.concatenate([data, fresh.data[:, known < 0]], axis=1)
+            data = data[:, np.argsort(data[_COL["item_id"]], kind="stable")]
+        self.__init__(np.ascontiguousarray(data), self.watermark)
+        return len(rows)
+
+    def rows(self, item_ids: Iterable[int]) -> np.ndarray:
+        """Row positions of ``item_ids``; -1 for items not in the snapshot."""
+        ids = np.asarray(item_ids, dtype=np.int64)
+        out = np.full(ids.shape, -1, dtype=np.int32)
+        inside = (ids >= 0) & (ids < len(self.positions))
+        out[inside] = self.positions[ids[inside]]
+        return out
+
+    def column(self, name: str) -> np.ndarray:
+        return self.data[_COL[name]]
+
+    def prices(self, item_ids: Iterable[int]) -> Tuple[np.ndarray, np.ndarray]:
+        """Best buy and best sell arrays for ``item_ids``; 0 where there is no price."""
+        rows = self.rows(item_ids)
+        found = rows >= 0
+        buy = np.zeros(rows.shape, dtype=np.int64)
+        sell = np.zeros(rows.shape, dtype=np.int64)
+        buy[found] = self.data[_COL["best_buy"], rows[found]]
+        sell[found] = self.data[_COL["best_sell"], rows[found]]
+        return buy, sell
+
+    def get(self, item_id: int) -> Optional[Dict[str, int]]:
+        row = self.positions[item_id] if 0 <= item_id < len(self.positions) else -1
+        if row < 0:
+            return None
+        return {name: int(self.data[i, row]) for i, name in enumerate(MARKET_COLUMNS)}
+
+    def __contains__(self, item_id) -> bool:
+        return 0 <= item_id < len(self.positions) and self.positions[item_id] >= 0
+
+    def __len__(self) -> int:
+        return len(self.item_ids)
+
+
+def refresh_market_file(path: str | Path, logger: logging.Logger) -> MarketSnapshot:
+    """Refresh the snapshot file at ``path`` from ``t_price_latest``, building it on first use."""
+    if Path(path).exists():
+        market = MarketSnapshot.load(path)
+        changed = market.refresh()
+    else:
+        market = MarketSnapshot.build()
+        changed = len(market)
+    if changed:
+        market.save(path)
+    else:
+        market.save_watermark(path)
+    logger.info(f"Market snapshot '{path}': {changed} items updated, {len(market)} items as of "
+                f"{market.as_of.isoformat() if market.as_of else '-'}.")
+    return market
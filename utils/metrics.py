@@ -0,0 +1,240 @@
+import bisect
+import cProfile
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+def _key(name: str, labels: Dict[str, object]) -> LabelKey:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def endpoint(url: str) -> str:
+    """Metric label for an API URL: its path without the host, e.g. ``/v2/commerce/listings``."""
+    return urlparse(url).path or url
+
+
+class _Histogram:
+    __slots__ = ("buckets", "counts", "count", "sum")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the ``q`` quantile."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(self.buckets + (float("inf"),), self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+class MetricsRegistry:
+    """Process-wide counters and histograms, safe to update from any thread.
+
+    Names follow Prometheus conventions (``_total`` for counters, ``_seconds`` for durations);
+    labels are passed as keyword arguments.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._counters: Dict[LabelKey, float] = {}
+        self._histograms: Dict[LabelKey, _Histogram] = {}
+        self.started = time.time()
+
+    def inc(self, name: str, value: float = 1.0, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, buckets: Tuple[float, ...] = DEFAULT_BUCKETS, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = _Histogram(buckets)
+            hist.observe(value)
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+            self.started = time.time()
+
+    def to_prometheus(self) -> str:
+        def fmt(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+        lines = []
+        with self._lock:
+            typed = set()
+            for (name, labels), value in sorted(self._counters.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {name} counter")
+                    typed.add(name)
+                lines.append(f"{name}{fmt(labels)} {_number(value)}")
+            for (name, labels), hist in sorted(self._histograms.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {name} histogram")
+                    typed.add(name)
+                cumulative = 0
+                for bound, n in zip(hist.buckets, hist.counts):
+                    cumulative += n
+                    lines.append(f"{name}_bucket{fmt(labels, [('le', f'{bound:g}')])} {cumulative}")
+                lines.append(f"{name}_bucket{fmt(labels, [('le', '+Inf')])} {hist.count}")
+                lines.append(f"{name}_sum{fmt(labels)} {hist.sum:.6f}")
+                lines.append(f"{name}_count{fmt(labels)} {hist.count}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> dict:
+        """JSON-friendly run summary, including rows/sec per table from the DB write metrics."""
+        with self._lock:
+            counters = [{"name": n, "labels": dict(l), "value": v} for (n, l), v in sorted(self._counters.items())]
+            histograms = [
+                {"name": n, "labels": dict(l), "count": h.count, "sum": round(h.sum, 6),
+                 "mean": round(h.sum / h.count, 6) if h.count else 0.0,
+                 "p50": h.quantile(0.5), "p95": h.quantile(0.95), "p99": h.quantile(0.99)}
+                for (n, l), h in sorted(self._histograms.items())
+            ]
+            write_seconds = {dict(l).get("table"): h.sum for (n, l), h in self._histograms.items()
+                             if n == "gw2_db_write_seconds"}
+            rows = {dict(l).get("table"): v for (n, l), v in self._counters.items() if n == "gw2_db_rows_total"}
+        return {
+            "started": self.started,
+            "wall_seconds": round(time.time() - self.started, 3),
+            "counters": counters,
+            "histograms": histograms,
+            "db_rows_per_sec": {t: round(rows.get(t, 0) / s, 1) for t, s in write_seconds.items() if s > 0},
+        }
+
+    def write(self, path: str | Path):
+        """Write the metrics atomically; ``.json`` paths get :meth:`summary`, anything else Prometheus text.
+
+        Safe to call from several threads at once: writes are serialised, so the file always ends
+        up with the newest data, and the temporary file is named per thread as well as per process.
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with self._write_lock:
+            if path.suffix == ".json":
+                data = json.dumps(self.summary(), indent=2)
+            else:
+                data = self.to_prometheus()
+            tmp.write_text(data, encoding="utf-8")
+            os.replace(tmp, path)
+
+
+METRICS = MetricsRegistry()
+
+
+class StackSampler:
+    """Samples the stacks of all threads every ``interval`` seconds and writes folded stacks.
+
+    Unlike cProfile it sees the fetch and parse threads too and counts wall time, including time
+    blocked on the network or the database. The output can be fed to ``flamegraph.pl``.
+    """
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples: Dict[str, int] = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="gw2-sampler", daemon=True)
+
+    def _run(self):
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            for t in threading.enumerate():
+                names[t.ident] = t.name
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{Path(code.co_filename).stem}:{code.co_name}")
+                    frame = frame.f_back
+                key = ";".join([names.get(ident, str(ident))] + stack[::-1])
+                self.samples[key] = self.samples.get(key, 0) + 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def write(self, path: str | Path):
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in sorted(self.samples.items(), key=lambda s: -s[1]):
+                f.write(f"{stack} {count}\n")
+
+
+@contextmanager
+def profiled(path: Optional[str]):
+    """Profile the block and write the result to ``path``; a no-op when ``path`` is empty.
+
+    ``*.prof`` paths get cProfile stats of the calling thread (``python -m pstats``); any other
+    path gets folded stacks from :class:`StackSampler` covering every thread.
+    """
+    if not path:
+        yield
+        return
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    if Path(path).suffix == ".prof":
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(path)
+        return
+
+    sampler = StackSampler()
+    sampler.start()
+    try:
+        yield
+    finally:
+        sampler.stop()
+        sampler.write(path)
@@ -0,0 +1,161 @@
+import logging
+import queue
+import threading
+import time
+from typing import Any, Callable, Iterable, List, Optional, Sequence, Tuple
+
+from utils.metrics import METRICS
+from utils.constants import DEFAULT_PIPELINE_QUEUE_SIZE
+from utils.constants import DEFAULT_FLUSH_ROWS
+from utils.constants import DEFAULT_FLUSH_BATCHES
+from utils.constants import DEFAULT_FLUSH_SECONDS
+from utils.constants import MAX_IDS_PER_REQUEST
+
+
+_DONE = object()
+
+
+class _Failure:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+def _put(q: queue.Queue, item, stop: threading.Event, stage: str) -> bool:
+    """Blocking put that gives up once ``stop`` is set; this is where backpressure is applied."""
+    started = time.perf_counter()
+    try:
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.2)
+                return True
+            except queue.Full:
+                continue
+        return False
+    finally:
+        METRICS.inc("gw2_pipeline_blocked_seconds_total", time.perf_counter() - started, stage=stage)
+
+
+def _fetch_stage(source: Iterable[Tuple[List[int], Any]], out: queue.Queue, stop: threading.Event):
+    source = iter(source)
+    try:
+        for batch, payload in source:
+            if not _put(out, (batch, payload), stop, "fetch"):
+                return
+        _put(out, _DONE, stop, "fetch")
+    except BaseException as e:
+        _put(out, _Failure(e), stop, "fetch")
+    finally:
+        close = getattr(source, "close", None)
+        if close:
+            close()
+
+
+def _parse_stage(parse: Callable[[Any], Sequence[list]], inp: queue.Queue, out: queue.Queue, stop: threading.Event):
+    while not stop.is_set():
+        try:
+            item = inp.get(timeout=0.2)
+        except queue.Empty:
+            continue
+        if item is _DONE or isinstance(item, _Failure):
+            _put(out, item, stop, "parse")
+            return
+        batch, payload = item
+        try:
+            with METRICS.timer("gw2_pipeline_parse_seconds"):
+                tables = parse(payload)
+        except BaseException as e:
+            _put(out, _Failure(e), stop, "parse")
+            return
+        if not _put(out, (batch, tables), stop, "parse"):
+            return
+
+
+def run_pipeline(
+    source: Iterable[Tuple[List[int], Any]],
+    parse: Callable[[Any], Sequence[list]],
+    write: Callable[..., None],
+    total: Optional[int] = None,
+    logger: Optional[logging.Logger] = None,
+    queue_size: int = DEFAULT_PIPELINE_QUEUE_SIZE,
+    flush_rows: int = DEFAULT_FLUSH_ROWS,
+    flush_batches: int = DEFAULT_FLUSH_BATCHES,
+    flush_seconds: float = DEFAULT_FLUSH_SECONDS,
+) -> int:
+    """Run fetch, parse and write as three concurrent stages connected by bounded queues.
+
+    ``source`` yields ``(batch, payload)`` pairs (usually :func:`utils.fetch.fetch_batches`) and
+    is drained in its own thread. ``parse`` turns one payload into a tuple of row lists, one per
+    target table, in a second thread. The calling thread coalesces parsed batches and calls
+    ``write(batches, *row_lists)`` once ``flush_rows`` rows or ``flush_batches`` batches are
+    pending, once nothing new arrived for ``flush_seconds``, or at the end. Writes stay on the
+    calling thread so they join its :func:`utils.db.run_transaction`.
+
+    When the writer falls behind, both queues fill up and the fetch stage stops pulling new
+    batches from ``source``, so memory stays bounded by ``queue_size`` batches per queue.
+    Returns the number of IDs written.
+    """
+    fetched = queue.Queue(maxsize=queue_size)
+    parsed = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    threads = [
+        threading.Thread(target=_fetch_stage, args=(source, fetched, stop), name="gw2-pipeline-fetch", daemon=True),
+        threading.Thread(target=_parse_stage, args=(parse, fetched, parsed, stop), name="gw2-pipeline-parse", daemon=True),
+    ]
+    for t in threads:
+        t.start()
+
+    processed = 0
+    next_report = MAX_IDS_PER_REQUEST * 10
+    start_time = time.time()
+    pending_batches: List[List[int]] = []
+    pending_tables: List[list] = []
+    pending_rows = 0
+
+    def flush():
+        nonlocal processed, pending_batches, pending_tables, pending_rows, next_report
+        if not pending_batches:
+            return
+        with METRICS.timer("gw2_pipeline_write_seconds"):
+            write(pending_batches, *pending_tables)
+        METRICS.inc("gw2_pipeline_ids_total", sum(len(b) for b in pending_batches))
+        processed += sum(len(b) for b in pending_batches)
+        if logger:
+            logger.debug(f"Flushed {len(pending_batches)} batches ({pending_rows} rows).")
+            if processed >= next_report or processed == total:
+                elapsed = time.time() - start_time
+                rate = processed / elapsed if elapsed > 0 else 0
+                logger.info(f"Progress: {processed}/{total if total is not None else '?'} ({rate:.1f} ids/sec)")
+                next_report = processed + MAX_IDS_PER_REQUEST * 10
+        pending_batches, pending_tables, pending_rows = [], [], 0
+
+    try:
+        while True:
+            waited = time.perf_counter()
+            try:
+                item = parsed.get(timeout=flush_seconds)
+            except queue.Empty:
+                flush()
+                continue
+            finally:
+                METRICS.inc("gw2_pipeline_idle_seconds_total", time.perf_counter() - waited, stage="write")
+            if item is _DONE:
+                break
+            if isinstance(item, _Failure):
+                raise item.error
+
+            batch, tables = item
+            if not pending_tables:
+                pending_tables = [[] for _ in tables]
+            for acc, rows in zip(pending_tables, tables):
+                acc.extend(rows)
+                pending_rows += len(rows)
+            pending_batches.append(batch)
+            if pending_rows >= flush_rows or len(pending_batches) >= flush_batches:
+                flush()
+        flush()
+    finally:
+        stop.set()
+        for t in threads:
+            t.join()
+
+    return processed
@@ -1,26 +1,204 @@
+import asyncio
+import fcntl
+import json
+import os
 import time
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Mapping, Optional
+
 from utils.constants import DEFAULT_BURST
 from utils.constants import DEFAULT_REFILL_RATE
+from utils.constants import MIN_REFILL_RATE
+from utils.metrics import METRICS
+
+
+def _parse_reset(value: Optional[str], now: float) -> Optional[float]:
+    if value is None:
+        return None
+    try:
+        reset = float(value)
+    except ValueError:
+        return None
+    # Large values are epoch timestamps, small ones are seconds until the window resets.
+    return reset if reset > 1_000_000_000 else now + reset
+
 
 class TokenBucket:
+    """Token bucket shared by all threads and asyncio tasks of a process.
+
+    Besides refilling at ``refill_rate`` it adapts to server feedback passed to :meth:`observe`:
+    a 429 empties the bucket, pauses it for ``Retry-After`` and lowers the refill rate; a
+    ``X-Rate-Limit-Remaining`` below the local token count clamps the bucket to it. After a
+    backoff the rate recovers additively towards the configured rate on successful responses.
+    """
+
     def __init__(self, capacity: int = DEFAULT_BURST, refill_rate: float = DEFAULT_REFILL_RATE):
         self.capacity = capacity
-        self.tokens = capacity
-        self.refill_rate = refill_rate
-        self.timestamp = time.monotonic()
+        self.base_refill_rate = refill_rate
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._state = {
+            "tokens": float(capacity),
+            "timestamp": time.time(),
+            "paused_until": 0.0,
+            "refill_rate": float(refill_rate),
+        }
+        self._started = time.time()
+        self._consumed = 0.0
+        self._wait_seconds = 0.0
+        self._throttled = 0
+
+    @contextmanager
+    def _locked_state(self):
+        with self._lock:
+            yield self._state
 
-    def _refill(self):
-        now = time.monotonic()
-        elapsed = now - self.timestamp
-        self.timestamp = now
-        self.tokens = min(self.capacity, int(self.tokens + elapsed * self.refill_rate))
+    @property
+    def refill_rate(self) -> float:
+        with self._locked_state() as state:
+            return state["refill_rate"]
+
+    def _refill(self, state: dict, now: float):
+        elapsed = max(now - state["timestamp"], 0.0)
+        state["timestamp"] = now
+        state["tokens"] = min(float(self.capacity), state["tokens"] + elapsed * state["refill_rate"])
+
+    def try_acquire(self, tokens: float = 1.0) -> float:
+        """Take ``tokens`` if available and return 0, otherwise return the seconds to wait."""
+        with self._locked_state() as state:
+            now = time.time()
+            if now < state["paused_until"]:
+                return state["paused_until"] - now
+            self._refill(state, now)
+            if state["tokens"] >= tokens:
+                state["tokens"] -= tokens
+                return 0.0
+            return max((tokens - state["tokens"]) / state["refill_rate"], 0.05)
+
+    def _account(self, tokens: float, waited: float):
+        with self._stats_lock:
+            self._consumed += tokens
+            self._wait_seconds += waited
+        METRICS.inc("gw2_rate_limit_tokens_total", tokens)
+        METRICS.observe("gw2_rate_limit_wait_seconds", waited)
 
     def consume(self, tokens: float = 1.0):
+        waited = 0.0
         while True:
-            self._refill()
-            if self.tokens >= tokens:
-                self.tokens -= tokens
+            wait = self.try_acquire(tokens)
+            if wait <= 0:
+                self._account(tokens, waited)
                 return
-            need = tokens - self.tokens
-            sleep_for = max(need / self.refill_rate, 0.05)
-            time.sleep(sleep_for)
+            time.sleep(wait)
+            waited += wait
+
+    async def consume_async(self, tokens: float = 1.0):
+        waited = 0.0
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait <= 0:
+                self._account(tokens, waited)
+                return
+            await asyncio.sleep(wait)
+            waited += wait
+
+    def observe(self, status_code: int, headers: Optional[Mapping[str, str]] = None):
+        headers = headers or {}
+        with self._locked_state() as state:
+            now = time.time()
+            self._refill(state, now)
+            if status_code == 429:
+                try:
+                    retry_after = float(headers.get("Retry-After", 1.0))
+                except ValueError:
+                    retry_after = 1.0
+                state["tokens"] = 0.0
+                state["paused_until"] = max(state["paused_until"], now + retry_after)
+                state["refill_rate"] = max(state["refill_rate"] * 0.5, MIN_REFILL_RATE)
+                with self._stats_lock:
+                    self._throttled += 1
+                METRICS.inc("gw2_rate_limit_throttled_total")
+                return
+
+            remaining = headers.get("X-Rate-Limit-Remaining")
+            if remaining is not None:
+                try:
+                    remaining = float(remaining)
+                except ValueError:
+                    remaining = None
+            if remaining is not None and remaining < state["tokens"]:
+                state["tokens"] = remaining
+                if remaining <= 0:
+                    reset_at = _parse_reset(headers.get("X-Rate-Limit-Reset"), now)
+                    if reset_at is not None:
+                        state["paused_until"] = max(state["paused_until"], reset_at)
+
+            if 200 <= status_code < 300 and state["refill_rate"] < self.base_refill_rate:
+                state["refill_rate"] = min(state["refill_rate"] + self.base_refill_rate * 0.05, self.base_refill_rate)
+
+    def available(self) -> float:
+        with self._locked_state() as state:
+            now = time.time()
+            if now < state["paused_until"]:
+                return 0.0
+            self._refill(state, now)
+            return state["tokens"]
+
+    def utilization(self) -> float:
+        """Share of the configured request budget this instance has used since it was created."""
+        elapsed = max(time.time() - self._started, 1e-9)
+        budget = self.capacity + elapsed * self.base_refill_rate
+        return min(self._consumed / budget, 1.0)
+
+    def stats(self) -> dict:
+        return {
+            "consumed": self._consumed,
+            "wait_seconds": round(self._wait_seconds, 3),
+            "throttled": self._throttled,
+            "refill_rate": round(self.refill_rate, 3),
+            "available": round(self.available(), 1),
+            "utilization": round(self.utilization(), 3),
+        }
+
+
+class FileTokenBucket(TokenBucket):
+    """Token bucket whose state lives in a file, shared by every process that opens it.
+
+    Access is serialised with ``flock``; all processes must use the same capacity and rate.
+    """
+
+    def __init__(self, path: str | Path, capacity: int = DEFAULT_BURST, refill_rate: float = DEFAULT_REFILL_RATE):
+        super().__init__(capacity=capacity, refill_rate=refill_rate)
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    @contextmanager
+    def _locked_state(self):
+        with self._lock:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                raw = os.read(fd, 4096)
+                state = dict(self._state)
+                if raw:
+                    try:
+                        state.update(json.loads(raw))
+                    except ValueError:
+                        pass
+                yield state
+                data = json.dumps(state).encode("utf-8")
+                os.lseek(fd, 0, os.SEEK_SET)
+                os.ftruncate(fd, 0)
+                os.write(fd, data)
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+                os.close(fd)
+
+
+def create_limiter(state_file: Optional[str] = None, capacity: int = DEFAULT_BURST,
+                   refill_rate: float = DEFAULT_REFILL_RATE) -> TokenBucket:
+    if state_file:
+        return FileTokenBucket(state_file, capacity=capacity, refill_rate=refill_rate)
+    return TokenBucket(capacity=capacity, refill_rate=refill_rate)
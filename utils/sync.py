@@ -0,0 +1,31 @@
+import hashlib
+from datetime import date
+from typing import Iterable, List, Optional, Collection
+
+from utils.constants import REVALIDATE_BUCKETS
+from utils.json_codec import canonical_dumps
+
+
+def content_hash(payload: dict) -> str:
+    return hashlib.md5(canonical_dumps(payload)).hexdigest()
+
+
+def current_cycle() -> int:
+    return date.today().toordinal()
+
+
+def select_sync_ids(
+    remote_ids: Iterable[int],
+    known_ids: Collection[int],
+    buckets: int = REVALIDATE_BUCKETS,
+    cycle: Optional[int] = None,
+) -> List[int]:
+    """Return remote IDs that are unknown locally plus this cycle's re-validation slice.
+
+    Known IDs are split into ``buckets`` slices by ``id % buckets``; each cycle (one per day by
+    default) re-fetches one slice, so the whole catalog is re-validated every ``buckets`` cycles.
+    """
+    if cycle is None:
+        cycle = current_cycle()
+    slice_no = cycle % buckets
+    return [i for i in remote_ids if i not in known_ids or i % buckets == slice_no]